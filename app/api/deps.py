@@ -2,7 +2,11 @@ from fastapi import Depends, Request, Cookie, HTTPException, status
 from app.domain.auth.services import get_token_payload
 from typing import Optional, Annotated
 from fastapi.security import OAuth2PasswordBearer, OAuth2
-from app.core.database import SessionLocal
+from app.core.database import SessionLocal, redis_db
+from app.domain.portfolio.services.converter_price_index import ConverterPriceIndex
+from app.domain.portfolio.services.asset_autocomplete_index import (
+    AssetAutocompleteIndex,
+)
 from app.domain.user.services import get_user_by_id
 from sqlalchemy.orm import Session
 from fastapi.openapi.models import OAuthFlows as OAuthFlowsModel
@@ -29,6 +33,10 @@ class OAuth2PasswordBearerWithCookie(OAuth2):
 
 oauth2_scheme = OAuth2PasswordBearerWithCookie(tokenUrl="/api/v1/auth/token")
 
+# One per process, reloaded on ingestion by their Redis listeners
+converter_price_index = ConverterPriceIndex(SessionLocal, redis_db)
+asset_autocomplete_index = AssetAutocompleteIndex(SessionLocal, redis_db)
+
 
 def get_db():
     """
@@ -3,7 +3,8 @@ from sqlalchemy import MetaData, text
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError
 from app.domain.model_base import Base
-from app.core.database import engine
+from app.core.cache import ResponseCache
+from app.core.database import engine, redis_db
 from app.api.deps import get_db
 from app.core.utils import limiter
 from app.core.security import get_password_hash
@@ -23,6 +24,7 @@ from app.domain.portfolio.fetchers.crypto_fetchers import (
     CoinGeckoCryptoFetcher,
     BinanaceCryptoFetcher,
 )
+from app.domain.portfolio.fetchers.binance_symbol_index import BinanceSymbolIndex
 from app.domain.portfolio.fetchers.currency_exchange_fetcher import (
     ExchangerateCurrencyRateFetcher,
 )
@@ -32,6 +34,15 @@ from app.domain.portfolio.repositories.currency_repository import (
 from app.domain.portfolio.services.currency_exchange_service import (
     ExchangeRateCurrencyService,
 )
+from app.domain.portfolio.repositories.stock_portfolio_repository import (
+    StockPortfolioRepository,
+)
+from app.domain.portfolio.repositories.crypto_portfolio_repository import (
+    CryptoPortfolioRepository,
+)
+from app.domain.portfolio.services.portfolio_value_snapshot_service import (
+    PortfolioValueSnapshotService,
+)
 
 router = APIRouter(
     prefix="/develop",
@@ -130,28 +141,37 @@ def create_example_data(request: Request, db: Session = Depends(get_db)):
 def fetch_and_save_stock(request: Request, db: Session = Depends(get_db)):
     stock_repository = StockRepository(db_session=db)
     stock_service = GPWStockService(
-        fetcher=GPWStockFetcher(), repository=stock_repository
+        fetcher=GPWStockFetcher(tickers=settings.GPW_TICKERS),
+        repository=stock_repository,
+        response_cache=ResponseCache(redis_db),
     )
-    gpw_fetcher = GPWStockFetcher(tickers=settings.GPW_TICKERS)
 
-    stock_service.fetch_and_save_stock_data()
-    return {"message": "Stock data fetched and saved successfully"}
+    failed_tickers = stock_service.fetch_and_save_stock_data()
+    return {
+        "message": "Stock data fetched and saved successfully",
+        "failed_tickers": failed_tickers,
+    }
 
 
 @router.post("/fetch-crypto", status_code=status.HTTP_200_OK)
 @limiter.limit("60/minute")
 def fetch_crypto_data(request: Request, db: Session = Depends(get_db)):
     crypto_service = CoinGeckoCryptoService(
-        fetcher=CoinGeckoCryptoFetcher(), repository=CryptoRepository(db_session=db)
+        fetcher=CoinGeckoCryptoFetcher(),
+        repository=CryptoRepository(db_session=db),
+        response_cache=ResponseCache(redis_db),
     )
 
     # Fetch crypto data from CoinGecko
     crypto_data = crypto_service.fetch_and_save_crypto_data()
 
+    binanace_fetcher = BinanaceCryptoFetcher()
     crypto_historical_service = BinanaceCryptoService(
-        fetcher=BinanaceCryptoFetcher(),
+        fetcher=binanace_fetcher,
         repository=CryptoRepository(db_session=db),
         pair_rate_repository=CurrencyPairRateRepository(db_session=db),
+        symbol_index=BinanceSymbolIndex(binanace_fetcher, redis_db),
+        response_cache=ResponseCache(redis_db),
     )
 
     crypto_historical_data = (
@@ -164,10 +184,13 @@ def fetch_crypto_data(request: Request, db: Session = Depends(get_db)):
 @router.post("/fetch-binanace-crypto", status_code=status.HTTP_200_OK)
 @limiter.limit("60/minute")
 def fetch_binanace_crypto_data(request: Request, db: Session = Depends(get_db)):
+    binanace_fetcher = BinanaceCryptoFetcher()
     binanace_crypto_service = BinanaceCryptoService(
-        fetcher=BinanaceCryptoFetcher(),
+        fetcher=binanace_fetcher,
         repository=CryptoRepository(db_session=db),
         pair_rate_repository=CurrencyPairRateRepository(db_session=db),
+        symbol_index=BinanceSymbolIndex(binanace_fetcher, redis_db),
+        response_cache=ResponseCache(redis_db),
     )
 
     binanace_crypto_service.fetch_and_save_historical_crypto_data()
@@ -182,8 +205,37 @@ def fetch_currency_exchange_rates(request: Request, db: Session = Depends(get_db
     currency_exchange_service = ExchangeRateCurrencyService(
         fetcher=ExchangerateCurrencyRateFetcher(),
         repository=CurrencyPairRateRepository(db_session=db),
+        response_cache=ResponseCache(redis_db),
     )
 
     currency_exchange_service.fetch_and_save_currency_pair_rate()
 
     return {"message": "Currency exchange rates fetched and saved successfully"}
+
+
+@router.post("/rebuild-portfolio-positions", status_code=status.HTTP_200_OK)
+@limiter.limit("60/minute")
+def rebuild_portfolio_positions(request: Request, db: Session = Depends(get_db)):
+    stock_positions = StockPortfolioRepository(db_session=db).rebuild_stock_positions()
+    crypto_positions = CryptoPortfolioRepository(
+        db_session=db
+    ).rebuild_crypto_positions()
+
+    return {
+        "message": "Portfolio positions rebuilt successfully",
+        "stock_positions": stock_positions,
+        "crypto_positions": crypto_positions,
+    }
+
+
+@router.post("/snapshot-portfolio-values", status_code=status.HTTP_200_OK)
+@limiter.limit("60/minute")
+def snapshot_portfolio_values(request: Request, db: Session = Depends(get_db)):
+    snapshot_service = PortfolioValueSnapshotService(
+        stock_portfolio_repository=StockPortfolioRepository(db_session=db),
+        crypto_portfolio_repository=CryptoPortfolioRepository(db_session=db),
+    )
+
+    snapshot_service.snapshot_all_portfolios()
+
+    return {"message": "Portfolio value snapshots saved successfully"}
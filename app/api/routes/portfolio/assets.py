@@ -1,12 +1,22 @@
 from typing import List, Optional, Literal, Dict, Any, Annotated
+from datetime import datetime
 
-from fastapi import APIRouter, HTTPException, status, Depends, Request, Query
+from fastapi import APIRouter, HTTPException, status, Depends, Request, Query, Response
 from sqlalchemy.orm import Session
-from fastapi_pagination import Page, paginate
+from fastapi_pagination import Page, resolve_params
 
-from app.api.deps import get_db, authenticate
+from app.api.deps import (
+    get_db,
+    authenticate,
+    asset_autocomplete_index,
+    converter_price_index,
+)
 from app.core.utils import limiter
+from app.core import cache
+from app.core.cache import ResponseCache, serialize
 from app.core.config import settings
+from app.core.database import redis_db
+from app.core.exceptions import BadRequestError, NotFoundError
 from app.domain.portfolio.repositories.stock_repository import StockRepository
 from app.domain.portfolio.services.stock_service import StockService
 from app.domain.portfolio.services.crypto_service import CryptoService
@@ -41,6 +51,7 @@ from app.domain.portfolio.schemas.global_schemas import (
     GlobalMarketPerformanceSchema,
     GlobalSearchResultsSchema,
     GlobalAssetsToConvert,
+    AutocompleteResultSchema,
 )
 from app.domain.portfolio.schemas.stock_portfolio_schemas import (
     StockInPortfolioBaseSchema,
@@ -59,6 +70,9 @@ from app.domain.portfolio.services.crypto_portfolio_service import (
 from app.domain.portfolio.services.stock_portfolio_service import (
     StockPortfolioService,
 )
+from app.domain.portfolio.services.global_performance_snapshot_service import (
+    GlobalPerformanceSnapshotService,
+)
 from app.domain.portfolio.repositories.stock_portfolio_repository import (
     StockPortfolioRepository,
 )
@@ -84,9 +98,18 @@ def get_stocks_data(
     stock_repository = StockRepository(db_session=db)
     stock_service = StockService(repository=stock_repository)
 
-    stocks_data = stock_service.search_stocks(search=search)
+    params = resolve_params()
+
+    stocks_data = ResponseCache(redis_db).get_or_set(
+        f"stocks:search={search.lower() if search else ''}"
+        f":page={params.page}:size={params.size}",
+        [cache.STOCKS],
+        lambda: serialize(
+            Page[StockSearchSchema], stock_service.search_stocks_page(search=search)
+        ),
+    )
 
-    return paginate(stocks_data)
+    return Response(content=stocks_data, media_type="application/json")
 
 
 @router.get("/stocks/symbols", status_code=status.HTTP_200_OK)
@@ -101,9 +124,15 @@ def get_stocks_symbols(
     stock_repository = StockRepository(db_session=db)
     stock_service = StockService(repository=stock_repository)
 
-    stocks_data = stock_service.search_stocks(search=None)
+    stocks_data = ResponseCache(redis_db).get_or_set(
+        "stocks:symbols",
+        [cache.STOCKS],
+        lambda: serialize(
+            List[StockSymbolSchema], stock_service.search_stocks(search=None)
+        ),
+    )
 
-    return stocks_data
+    return Response(content=stocks_data, media_type="application/json")
 
 
 @router.get("/global-performance", status_code=status.HTTP_200_OK)
@@ -123,14 +152,14 @@ def get_market_global_performance(
     crypto_repository = CryptoRepository(db_session=db)
     crypto_service = CryptoService(repository=crypto_repository)
 
-    # Calculate total 24h volume and market cap
-    global_crypto_data = crypto_service.get_global_performance_data()
-    global_stock_data = stock_service.get_global_performance_data()
+    # Computed by the ingestion tasks after each run
+    snapshot_service = GlobalPerformanceSnapshotService(
+        stock_service=stock_service, crypto_service=crypto_service, redis=redis_db
+    )
 
-    return {
-        "global_crypto_data": global_crypto_data,
-        "global_stock_data": global_stock_data,
-    }
+    return Response(
+        content=snapshot_service.get_snapshot(), media_type="application/json"
+    )
 
 
 @router.get("/global-search", status_code=status.HTTP_200_OK)
@@ -149,13 +178,39 @@ def get_global_search(
     crypto_repository = CryptoRepository(db_session=db)
     crypto_service = CryptoService(repository=crypto_repository)
 
-    stock_results = stock_service.search_stocks(search=search)
-    crypto_results = crypto_service.search_cryptos(search=search)
+    search_results = ResponseCache(redis_db).get_or_set(
+        f"global-search:search={search.lower() if search else ''}",
+        [cache.STOCKS, cache.CRYPTOS],
+        lambda: serialize(
+            GlobalSearchResultsSchema,
+            {
+                "stocks": stock_service.search_stocks(
+                    search=search, limit=settings.ASSET_SEARCH_LIMIT
+                ),
+                "cryptos": crypto_service.search_cryptos(
+                    search=search, limit=settings.ASSET_SEARCH_LIMIT
+                ),
+            },
+        ),
+    )
 
-    return {
-        "stocks": stock_results,
-        "cryptos": crypto_results,
-    }
+    return Response(content=search_results, media_type="application/json")
+
+
+@router.get("/autocomplete", status_code=status.HTTP_200_OK)
+@limiter.limit("10/second")
+def get_assets_autocomplete(
+    request: Request,
+    search: str = Query(
+        ..., min_length=1, description="Beginning of a symbol or name, e.g. pko, łód"
+    ),
+    limit: int = Query(10, ge=1, le=50, description="Maximum number of suggestions"),
+) -> List[AutocompleteResultSchema]:
+    """
+    Return stocks and cryptos whose symbol or name starts with the search term,
+    from the in-memory autocomplete index, without database queries.
+    """
+    return asset_autocomplete_index.search(search, limit=limit)
 
 
 @router.get("/global-converter", status_code=status.HTTP_200_OK)
@@ -169,54 +224,24 @@ def convert_global_asset_value(
         str, description="Asset to convert to, e.g. USD, EUR, btc, eth, SAN.WA"
     ),
     amount: float = Query(float, gt=0, description="Amount to convert"),
-    db: Session = Depends(get_db),
 ) -> Dict[str, Any]:
     """
     Convert value between different global assets (cryptos, stocks, fiat currencies).
+    Prices come from the in-memory converter index, without database queries.
     """
-    stock_repository = StockRepository(db_session=db)
-    stock_service = StockService(repository=stock_repository)
-
-    crypto_repository = CryptoRepository(db_session=db)
-    crypto_service = CryptoService(repository=crypto_repository)
-
-    currency_repository = CurrencyPairRateRepository(db_session=db)
-    currency_service = CurrencyService(repository=currency_repository)
-
-    convert_from_obj = stock_service.get_stock_by_symbol(symbol=convert_from)
-
-    if convert_from_obj is None:
-        convert_from_obj = crypto_service.get_crypto_by_symbol(symbol=convert_from)
-    if convert_from_obj is None:
-        currencies = currency_service.get_all_currencies()
-        filtered = [c for c in currencies if c["symbol"] == convert_from]
-        convert_from_obj = filtered[0] if filtered else None
-    if convert_from_obj is None:
+    from_price = converter_price_index.get_price(convert_from)
+    if from_price is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Nie znaleziono aktywa do konwersji '{convert_from}'.",
         )
 
-    convert_to_obj = stock_service.get_stock_by_symbol(symbol=convert_to)
-    if convert_to_obj is None:
-        convert_to_obj = crypto_service.get_crypto_by_symbol(symbol=convert_to)
-    if convert_to_obj is None:
-        currencies = currency_service.get_all_currencies()
-        filtered = [c for c in currencies if c["symbol"] == convert_to]
-        convert_to_obj = filtered[0] if filtered else None
-    if convert_to_obj is None:
+    to_price = converter_price_index.get_price(convert_to)
+    if to_price is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Nie znaleziono aktywa do konwersji '{convert_to}'.",
         )
-    if isinstance(convert_from_obj, dict):
-        from_price = convert_from_obj.get("price", 1)
-    else:
-        from_price = convert_from_obj.price
-    if isinstance(convert_to_obj, dict):
-        to_price = convert_to_obj.get("price", 1)
-    else:
-        to_price = convert_to_obj.price
     converted_amount = (amount * from_price) / to_price
 
     return {
@@ -242,15 +267,20 @@ def get_global_assets_to_convert(
     currency_service = CurrencyService(repository=currency_repository)
 
     # Get all available assets for conversion
-    stocks = stock_service.search_stocks(search=None)
-    cryptos = crypto_service.search_cryptos(search=None)
-    currencies = currency_service.get_all_currencies()
+    assets = ResponseCache(redis_db).get_or_set(
+        "global-assets-in-converter",
+        [cache.STOCKS, cache.CRYPTOS, cache.CURRENCIES],
+        lambda: serialize(
+            GlobalAssetsToConvert,
+            {
+                "stocks": stock_service.search_stocks(search=None),
+                "cryptos": crypto_service.search_cryptos(search=None),
+                "currencies": currency_service.get_all_currencies(),
+            },
+        ),
+    )
 
-    return {
-        "stocks": stocks,
-        "cryptos": cryptos,
-        "currencies": currencies,
-    }
+    return Response(content=assets, media_type="application/json")
 
 
 @router.get("/stocks/fields-metadata", status_code=status.HTTP_200_OK)
@@ -465,6 +495,55 @@ def get_stock_historical_data(
     return historical_data
 
 
+@router.get("/stocks/{symbol}/historical/resampled", status_code=status.HTTP_200_OK)
+@limiter.limit("50/minutes")
+def get_stock_resampled_historical_data(
+    symbol: str,
+    request: Request,
+    interval: str = Query(
+        "1d",
+        description="Bar length, e.g. 15m, 4h, 1d, 1w. Widened when the range needs too many bars.",
+    ),
+    from_date: Optional[datetime] = Query(
+        None,
+        alias="from",
+        description="Range start, defaults to 30 days before the end.",
+    ),
+    to_date: Optional[datetime] = Query(
+        None, alias="to", description="Range end, defaults to now."
+    ),
+    db: Session = Depends(get_db),
+) -> List[StockHistoricalPriceSchema]:
+    """
+    Return OHLCV bars of any interval and range, resampled from the stored candles.
+    """
+    stock_repository = StockRepository(db_session=db)
+    stock_service = StockService(repository=stock_repository)
+    stock = stock_service.get_stock_by_symbol(symbol=symbol)
+    if not stock:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Spółka z symbolem '{symbol}' nie została znaleziona.",
+        )
+
+    try:
+        historical_data = stock_service.get_stock_resampled_historical_data(
+            stock, interval, from_date, to_date
+        )
+    except BadRequestError as bre:
+        raise HTTPException(status_code=bre.status_code, detail=str(bre))
+    except NotFoundError as ne:
+        raise HTTPException(status_code=ne.status_code, detail=str(ne))
+
+    if not historical_data:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Brak danych historycznych dla spółki z symbolem '{symbol}' w podanym zakresie.",
+        )
+
+    return historical_data
+
+
 @router.get("/stocks/{symbol}/portfolios", status_code=status.HTTP_200_OK)
 @limiter.limit("50/minutes")
 def get_portfolios_holding_stock(
@@ -507,9 +586,18 @@ def get_cryptos_data(
     crypto_repository = CryptoRepository(db_session=db)
     crypto_service = CryptoService(repository=crypto_repository)
 
-    cryptos_data = crypto_service.search_cryptos(search=search)
+    params = resolve_params()
 
-    return paginate(cryptos_data)
+    cryptos_data = ResponseCache(redis_db).get_or_set(
+        f"cryptos:search={search.lower() if search else ''}"
+        f":page={params.page}:size={params.size}",
+        [cache.CRYPTOS],
+        lambda: serialize(
+            Page[CryptoSearchSchema], crypto_service.search_cryptos_page(search=search)
+        ),
+    )
+
+    return Response(content=cryptos_data, media_type="application/json")
 
 
 @router.get("/cryptos/symbols", status_code=status.HTTP_200_OK)
@@ -524,9 +612,15 @@ def get_crypto_symbols(
     crypto_repository = CryptoRepository(db_session=db)
     crypto_service = CryptoService(repository=crypto_repository)
 
-    cryptos_data = crypto_service.search_cryptos(search=None)
+    cryptos_data = ResponseCache(redis_db).get_or_set(
+        "cryptos:symbols",
+        [cache.CRYPTOS],
+        lambda: serialize(
+            List[CryptoSymbolSchema], crypto_service.search_cryptos(search=None)
+        ),
+    )
 
-    return cryptos_data
+    return Response(content=cryptos_data, media_type="application/json")
 
 
 @router.get("/cryptos/{symbol}/general", status_code=status.HTTP_200_OK)
@@ -622,6 +716,55 @@ def get_crypto_historical_data(
     return historical_data
 
 
+@router.get("/cryptos/{symbol}/historical/resampled", status_code=status.HTTP_200_OK)
+@limiter.limit("50/minutes")
+def get_crypto_resampled_historical_data(
+    symbol: str,
+    request: Request,
+    interval: str = Query(
+        "1d",
+        description="Bar length, e.g. 15m, 4h, 1d, 1w. Widened when the range needs too many bars.",
+    ),
+    from_date: Optional[datetime] = Query(
+        None,
+        alias="from",
+        description="Range start, defaults to 30 days before the end.",
+    ),
+    to_date: Optional[datetime] = Query(
+        None, alias="to", description="Range end, defaults to now."
+    ),
+    db: Session = Depends(get_db),
+) -> List[CryptoHistoricalPriceSchema]:
+    """
+    Return OHLCV bars of any interval and range, resampled from the stored candles.
+    """
+    crypto_repository = CryptoRepository(db_session=db)
+    crypto_service = CryptoService(repository=crypto_repository)
+    crypto = crypto_service.get_crypto_by_symbol(symbol=symbol)
+    if not crypto:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Krypto z symbolem '{symbol}' nie zostało znalezione.",
+        )
+
+    try:
+        historical_data = crypto_service.get_crypto_resampled_historical_data(
+            crypto, interval, from_date, to_date
+        )
+    except BadRequestError as bre:
+        raise HTTPException(status_code=bre.status_code, detail=str(bre))
+    except NotFoundError as ne:
+        raise HTTPException(status_code=ne.status_code, detail=str(ne))
+
+    if not historical_data:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Brak danych historycznych dla kryptowaluty z symbolem '{symbol}' w podanym zakresie.",
+        )
+
+    return historical_data
+
+
 @router.get("/cryptos/{symbol}/portfolios", status_code=status.HTTP_200_OK)
 @limiter.limit("50/minutes")
 def get_portfolios_holding_crypto(
@@ -1,7 +1,8 @@
-from fastapi import APIRouter, HTTPException, status, Depends, Request, Path
+from fastapi import APIRouter, HTTPException, status, Depends, Request, Path, Query
 from typing import Annotated
 from sqlalchemy.orm import Session
 from app.api.deps import get_db, authenticate
+from app.core.pagination import KeysetPage
 from app.core.utils import limiter
 from app.core.exceptions import UnauthorizedError, NotFoundError, BadRequestError
 from app.domain.portfolio.services.crypto_portfolio_service import (
@@ -12,7 +13,7 @@ from app.domain.portfolio.repositories.crypto_repository import CryptoRepository
 from app.domain.portfolio.repositories.crypto_portfolio_repository import (
     CryptoPortfolioRepository,
 )
-from fastapi_pagination import Page, paginate
+from fastapi_pagination import Page
 from uuid import UUID
 from app.domain.portfolio.schemas.crypto_portfolio_schemas import (
     CryptoPortfolioCreateSchema,
@@ -45,8 +46,7 @@ def get_portfolio_cryptos(
     crypto_portfolio_service = CryptoPortfolioService(
         crypto_portfolio_repository, user_id
     )
-    crypto_portfolios = crypto_portfolio_service.get_all_portfolios()
-    return paginate(crypto_portfolios)
+    return crypto_portfolio_service.get_portfolios_page()
 
 
 @router.post("")
@@ -117,7 +117,7 @@ def get_detail_portfolio_crypto(
     )
     try:
         crypto_portfolio = crypto_portfolio_service.get_portfolio_by_id(
-            str(portfolio_id)
+            str(portfolio_id), with_details=True
         )
     except NotFoundError as ne:
         raise HTTPException(status_code=ne.status_code, detail=str(ne))
@@ -308,7 +308,7 @@ def get_portfolio_crypto_transactions(
             crypto_portfolio_repository, user_id
         )
 
-        transactions = crypto_portfolio_service.get_transactions_in_portfolio(
+        transactions = crypto_portfolio_service.get_transactions_in_portfolio_page(
             str(portfolio_id), crypto=crypto if crypto_symbol else None
         )
     except BadRequestError as bre:
@@ -318,7 +318,53 @@ def get_portfolio_crypto_transactions(
     except NotFoundError as ne:
         raise HTTPException(status_code=ne.status_code, detail=str(ne))
 
-    return paginate(transactions)
+    return transactions
+
+
+@router.get("/{portfolio_id}/transactions/cursor")
+@limiter.limit("5/second")
+def get_portfolio_crypto_transactions_by_cursor(
+    request: Request,
+    portfolio_id: UUID,
+    crypto_symbol: str = None,
+    cursor: str = None,
+    size: int = Query(50, ge=1, le=100),
+    user_id: str = Depends(authenticate),
+    db: Session = Depends(get_db),
+) -> KeysetPage[CryptoPortfolioTransactions]:
+    """
+    Return the transactions following `cursor`, newest first. Unlike the
+    page number, the cursor stays valid when new transactions are added.
+    """
+    try:
+        if crypto_symbol:
+            crypto_repository = CryptoRepository(db)
+            crypto_service = CryptoService(crypto_repository)
+            crypto = crypto_service.get_crypto_by_symbol(crypto_symbol)
+            if crypto is None:
+                raise NotFoundError(
+                    f"Kryptowaluta o symbolu {crypto_symbol} nie istnieje"
+                )
+
+        crypto_portfolio_repository = CryptoPortfolioRepository(db)
+        crypto_portfolio_service = CryptoPortfolioService(
+            crypto_portfolio_repository, user_id
+        )
+
+        transactions = crypto_portfolio_service.get_transactions_in_portfolio_after(
+            str(portfolio_id),
+            crypto=crypto if crypto_symbol else None,
+            cursor=cursor,
+            size=size,
+        )
+    except BadRequestError as bre:
+        raise HTTPException(status_code=bre.status_code, detail=str(bre))
+    except UnauthorizedError as ue:
+        raise HTTPException(status_code=ue.status_code, detail=str(ue))
+    except NotFoundError as ne:
+        raise HTTPException(status_code=ne.status_code, detail=str(ne))
+
+    return transactions
 
 
 @router.post("/{portfolio_id}/transactions")
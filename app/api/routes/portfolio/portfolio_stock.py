@@ -1,7 +1,8 @@
-from fastapi import APIRouter, HTTPException, status, Depends, Request, Path
+from fastapi import APIRouter, HTTPException, status, Depends, Request, Path, Query
 from typing import Annotated
 from sqlalchemy.orm import Session
 from app.api.deps import get_db, authenticate
+from app.core.pagination import KeysetPage
 from app.core.utils import limiter
 from app.core.exceptions import UnauthorizedError, NotFoundError, BadRequestError
 from app.domain.portfolio.services.stock_portfolio_service import (
@@ -12,7 +13,7 @@ from app.domain.portfolio.repositories.stock_repository import StockRepository
 from app.domain.portfolio.repositories.stock_portfolio_repository import (
     StockPortfolioRepository,
 )
-from fastapi_pagination import Page, paginate
+from fastapi_pagination import Page
 from uuid import UUID
 from app.domain.portfolio.schemas.stock_portfolio_schemas import (
     StockPortfolioCreateSchema,
@@ -43,8 +44,7 @@ def get_portfolio_stocks(
 ) -> Page[StockPortfolioSchema]:
     stock_portfolio_repository = StockPortfolioRepository(db)
     stock_portfolio_service = StockPortfolioService(stock_portfolio_repository, user_id)
-    stock_portfolios = stock_portfolio_service.get_all_portfolios()
-    return paginate(stock_portfolios)
+    return stock_portfolio_service.get_portfolios_page()
 
 
 @router.post("")
@@ -104,7 +104,9 @@ def get_detail_portfolio_stock(
     stock_portfolio_repository = StockPortfolioRepository(db)
     stock_portfolio_service = StockPortfolioService(stock_portfolio_repository, user_id)
     try:
-        stock_portfolio = stock_portfolio_service.get_portfolio_by_id(str(portfolio_id))
+        stock_portfolio = stock_portfolio_service.get_portfolio_by_id(
+            str(portfolio_id), with_details=True
+        )
     except NotFoundError as ne:
         raise HTTPException(status_code=ne.status_code, detail=str(ne))
     except UnauthorizedError as ue:
@@ -288,7 +290,7 @@ def get_portfolio_stock_transactions(
             stock_portfolio_repository, user_id
         )
 
-        transactions = stock_portfolio_service.get_transactions_in_portfolio(
+        transactions = stock_portfolio_service.get_transactions_in_portfolio_page(
             str(portfolio_id), stock=stock if stock_symbol else None
         )
     except BadRequestError as bre:
@@ -298,7 +300,51 @@ def get_portfolio_stock_transactions(
     except NotFoundError as ne:
         raise HTTPException(status_code=ne.status_code, detail=str(ne))
 
-    return paginate(transactions)
+    return transactions
+
+
+@router.get("/{portfolio_id}/transactions/cursor")
+@limiter.limit("5/second")
+def get_portfolio_stock_transactions_by_cursor(
+    request: Request,
+    portfolio_id: UUID,
+    stock_symbol: str = None,
+    cursor: str = None,
+    size: int = Query(50, ge=1, le=100),
+    user_id: str = Depends(authenticate),
+    db: Session = Depends(get_db),
+) -> KeysetPage[StockPortfolioTransactions]:
+    """
+    Return the transactions following `cursor`, newest first. Unlike the
+    page number, the cursor stays valid when new transactions are added.
+    """
+    try:
+        if stock_symbol:
+            stock_repository = StockRepository(db)
+            stock_service = StockService(stock_repository)
+            stock = stock_service.get_stock_by_symbol(stock_symbol)
+            if stock is None:
+                raise NotFoundError(f"Akcja o symbolu {stock_symbol} nie istnieje")
+
+        stock_portfolio_repository = StockPortfolioRepository(db)
+        stock_portfolio_service = StockPortfolioService(
+            stock_portfolio_repository, user_id
+        )
+
+        transactions = stock_portfolio_service.get_transactions_in_portfolio_after(
+            str(portfolio_id),
+            stock=stock if stock_symbol else None,
+            cursor=cursor,
+            size=size,
+        )
+    except BadRequestError as bre:
+        raise HTTPException(status_code=bre.status_code, detail=str(bre))
+    except UnauthorizedError as ue:
+        raise HTTPException(status_code=ue.status_code, detail=str(ue))
+    except NotFoundError as ne:
+        raise HTTPException(status_code=ne.status_code, detail=str(ne))
+
+    return transactions
 
 
 @router.post("/{portfolio_id}/transactions")
@@ -6,29 +6,12 @@ celery_app = Celery(
     "app", broker=f"redis://{settings.REDIS_HOST}:{settings.REDIS_PORT}/0"
 )
 
-# Split GPW_TICKERS into 3 parts
-gpw_tickers = settings.GPW_TICKERS
-split_size = (len(gpw_tickers) + 2) // 3
-
-gpw_tickers_part1 = gpw_tickers[:split_size]
-gpw_tickers_part2 = gpw_tickers[split_size : 2 * split_size]
-gpw_tickers_part3 = gpw_tickers[2 * split_size :]
-
 celery_app.conf.beat_schedule = {
-    "fetch-gpw-part1-every-15-minutes": {
-        "task": "app.tasks.fetch_gpw_data_by_tickers",
-        "schedule": 900.0,
-        "args": [gpw_tickers_part1],
-    },
-    "fetch-gpw-part2-every-15-minutes": {
+    # Candles are downloaded per batch of tickers, so one run covers them all
+    "fetch-gpw-every-15-minutes": {
         "task": "app.tasks.fetch_gpw_data_by_tickers",
         "schedule": 900.0,
-        "args": [gpw_tickers_part2],
-    },
-    "fetch-gpw-part3-every-15-minutes": {
-        "task": "app.tasks.fetch_gpw_data_by_tickers",
-        "schedule": 900.0,
-        "args": [gpw_tickers_part3],
+        "args": [settings.GPW_TICKERS],
     },
     "fetch-coingecko-data-every-10-minutes": {
         "task": "app.tasks.fetch_coingecko_data",
@@ -42,5 +25,18 @@ celery_app.conf.beat_schedule = {
         "task": "app.tasks.fetch_currency_exchange_rates",
         "schedule": 300.0,
     },
+    # After midnight in Europe/Warsaw, so the previous day is complete
+    "snapshot-portfolio-values-every-day": {
+        "task": "app.tasks.snapshot_portfolio_values",
+        "schedule": crontab(hour=0, minute=15),
+    },
+    "create-historical-price-partitions-every-day": {
+        "task": "app.tasks.create_historical_price_partitions",
+        "schedule": crontab(hour=1, minute=0),
+    },
+    "downsample-historical-prices-every-day": {
+        "task": "app.tasks.downsample_historical_prices",
+        "schedule": crontab(hour=1, minute=30),
+    },
 }
 celery_app.conf.timezone = "UTC"
@@ -0,0 +1,170 @@
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import Any, Callable, Iterable, Tuple
+import logging
+import threading
+import time
+from pydantic import TypeAdapter
+from redis import Redis, RedisError
+from sqlalchemy.orm import Session
+from app.core.config import settings
+
+STOCKS = "stocks"
+CRYPTOS = "cryptos"
+CURRENCIES = "currencies"
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=None)
+def _type_adapter(schema: Any) -> TypeAdapter:
+    return TypeAdapter(schema)
+
+
+def serialize(schema: Any, value: Any) -> str:
+    """Returns `value` (ORM objects or dicts) dumped to JSON through `schema`."""
+    adapter = _type_adapter(schema)
+    return adapter.dump_json(
+        adapter.validate_python(value, from_attributes=True)
+    ).decode()
+
+
+class ResponseCache:
+    """
+    Read-through cache of serialized responses in Redis.
+
+    Every entry is stored under the current versions of the data it is built
+    from (stocks, cryptos, currencies). Ingestion bumps the version of what it
+    wrote, so stale entries are never read again and expire after `ttl`.
+    Bumped namespaces are also published on `INVALIDATION_CHANNEL` for caches
+    kept in process memory.
+    """
+
+    KEY_PREFIX = "cache"
+    INVALIDATION_CHANNEL = "cache:invalidated"
+
+    def __init__(self, redis: Redis, ttl: int = settings.RESPONSE_CACHE_TTL_SEC):
+        self.redis = redis
+        self.ttl = ttl
+
+    def get_or_set(
+        self, name: str, namespaces: Iterable[str], build: Callable[[], str]
+    ) -> str:
+        """
+        Returns the entry `name`, built with `build` and stored on a miss.
+        Falls back to `build` when Redis is unavailable.
+        """
+        try:
+            namespaces = list(namespaces)
+            versions = self.redis.mget(
+                [self._version_key(namespace) for namespace in namespaces]
+            )
+            key = ":".join(
+                [self.KEY_PREFIX, name]
+                + [
+                    f"{namespace}={version or 0}"
+                    for namespace, version in zip(namespaces, versions)
+                ]
+            )
+            cached = self.redis.get(key)
+        except RedisError as e:
+            logger.warning("Error reading response cache: %s", e)
+            return build()
+        if cached is not None:
+            return cached
+
+        value = build()
+        try:
+            self.redis.setex(key, self.ttl, value)
+        except RedisError as e:
+            logger.warning("Error writing response cache: %s", e)
+        return value
+
+    def bump(self, *namespaces: str) -> None:
+        """Invalidates every entry built from `namespaces`."""
+        try:
+            for namespace in namespaces:
+                self.redis.incr(self._version_key(namespace))
+                self.redis.publish(self.INVALIDATION_CHANNEL, namespace)
+        except RedisError as e:
+            logger.warning("Error invalidating response cache: %s", e)
+
+    def _version_key(self, namespace: str) -> str:
+        return f"{self.KEY_PREFIX}:version:{namespace}"
+
+
+class InProcessIndex(ABC):
+    """
+    Data loaded from the database into process memory by `load`.
+
+    Reloaded when ingestion publishes an invalidation of one of `NAMESPACES`
+    (see `ResponseCache.bump`), and after `max_age` seconds in case a message
+    was missed.
+    """
+
+    NAMESPACES: Tuple[str, ...] = ()
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        redis: Redis,
+        max_age: int = settings.IN_PROCESS_INDEX_MAX_AGE_SEC,
+    ):
+        self.session_factory = session_factory
+        self.redis = redis
+        self.max_age = max_age
+        self._data: Any = None
+        self._loaded_at = 0.0
+        self._refresh_lock = threading.Lock()
+        self._listener: threading.Thread | None = None
+
+    @abstractmethod
+    def load(self, db: Session) -> Any:
+        """Returns the data kept in memory, read through `db`."""
+
+    def get(self) -> Any:
+        data = self._data
+        if data is None or time.monotonic() - self._loaded_at > self.max_age:
+            data = self.refresh()
+        return data
+
+    def refresh(self) -> Any:
+        with self._refresh_lock:
+            db = self.session_factory()
+            try:
+                data = self.load(db)
+            finally:
+                db.close()
+
+            self._data = data
+            self._loaded_at = time.monotonic()
+            return data
+
+    def listen(self) -> None:
+        """
+        Starts a daemon thread reloading the index on every invalidation
+        message. Does nothing if it is already running.
+        """
+        if self._listener is not None and self._listener.is_alive():
+            return
+        self._listener = threading.Thread(
+            target=self._listen, name=type(self).__name__, daemon=True
+        )
+        self._listener.start()
+
+    def _listen(self) -> None:
+        while True:
+            try:
+                pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(ResponseCache.INVALIDATION_CHANNEL)
+                if self._data is not None:
+                    # Messages sent while disconnected are lost
+                    self.refresh()
+                for message in pubsub.listen():
+                    if message["data"] in self.NAMESPACES:
+                        self.refresh()
+            except Exception:
+                # Anything escaping the loop would end the thread and leave the
+                # index stale for the life of the process
+                logger.exception("Error refreshing %s", type(self).__name__)
+            time.sleep(5)
@@ -3,7 +3,7 @@ from datetime import timedelta
 from pydantic import EmailStr, validator
 from fastapi_mail import ConnectionConfig
 from app.gpw_tickers import GPW_TICKERS
-from typing import List
+from typing import Dict, List, Tuple
 
 
 # General settings
@@ -21,7 +21,37 @@ class Settings(BaseSettings):
     ALGORITHM: str = "HS256"
 
     GPW_TICKERS: List[str] = GPW_TICKERS
+    # GPW fetching, a run has to finish before the next 15-minute beat
+    GPW_FETCH_CONCURRENCY: int = 4
+    GPW_FETCH_REQUESTS_PER_SECOND: float = 5.0
+    GPW_FETCH_TIME_BUDGET_SEC: int = 840
     COINGECKO_API_KEY: str
+    # Binance allows 6000 request weight per minute per IP
+    BINANCE_FETCH_CONCURRENCY: int = 8
+    BINANCE_REQUEST_WEIGHT_PER_MINUTE: int = 6000
+    BINANCE_SYMBOL_INDEX_TTL_SEC: int = 86400  # 1 day
+    # Monthly candle partitions created ahead of time
+    HISTORICAL_PRICE_PARTITION_MONTHS_AHEAD: int = 3
+    # Candles kept at full resolution per period, older ones are rolled into
+    # bars of the given interval: {period: (kept for, interval)}
+    STOCK_HISTORICAL_PRICE_RETENTION: Dict[str, Tuple[timedelta, str]] = {
+        "1d": (timedelta(days=7), "1d"),  # 1h candles
+        "1w": (timedelta(days=31), "1d"),  # 4h candles
+    }
+    # GPW history has no 1h period, only crypto stores 1m candles
+    CRYPTO_HISTORICAL_PRICE_RETENTION: Dict[str, Tuple[timedelta, str]] = {
+        "1h": (timedelta(days=2), "1h"),  # 1m candles
+        "1d": (timedelta(days=7), "1d"),  # 1h candles
+        "1w": (timedelta(days=31), "1d"),  # 6h candles
+    }
+    # Most bars a resampled historical chart returns
+    HISTORICAL_MAX_POINTS: int = 500
+    # Cached asset responses, invalidated by ingestion before they expire
+    RESPONSE_CACHE_TTL_SEC: int = 900  # 15 minutes
+    # Best matches per asset type returned by the global search
+    ASSET_SEARCH_LIMIT: int = 20
+    # Reload of in-process indexes if no invalidation arrived in the meantime
+    IN_PROCESS_INDEX_MAX_AGE_SEC: int = 1800  # 30 minutes
 
     # Rate limiter for email
     RESET_LIMIT_EMAIL_RESET_PASSWORD: int = 3
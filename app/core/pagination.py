@@ -0,0 +1,33 @@
+from typing import Generic, List, Optional, TypeVar
+import base64
+import binascii
+import json
+from pydantic import BaseModel
+
+T = TypeVar("T")
+
+
+class KeysetPage(BaseModel, Generic[T]):
+    """
+    Page of a list read with keyset pagination. `next_cursor` is passed back
+    as `cursor` to read the next page, and is None on the last one.
+    """
+
+    items: List[T]
+    next_cursor: Optional[str] = None
+
+
+def encode_cursor(values: List[str]) -> str:
+    """Returns an opaque cursor of the sort key values of the last item."""
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> List[str]:
+    """Returns the values encoded by `encode_cursor`, raises `ValueError`."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError):
+        raise ValueError(f"Invalid cursor '{cursor}'")
+    if not isinstance(values, list):
+        raise ValueError(f"Invalid cursor '{cursor}'")
+    return values
@@ -0,0 +1,55 @@
+from typing import Any, List
+from sqlalchemy import Select, case, func, or_, select
+from sqlalchemy.orm import Session
+
+
+def asset_search_query(asset_model: Any, term: str) -> Select:
+    """
+    Returns the query of the assets whose name or symbol contains `term` or is
+    similar to it, best matches first: the exact symbol, symbols then names
+    starting with `term`, then by trigram similarity and market cap rank.
+
+    Both conditions are served by the `pg_trgm` GIN indexes on the lowercased
+    name and symbol (see `migrations.create_asset_search_indexes`).
+    """
+    term = term.lower()
+    name = func.lower(asset_model.name)
+    symbol = func.lower(asset_model.symbol)
+
+    match_rank = case(
+        (symbol == term, 0),
+        (symbol.startswith(term, autoescape=True), 1),
+        (name.startswith(term, autoescape=True), 2),
+        else_=3,
+    )
+    similarity = func.greatest(
+        func.similarity(name, term), func.similarity(symbol, term)
+    )
+    return (
+        select(asset_model)
+        .where(
+            or_(
+                name.contains(term, autoescape=True),
+                symbol.contains(term, autoescape=True),
+                # Similar enough names catch typos
+                name.op("%")(term),
+            )
+        )
+        .order_by(
+            match_rank,
+            similarity.desc(),
+            asset_model.market_cap_rank.asc().nulls_last(),
+            # Unique last key keeps pages stable
+            asset_model.id,
+        )
+    )
+
+
+def search_assets(
+    db: Session, asset_model: Any, term: str, limit: int = None
+) -> List[Any]:
+    """Returns the `limit` best matches of `asset_search_query`."""
+    query = asset_search_query(asset_model, term)
+    if limit is not None:
+        query = query.limit(limit)
+    return db.scalars(query).all()
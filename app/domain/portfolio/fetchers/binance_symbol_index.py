@@ -0,0 +1,52 @@
+from typing import Dict
+import json
+import requests
+from redis import Redis, RedisError
+from app.core.config import settings
+from app.domain.portfolio.fetchers.crypto_fetchers import BinanaceCryptoFetcher
+
+
+class BinanceSymbolIndex:
+    """
+    Binance pairs tradable per base asset, cached in Redis so the exchange
+    info is downloaded at most once per `ttl` seconds.
+    """
+
+    REDIS_KEY = "binance:tradable_pairs"
+
+    def __init__(
+        self,
+        fetcher: BinanaceCryptoFetcher,
+        redis: Redis,
+        ttl: int = settings.BINANCE_SYMBOL_INDEX_TTL_SEC,
+    ):
+        self.fetcher = fetcher
+        self.redis = redis
+        self.ttl = ttl
+
+    def get_pairs(self) -> Dict[str, str] | None:
+        """
+        Returns `{base_asset: pair}`, or None if the exchange info could not
+        be fetched.
+        """
+        try:
+            cached = self.redis.get(self.REDIS_KEY)
+        except RedisError as e:
+            print(f"Error reading Binance tradable pairs: {e}")
+            cached = None
+        if cached:
+            return json.loads(cached)
+        return self.refresh()
+
+    def refresh(self) -> Dict[str, str] | None:
+        try:
+            pairs = self.fetcher.fetch_tradable_pairs()
+        except (requests.RequestException, KeyError, ValueError) as e:
+            print(f"Error fetching Binance exchange info: {e}")
+            return None
+        try:
+            self.redis.setex(self.REDIS_KEY, self.ttl, json.dumps(pairs))
+        except RedisError as e:
+            # Fetched again on the next call, the pairs are still valid
+            print(f"Error saving Binance tradable pairs: {e}")
+        return pairs
@@ -1,7 +1,10 @@
 import requests
 import json
-from datetime import datetime
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
 from app.core.config import settings
+from app.domain.portfolio.fetchers.rate_limiter import get_host_weight_budget
 from typing import List, Dict, Any
 
 # from app.core.config import settings
@@ -69,53 +72,192 @@ class CoinGeckoCryptoFetcher:
             return None
 
 
+class BinanceInvalidSymbolError(Exception):
+    pass
+
+
 class BinanaceCryptoFetcher:
+    RATE_LIMIT_HOST = "api.binance.com"
+    # Quotes tried in order when a coin has no USDT pair, all pegged to USD
+    # so the candles are converted to PLN the same way
+    QUOTE_ASSETS = ["USDT", "USDC", "FDUSD"]
+
     def __init__(
         self,
+        concurrency: int = settings.BINANCE_FETCH_CONCURRENCY,
+        weight_per_minute: int = settings.BINANCE_REQUEST_WEIGHT_PER_MINUTE,
     ):
         self.params = {}
         self.url = "https://api.binance.com/api/v1/klines"
+        self.exchange_info_url = "https://api.binance.com/api/v3/exchangeInfo"
         self.intervals = ["1m", "1h", "6h", "1d", "1w", "1M"]  # for zip
-        self.periods = ["1h", "1d", "", "1m", "1y", ""]  # for zip
+        self.periods = ["1h", "1d", "1w", "1m", "1y", "max"]  # for zip
         self.limits = [60, 24, 28, 30, 52, 100]  # for zip
+        self.interval_lengths = [
+            timedelta(minutes=1),
+            timedelta(hours=1),
+            timedelta(hours=6),
+            timedelta(days=1),
+            timedelta(weeks=1),
+            timedelta(days=31),
+        ]  # for zip
+        self.concurrency = concurrency
+        self.weight_budget = get_host_weight_budget(
+            self.RATE_LIMIT_HOST, weight_per_minute
+        )
+        # One pooled session, so connections are reused between requests
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=concurrency)
+        self.session.mount("https://", adapter)
+
+    def fetch_historical_cryptos_data(
+        self,
+        crypto_symbols: List[str],
+        usd_to_pln: float,
+        since: Dict[str, Dict[str, datetime]] = None,
+        pairs: Dict[str, str] = None,
+    ) -> Dict[str, List[Dict] | None]:
+        """
+        Fetches the candles of `crypto_symbols` in parallel on a pool of
+        `concurrency` threads. Returns `{symbol: candles}`, with None for the
+        symbols that could not be fetched.
+
+        With `pairs` (see `fetch_tradable_pairs`), symbols without a pair are
+        skipped without any request.
+        """
+        since = since or {}
+        if pairs is not None:
+            crypto_symbols = [
+                symbol for symbol in crypto_symbols if symbol.upper() in pairs
+            ]
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            futures = {
+                executor.submit(
+                    self.fetch_historical_crypto_data,
+                    symbol,
+                    usd_to_pln,
+                    since.get(symbol),
+                    pairs.get(symbol.upper()) if pairs is not None else None,
+                ): symbol
+                for symbol in crypto_symbols
+            }
+            return {
+                futures[future]: future.result() for future in as_completed(futures)
+            }
+
+    def fetch_historical_crypto_data(
+        self,
+        crypto_symbol,
+        usd_to_pln: float,
+        since: Dict[str, datetime] = None,
+        pair: str = None,
+    ):
+        """
+        `since` holds the date of the last stored candle per period. Such a
+        period is fetched from that candle on, unless it is older than the
+        `limit` candles normally fetched.
+
+        Without a known `pair` the `QUOTE_ASSETS` are tried in order.
+        """
+        if pair is not None:
+            candidate_pairs = [pair]
+        else:
+            candidate_pairs = [
+                f"{crypto_symbol.upper()}{quote_asset}"
+                for quote_asset in self.QUOTE_ASSETS
+            ]
+        for candidate_pair in candidate_pairs:
+            try:
+                return self._fetch_pair_data(candidate_pair, usd_to_pln, since or {})
+            except BinanceInvalidSymbolError:
+                continue
+            except (requests.RequestException, ValueError) as e:
+                print(f"Error fetching Binance candles for {crypto_symbol}: {e}")
+                return None
+        return None
 
-    def fetch_historical_crypto_data(self, crypto_symbol, usd_to_pln: float):
+    def fetch_tradable_pairs(self) -> Dict[str, str]:
+        """
+        Returns `{base_asset: pair}` for every asset trading against one of
+        the `QUOTE_ASSETS`, preferring the quotes in their order.
+        """
+        self.weight_budget.acquire(20)
+        response = self.session.get(self.exchange_info_url, timeout=30)
+        response.raise_for_status()
+
+        pairs = {}
+        ranks = {}
+        for market in response.json()["symbols"]:
+            if market["status"] != "TRADING":
+                continue
+            if market["quoteAsset"] not in self.QUOTE_ASSETS:
+                continue
+            rank = self.QUOTE_ASSETS.index(market["quoteAsset"])
+            base_asset = market["baseAsset"]
+            if base_asset not in ranks or rank < ranks[base_asset]:
+                ranks[base_asset] = rank
+                pairs[base_asset] = market["symbol"]
+        return pairs
+
+    def _fetch_pair_data(
+        self, pair: str, usd_to_pln: float, since: Dict[str, datetime]
+    ) -> List[Dict]:
         formatted_data = []
-        try:
-            for interval, period, limit in zip(
-                self.intervals, self.periods, self.limits
+        for interval, period, limit, interval_length in zip(
+            self.intervals, self.periods, self.limits, self.interval_lengths
+        ):
+            params = self.params.copy()
+            params.update(
+                {
+                    "symbol": pair,
+                    "limit": limit,
+                    "interval": interval,
+                }
+            )
+            last_candle = since.get(period)
+            if (
+                last_candle is not None
+                and last_candle
+                > datetime.now(last_candle.tzinfo) - limit * interval_length
             ):
-                params = self.params.copy()
-                params.update(
-                    {
-                        "symbol": f"{crypto_symbol.upper()}USDT",
-                        "limit": limit,
-                        "interval": interval,
-                    }
-                )
-
-                response = requests.get(self.url, params=params)
-                response.raise_for_status()
-                data_list = response.json()
-
-                for data in data_list:
-                    new_data = {
-                        "date": str(datetime.fromtimestamp(data[0] / 1000)),
-                        "open_price": round(float(data[1]) * usd_to_pln, 2),
-                        "high_price": round(float(data[2]) * usd_to_pln, 2),
-                        "low_price": round(float(data[3]) * usd_to_pln, 2),
-                        "close_price": round(float(data[4]) * usd_to_pln, 2),
-                        "volume": data[5],
-                        "interval": interval,
-                    }
-                    if interval == "6h":
-                        new_data.update({"period": "1w"})
-                    elif interval == "1M":
-                        new_data.update({"period": "max"})
-                    else:
-                        new_data.update({"period": period})
-                    formatted_data.append(new_data)
-
-            return formatted_data
-        except requests.RequestException as e:
-            return None
+                # The last stored candle is fetched again, it may still be
+                # forming
+                params["startTime"] = int(last_candle.timestamp() * 1000)
+
+            for data in self._get_klines(params):
+                new_data = {
+                    "date": str(datetime.fromtimestamp(data[0] / 1000)),
+                    "open_price": round(float(data[1]) * usd_to_pln, 2),
+                    "high_price": round(float(data[2]) * usd_to_pln, 2),
+                    "low_price": round(float(data[3]) * usd_to_pln, 2),
+                    "close_price": round(float(data[4]) * usd_to_pln, 2),
+                    "volume": data[5],
+                    "interval": interval,
+                    "period": period,
+                }
+                formatted_data.append(new_data)
+
+        return formatted_data
+
+    def _get_klines(self, params: Dict[str, Any], retries: int = 1) -> List[List]:
+        self.weight_budget.acquire(self._klines_weight(params["limit"]))
+        response = self.session.get(self.url, params=params, timeout=10)
+        if response.status_code == 429 and retries > 0:
+            # Over the limit anyway (e.g. another process on the same IP)
+            time.sleep(int(response.headers.get("Retry-After", 1)))
+            return self._get_klines(params, retries - 1)
+        if response.status_code == 400 and response.json().get("code") == -1121:
+            raise BinanceInvalidSymbolError(params["symbol"])
+        response.raise_for_status()
+        return response.json()
+
+    @staticmethod
+    def _klines_weight(limit: int) -> int:
+        # Request weight of /klines by `limit`, as documented by Binance
+        if limit < 100:
+            return 1
+        if limit < 500:
+            return 2
+        if limit <= 1000:
+            return 5
+        return 10
@@ -0,0 +1,86 @@
+from typing import Dict
+import threading
+import time
+
+
+class RateLimiter:
+    """
+    Spaces calls at least `1 / rate_per_second` seconds apart, shared by all
+    threads using the same instance.
+    """
+
+    def __init__(self, rate_per_second: float):
+        self.interval = 1 / rate_per_second if rate_per_second > 0 else 0
+        self._lock = threading.Lock()
+        self._next_call = 0.0
+
+    def wait(self, calls: int = 1) -> None:
+        """
+        Reserves `calls` consecutive slots and waits for the last of them, for
+        a single call that makes `calls` requests.
+        """
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_call)
+            self._next_call = start + calls * self.interval
+        delay = start + (calls - 1) * self.interval - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+class WeightBudget:
+    """
+    Token bucket of `weight_per_minute`, refilled continuously, for APIs that
+    limit the summed weight of requests instead of their count.
+    """
+
+    def __init__(self, weight_per_minute: int):
+        self.capacity = weight_per_minute
+        self.refill_per_second = weight_per_minute / 60
+        self._lock = threading.Lock()
+        self._tokens = float(weight_per_minute)
+        self._updated = time.monotonic()
+
+    def acquire(self, weight: int) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity,
+                    self._tokens + (now - self._updated) * self.refill_per_second,
+                )
+                self._updated = now
+                if self._tokens >= weight:
+                    self._tokens -= weight
+                    return
+                delay = (weight - self._tokens) / self.refill_per_second
+            time.sleep(delay)
+
+
+_host_rate_limiters: Dict[str, RateLimiter] = {}
+_host_rate_limiters_lock = threading.Lock()
+
+
+def get_host_rate_limiter(host: str, rate_per_second: float) -> RateLimiter:
+    """
+    Returns the limiter of `host`, shared by every fetcher in the process so
+    parallel fetchers hitting the same API stay under one budget.
+    """
+    with _host_rate_limiters_lock:
+        if host not in _host_rate_limiters:
+            _host_rate_limiters[host] = RateLimiter(rate_per_second)
+        return _host_rate_limiters[host]
+
+
+_host_weight_budgets: Dict[str, WeightBudget] = {}
+
+
+def get_host_weight_budget(host: str, weight_per_minute: int) -> WeightBudget:
+    """
+    Returns the weight budget of `host`, shared by every fetcher in the
+    process.
+    """
+    with _host_rate_limiters_lock:
+        if host not in _host_weight_budgets:
+            _host_weight_budgets[host] = WeightBudget(weight_per_minute)
+        return _host_weight_budgets[host]
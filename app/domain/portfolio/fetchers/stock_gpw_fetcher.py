@@ -1,20 +1,44 @@
 import yfinance as yf
-from typing import List, Dict, Optional, Any
+from typing import Callable, List, Dict, Optional, Any, Tuple
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import pandas as pd
 import pytz
+import time
 
 import math
+from app.core.config import settings
+from app.domain.portfolio.fetchers.rate_limiter import get_host_rate_limiter
 
 
 class GPWStockFetcher:
+    # yfinance calls all go to Yahoo Finance and share one rate limit
+    RATE_LIMIT_HOST = "finance.yahoo.com"
+    # (yahoo period, interval) of every candle series fetched for a ticker
+    HISTORY_REQUESTS = (
+        ("1d", "1h"),
+        ("7d", "4h"),
+        ("1mo", "1d"),
+        ("1y", "1wk"),
+        ("max", "1mo"),
+    )
+    # Long series fetched only from the last stored candle on. The short ones
+    # are always fetched whole, the price changes are read from their bars.
+    INCREMENTAL_PERIODS = ("1y", "max")
+
     def __init__(
         self,
         tickers: List[str] = [],
         timezone: pytz.timezone = pytz.timezone("Europe/Warsaw"),
+        concurrency: int = settings.GPW_FETCH_CONCURRENCY,
+        requests_per_second: float = settings.GPW_FETCH_REQUESTS_PER_SECOND,
     ):
         self.tickers = [ticker + ".WA" for ticker in tickers]
         self.timezone = timezone
+        self.concurrency = concurrency
+        self.rate_limiter = get_host_rate_limiter(
+            self.RATE_LIMIT_HOST, requests_per_second
+        )
         self._data_history: Dict[str, Any] = None
 
     def historical_data_from_last_fetch(self) -> dict:
@@ -33,13 +57,170 @@ class GPWStockFetcher:
         return self._data_history
 
     def fetch_stock_data_by_ticker(self, ticker: str) -> Dict[str, Any]:
+        stock_data, self._data_history = self._fetch_ticker(ticker)
+        return stock_data
 
-        try:
+    def fetch_stocks_data_batch(
+        self,
+        tickers: List[str],
+        deadline: float = None,
+        since: Dict[str, Dict[str, datetime]] = None,
+        first_opens: Dict[str, Dict[str, float]] = None,
+    ) -> Tuple[Dict[str, Tuple[Dict[str, Any], List[Dict]]], Dict[str, Exception]]:
+        """
+        Fetches a batch of tickers. Their candles are downloaded with one
+        multi-ticker `yf.download` per interval, then `.info` is fetched per
+        ticker on a pool of `concurrency` threads.
+
+        Returns `({ticker: (stock_data, historical_data)}, {ticker: error})`, so
+        one failing ticker does not stop the others. Tickers not started before
+        `deadline` (a `time.monotonic()` value) are reported as timed out.
+
+        `since` holds the date of the last stored candle per ticker and period.
+        The `INCREMENTAL_PERIODS` are then fetched from that candle on, and
+        their price changes are computed from `first_opens`, the open of the
+        first stored candle of the period.
+        """
+        since = since or {}
+        first_opens = first_opens or {}
+        if deadline is not None and time.monotonic() > deadline:
+            histories, errors = {ticker: {} for ticker in tickers}, {}
+        else:
+            histories, errors = self._download_histories(tickers, since)
+
+        def fetch(ticker: str):
             spolka = yf.Ticker(ticker)
-            info = spolka.info
+            self.rate_limiter.wait()
+            return self._build_stock_data(
+                spolka.info, histories[ticker], first_opens.get(ticker)
+            )
+
+        results, fetch_errors = self._run_pool(
+            [ticker for ticker in tickers if ticker not in errors], fetch, deadline
+        )
+        errors.update(fetch_errors)
+        return results, errors
+
+    def _run_pool(
+        self, tickers: List[str], fetch: Callable[[str], Any], deadline: float = None
+    ) -> Tuple[Dict[str, Any], Dict[str, Exception]]:
+        def fetch_before_deadline(ticker: str):
+            if deadline is not None and time.monotonic() > deadline:
+                raise TimeoutError("Fetch time budget exceeded before start")
+            return fetch(ticker)
+
+        results = {}
+        errors = {}
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            futures = {
+                executor.submit(fetch_before_deadline, ticker): ticker
+                for ticker in tickers
+            }
+            for future in as_completed(futures):
+                ticker = futures[future]
+                try:
+                    results[ticker] = future.result()
+                except Exception as e:
+                    errors[ticker] = e
+        return results, errors
+
+    def _download_histories(
+        self, tickers: List[str], since: Dict[str, Dict[str, datetime]]
+    ) -> Tuple[Dict[str, Dict[str, pd.DataFrame]], Dict[str, Exception]]:
+        """
+        Returns `{ticker: {yahoo_period: candles}}` for every request of
+        `HISTORY_REQUESTS`, split out of one wide DataFrame per interval, and
+        `{ticker: error}` for the tickers of a failed download.
+        """
+        histories = {ticker: {} for ticker in tickers}
+        errors = {}
+        for period, interval in self.HISTORY_REQUESTS:
+            # One download serves the whole batch, so it starts at the oldest
+            # last candle of the batch, or fetches the full period if any
+            # ticker has none stored yet
+            starts = [self._since(since.get(ticker), period) for ticker in tickers]
+            if all(starts):
+                range_params = {"start": min(starts)}
+            else:
+                range_params = {"period": period}
+            # yf.download sends one request per ticker, one after another
+            self.rate_limiter.wait(len(tickers))
+            try:
+                frame = yf.download(
+                    tickers,
+                    interval=interval,
+                    **range_params,
+                    group_by="ticker",
+                    auto_adjust=True,
+                    ignore_tz=False,
+                    threads=False,
+                    progress=False,
+                )
+            except Exception as e:
+                # Every ticker of the batch is missing this interval, the
+                # remaining downloads would be wasted
+                errors = {ticker: e for ticker in tickers}
+                break
+            for ticker in tickers:
+                histories[ticker][period] = self._split_download(frame, ticker)
+        return histories, errors
+
+    @staticmethod
+    def _split_download(frame: Optional[pd.DataFrame], ticker: str) -> pd.DataFrame:
+        if frame is None or frame.empty:
+            return pd.DataFrame()
+        if ticker not in frame.columns.get_level_values(0):
+            return pd.DataFrame()
+        # The wide frame has the union of all tickers' dates, so drop the rows
+        # where this ticker had no candle
+        return frame[ticker].dropna(how="all")
+
+    def _since(self, ticker_since: Dict[str, datetime], period: str):
+        if ticker_since is None or period not in self.INCREMENTAL_PERIODS:
+            return None
+        # The last stored candle is fetched again, it may still be forming
+        return ticker_since.get(period)
+
+    def _history(
+        self, spolka: yf.Ticker, period: str, interval: str, start: datetime = None
+    ) -> pd.DataFrame:
+        self.rate_limiter.wait()
+        if start is not None:
+            return spolka.history(start=start, interval=interval)
+        return spolka.history(period=period, interval=interval)
+
+    def _fetch_ticker(
+        self,
+        ticker: str,
+        since: Dict[str, datetime] = None,
+        first_opens: Dict[str, float] = None,
+    ) -> Tuple[Dict[str, Any], List[Dict]]:
+        spolka = yf.Ticker(ticker)
+        self.rate_limiter.wait()
+        info = spolka.info
+        histories = {
+            period: self._history(
+                spolka,
+                period=period,
+                interval=interval,
+                start=self._since(since, period),
+            )
+            for period, interval in self.HISTORY_REQUESTS
+        }
+        return self._build_stock_data(info, histories, first_opens)
+
+    def _build_stock_data(
+        self,
+        info: Dict[str, Any],
+        histories: Dict[str, pd.DataFrame],
+        first_opens: Dict[str, float] = None,
+    ) -> Tuple[Dict[str, Any], List[Dict]]:
+        first_opens = first_opens or {}
+
+        try:
             now = datetime.now(self.timezone)
 
-            hist_for_day = spolka.history(period="1d", interval="1h")
+            hist_for_day = histories["1d"]
             one_hour_ago = now - timedelta(hours=1)
             price_1h_ago = self._get_close_near_time(hist_for_day, one_hour_ago)
             hist_for_day = [
@@ -56,7 +237,7 @@ class GPWStockFetcher:
                 for _, row in hist_for_day.iterrows()
             ]
 
-            hist_for_7_days = spolka.history(period="7d", interval="4h")
+            hist_for_7_days = histories["7d"]
 
             one_day_ago = now - timedelta(days=1)
             price_24h_ago = self._get_close_near_time(hist_for_7_days, one_day_ago)
@@ -74,7 +255,7 @@ class GPWStockFetcher:
                 for _, row in hist_for_7_days.iterrows()
             ]
 
-            hist_for_month = spolka.history(period="1mo", interval="1d")
+            hist_for_month = histories["1mo"]
 
             seven_days_ago = now - timedelta(days=7)
             price_7d_ago = self._get_close_near_time(hist_for_month, seven_days_ago)
@@ -93,8 +274,10 @@ class GPWStockFetcher:
                 for _, row in hist_for_month.iterrows()
             ]
 
-            hist_for_year = spolka.history(period="1y", interval="1wk")
-            price_1y_ago = self.get_first_close_or_none(hist_for_year)
+            hist_for_year = histories["1y"]
+            price_1y_ago = first_opens.get(
+                "1y", self.get_first_close_or_none(hist_for_year)
+            )
             hist_for_year = [
                 {
                     "date": row.name,  # index to Datetime
@@ -109,8 +292,10 @@ class GPWStockFetcher:
                 for _, row in hist_for_year.iterrows()
             ]
 
-            hist_for_max = spolka.history(period="max", interval="1mo")
-            price_max_ago = self.get_first_close_or_none(hist_for_max)
+            hist_for_max = histories["max"]
+            price_max_ago = first_opens.get(
+                "max", self.get_first_close_or_none(hist_for_max)
+            )
             hist_for_max = [
                 {
                     "date": row.name,  # index to Datetime
@@ -201,14 +386,14 @@ class GPWStockFetcher:
                 else 0
             )
 
-            self._data_history = (
+            data_history = (
                 hist_for_day
                 + hist_for_7_days
                 + hist_for_month
                 + hist_for_year
                 + hist_for_max
             )
-            return {
+            stock_data = {
                 "symbol": symbol,
                 "name": name,
                 "sector": sector,
@@ -238,6 +423,7 @@ class GPWStockFetcher:
                 "price_change_percentage_max": price_change_percentage_max,
                 "circulating_supply": circulating_supply,
             }
+            return stock_data, data_history
 
         except Exception as e:
             raise e
@@ -0,0 +1,252 @@
+import logging
+from sqlalchemy import Table, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.engine.base import Engine
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.database import engine as app_engine
+from app.domain.portfolio.models import (
+    Crypto,
+    CryptoHistoricalPrice,
+    CryptoPosition,
+    CryptoTransaction,
+    Stock,
+    StockHistoricalPrice,
+    StockPosition,
+    StockTransaction,
+)
+from app.domain.portfolio.partitions import create_monthly_partitions
+from app.domain.portfolio.repositories.crypto_portfolio_repository import (
+    CryptoPortfolioRepository,
+)
+from app.domain.portfolio.repositories.stock_portfolio_repository import (
+    StockPortfolioRepository,
+)
+
+logger = logging.getLogger(__name__)
+
+# (model, asset column, unique constraint, date index) of the candle tables
+HISTORICAL_PRICE_TABLES = [
+    (
+        StockHistoricalPrice,
+        "stock_id",
+        "uq_stock_historical_prices_candle",
+        "ix_stock_historical_prices_stock_period_date",
+    ),
+    (
+        CryptoHistoricalPrice,
+        "crypto_id",
+        "uq_crypto_historical_prices_candle",
+        "ix_crypto_historical_prices_crypto_period_date",
+    ),
+]
+
+
+def upgrade_historical_price_tables(engine: Engine) -> None:
+    """
+    Brings candle tables created before their unique constraint, date index
+    and partitioning up to the models. `create_all` only creates them for new
+    tables.
+
+    Candles doubled by the old check-then-insert ingestion are removed first,
+    keeping the most recently inserted one. A table is only touched while
+    something is missing.
+
+    Rewrites whole tables, so it is not run on app start but once per
+    database, before the app is deployed:
+
+        python -m app.domain.portfolio.migrations
+    """
+    with engine.begin() as conn:
+        # Several app workers start at once, only one of them upgrades
+        conn.execute(text("SELECT pg_advisory_xact_lock(hashtext('candle_tables'))"))
+        for model, asset_column, constraint, index in HISTORICAL_PRICE_TABLES:
+            table = model.__tablename__
+            has_constraint = conn.execute(
+                text("SELECT 1 FROM pg_constraint WHERE conname = :name"),
+                {"name": constraint},
+            ).first()
+            if not has_constraint:
+                deleted = conn.execute(text(f"""
+                        DELETE FROM {table} AS duplicate
+                        USING {table} AS kept
+                        WHERE duplicate.{asset_column} = kept.{asset_column}
+                          AND duplicate.period = kept.period
+                          AND duplicate.interval = kept.interval
+                          AND duplicate.date = kept.date
+                          AND duplicate.id < kept.id
+                        """)).rowcount
+                conn.execute(
+                    text(
+                        f"ALTER TABLE {table} ADD CONSTRAINT {constraint} "
+                        f"UNIQUE ({asset_column}, period, interval, date)"
+                    )
+                )
+                logger.info("Removed %s duplicate candles from %s", deleted, table)
+
+            if _is_partitioned(conn, table):
+                conn.execute(
+                    text(
+                        f"CREATE INDEX IF NOT EXISTS {index} "
+                        f"ON {table} ({asset_column}, period, date)"
+                    )
+                )
+            else:
+                # The partitioned table is created with the index
+                _partition_table(conn, model.__table__)
+
+    create_historical_price_partitions(engine)
+
+
+def create_historical_price_partitions(
+    engine: Engine,
+    months_ahead: int = settings.HISTORICAL_PRICE_PARTITION_MONTHS_AHEAD,
+) -> None:
+    """
+    Creates the default partition and the monthly partitions from the current
+    month to `months_ahead` months ahead, where missing. Candles older than
+    the first monthly partition are kept in the archive partition.
+    """
+    with engine.begin() as conn:
+        for model, *_ in HISTORICAL_PRICE_TABLES:
+            table = model.__tablename__
+            if not _is_partitioned(conn, table):
+                logger.warning(
+                    "%s is not partitioned yet, run "
+                    "python -m app.domain.portfolio.migrations",
+                    table,
+                )
+                continue
+            create_monthly_partitions(conn, table, months_ahead)
+
+
+def create_asset_search_indexes(engine: Engine) -> None:
+    """
+    Enables `pg_trgm` and creates GIN trigram indexes on the lowercased name
+    and symbol of stocks and cryptos, used by substring and similarity search
+    (see `asset_search.search_assets`).
+    """
+    with engine.begin() as conn:
+        conn.execute(text("SELECT pg_advisory_xact_lock(hashtext('asset_search'))"))
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        for model in (Stock, Crypto):
+            table = model.__tablename__
+            for column in ("name", "symbol"):
+                conn.execute(
+                    text(
+                        f"CREATE INDEX IF NOT EXISTS ix_{table}_{column}_trgm "
+                        f"ON {table} USING gin (lower({column}) gin_trgm_ops)"
+                    )
+                )
+
+
+def create_transaction_indexes(engine: Engine) -> None:
+    """
+    Creates the portfolio and date indexes of the transaction tables, which
+    serve the paginated transaction history, where missing.
+    """
+    with engine.begin() as conn:
+        for model in (StockTransaction, CryptoTransaction):
+            for index in model.__table__.indexes:
+                index.create(conn, checkfirst=True)
+
+
+def backfill_portfolio_positions(engine: Engine) -> None:
+    """
+    Fills the positions tables from the transactions of portfolios created
+    before them. A table is only rebuilt while it is empty and there are
+    transactions, so this runs once per database.
+    """
+    with Session(engine) as db:
+        # Held across the commits of both rebuilds, released below
+        db.execute(text("SELECT pg_advisory_lock(hashtext('portfolio_positions'))"))
+        try:
+            for position_model, transaction_model, rebuild in (
+                (
+                    StockPosition,
+                    StockTransaction,
+                    StockPortfolioRepository(db_session=db).rebuild_stock_positions,
+                ),
+                (
+                    CryptoPosition,
+                    CryptoTransaction,
+                    CryptoPortfolioRepository(db_session=db).rebuild_crypto_positions,
+                ),
+            ):
+                if db.query(position_model).first() is not None:
+                    continue
+                if db.query(transaction_model).first() is None:
+                    continue
+                rebuilt = rebuild()
+                logger.info("Backfilled %s %s", rebuilt, position_model.__tablename__)
+        finally:
+            db.rollback()
+            db.execute(
+                text("SELECT pg_advisory_unlock(hashtext('portfolio_positions'))")
+            )
+            db.commit()
+
+
+def _is_partitioned(conn: Connection, table: str) -> bool:
+    return (
+        conn.execute(
+            text("""
+                SELECT 1 FROM pg_partitioned_table
+                JOIN pg_class ON pg_class.oid = pg_partitioned_table.partrelid
+                WHERE pg_class.relname = :table
+                """),
+            {"table": table},
+        ).first()
+        is not None
+    )
+
+
+def _partition_table(conn: Connection, table: Table) -> None:
+    """
+    Replaces an unpartitioned candle table with a partitioned one holding
+    the same rows and ids. Runs in the caller's transaction, so a failure
+    leaves the old table as it was.
+    """
+    name = table.name
+    legacy = f"{name}_unpartitioned"
+    conn.execute(text(f"ALTER TABLE {name} RENAME TO {legacy}"))
+    conn.execute(
+        text(f"ALTER SEQUENCE IF EXISTS {name}_id_seq RENAME TO {legacy}_id_seq")
+    )
+    # Index names are unique per schema, the new table reuses them
+    constraints = conn.execute(
+        text(
+            "SELECT conname FROM pg_constraint "
+            "WHERE conrelid = CAST(:table AS regclass) AND contype IN ('p', 'u')"
+        ),
+        {"table": legacy},
+    ).scalars()
+    for constraint in list(constraints):
+        conn.execute(text(f'ALTER TABLE {legacy} DROP CONSTRAINT "{constraint}"'))
+    indexes = conn.execute(
+        text("SELECT indexname FROM pg_indexes WHERE tablename = :table"),
+        {"table": legacy},
+    ).scalars()
+    for index in list(indexes):
+        conn.execute(text(f'DROP INDEX "{index}"'))
+
+    # Creates the archive and monthly partitions the rows are copied into,
+    # see create_partitions_after_create
+    table.create(conn)
+    columns = ", ".join(table.columns.keys())
+    copied = conn.execute(
+        text(f"INSERT INTO {name} ({columns}) SELECT {columns} FROM {legacy}")
+    ).rowcount
+    conn.execute(
+        text(
+            f"SELECT setval(pg_get_serial_sequence('{name}', 'id'), "
+            f"COALESCE((SELECT MAX(id) FROM {name}), 0) + 1, false)"
+        )
+    )
+    conn.execute(text(f"DROP TABLE {legacy}"))
+    logger.info("Moved %s candles to the partitioned %s", copied, name)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    upgrade_historical_price_tables(app_engine)
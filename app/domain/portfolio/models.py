@@ -7,13 +7,24 @@ from sqlalchemy import (
     Float,
     Integer,
     BigInteger,
+    Date,
+    UniqueConstraint,
+    Index,
+    event,
 )
 from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import object_session, relationship
 from sqlalchemy.sql import func
 from uuid import uuid4
 from datetime import datetime
 from app.domain.model_base import Base
+from app.domain.portfolio.partitions import create_partitions_after_create
+from app.domain.portfolio.valuation.vectorized_value_engine import (
+    VectorizedValueEngine,
+)
+from app.domain.portfolio.valuation.position_aggregate import PositionAggregate
+from app.domain.portfolio.valuation.price_series import load_price_series
+from functools import partial
 from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
 import pytz
@@ -73,8 +84,9 @@ class BaseAsset(Base):
 class BaseHistoricalPrice(Base):
     __abstract__ = True
 
-    id = Column(Integer, primary_key=True, index=True)
-    date = Column(DateTime(timezone=True), nullable=False)
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    # Part of the primary key, as the tables are range partitioned by date
+    date = Column(DateTime(timezone=True), primary_key=True, nullable=False)
     open_price = Column(Float, nullable=True)
     close_price = Column(Float, nullable=True)
     high_price = Column(Float, nullable=True)
@@ -110,6 +122,26 @@ class BaseTransaction(Base):
     )
 
 
+# Running totals of one asset's transactions in a portfolio
+class BasePosition(Base):
+    __abstract__ = True
+
+    quantity = Column(Float, nullable=False, default=0)
+    cost = Column(Float, nullable=False, default=0)
+    proceeds = Column(Float, nullable=False, default=0)
+    last_tx_date = Column(DateTime(timezone=True), nullable=True)
+
+
+# Value of a portfolio at the end of a day
+class BasePortfolioValueSnapshot(Base):
+    __abstract__ = True
+
+    day = Column(Date, primary_key=True)
+    value = Column(Float, nullable=False)
+    invested = Column(Float, nullable=False)
+    pnl = Column(Float, nullable=False)
+
+
 ### PORTFOLIOS ###
 # Portfolio for user to store stock investments
 class StockPortfolio(BasePortfolio):
@@ -124,6 +156,35 @@ class StockPortfolio(BasePortfolio):
         back_populates="portfolio",
         cascade="all, delete-orphan",
     )
+    stock_positions = relationship(
+        "StockPosition", back_populates="portfolio", cascade="all, delete-orphan"
+    )
+    value_snapshots = relationship(
+        "StockPortfolioValueSnapshot",
+        back_populates="portfolio",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+        lazy="dynamic",
+    )
+
+    @property
+    def positions(self):
+        # Reused until the positions collection is reloaded, which happens
+        # after every commit since the session expires it
+        position_rows = self.stock_positions
+        cached = getattr(self, "_positions_cache", None)
+        if (
+            cached is None
+            or cached[0] is not position_rows
+            or cached[1] != len(position_rows)
+        ):
+            cached = (
+                position_rows,
+                len(position_rows),
+                PositionAggregate.from_rows(position_rows, "stock"),
+            )
+            self._positions_cache = cached
+        return cached[2]
 
     @property
     def total_watched(self):
@@ -135,14 +196,7 @@ class StockPortfolio(BasePortfolio):
 
     @property
     def total_investment(self):
-        return round(
-            sum(
-                tx.amount * tx.price_per_unit
-                for tx in self.stock_transactions
-                if tx.transaction_type.lower() == "buy"
-            ),
-            2,
-        )
+        return round(self.positions.total_invested, 2)
 
     @property
     def profit_loss(self):
@@ -174,19 +228,7 @@ class StockPortfolio(BasePortfolio):
 
     @property
     def current_value(self):
-        return round(
-            sum(
-                tx.amount * tx.stock.price
-                for tx in self.stock_transactions
-                if tx.transaction_type == "buy"
-            )
-            - sum(
-                tx.amount * tx.stock.price
-                for tx in self.stock_transactions
-                if tx.transaction_type == "sell"
-            ),
-            2,
-        )
+        return round(self.positions.current_value, 2)
 
     @property
     def holdings_percentage(self):
@@ -214,120 +256,55 @@ class StockPortfolio(BasePortfolio):
         return result
 
     @property
-    def historical_value_7d(self):
-        interval_hours = 12
-        now = datetime.now(pytz.timezone("Europe/Warsaw"))
-        start_time = now - timedelta(days=7)
-        time_points = [
-            start_time + timedelta(hours=i * interval_hours)
-            for i in range(int(7 * 24 / interval_hours) + 1)
-        ]
-        results = []
-        sorted_stock_transactions = sorted(
-            self.stock_transactions, key=lambda tx: tx.transaction_date
+    def value_engine(self):
+        # Prices are queried per chart window instead of loading every candle
+        db = object_session(self)
+        return VectorizedValueEngine(
+            self.stock_transactions,
+            "stock",
+            price_series_loader=(
+                partial(load_price_series, db, StockHistoricalPrice, "stock")
+                if db is not None
+                else None
+            ),
+        )
+
+    def load_value_snapshots(self, days):
+        snapshots = self.value_snapshots.filter(
+            StockPortfolioValueSnapshot.day.in_(days)
         )
+        return {snapshot.day: snapshot.value for snapshot in snapshots}
+
+    @property
+    def historical_values(self):
+        # The 7d chart is intraday, 1m and 1y are read from daily snapshots
+        engine = self.value_engine
+        return {
+            "historical_value_7d": engine.historical_value("7d"),
+            "historical_value_1m": engine.historical_value_from_snapshots(
+                "1m", self.load_value_snapshots
+            ),
+            "historical_value_1y": engine.historical_value_from_snapshots(
+                "1y", self.load_value_snapshots
+            ),
+        }
 
-        for time_point in time_points:
-            total_value = 0
-            for transaction in sorted_stock_transactions:
-                if transaction.transaction_date <= time_point:
-                    price_at_time = None
-                    if transaction.stock and transaction.stock.historical_prices:
-                        for historical_price in transaction.stock.historical_prices:
-                            if (
-                                historical_price.period == "1w"
-                                and historical_price.date <= time_point
-                            ):
-                                price_at_time = historical_price.close_price
-                    # Jeśli nie znaleziono historycznej ceny, użyj aktualnej ceny
-                    if price_at_time is None and transaction.stock:
-                        price_at_time = transaction.stock.price
-                    if price_at_time is not None:
-                        if transaction.transaction_type.lower() == "buy":
-                            total_value += transaction.amount * price_at_time
-                        elif transaction.transaction_type.lower() == "sell":
-                            total_value -= transaction.amount * price_at_time
-
-            results.append({"date": time_point, "value": round(total_value, 2)})
-        return results
+    @property
+    def historical_value_7d(self):
+        return self.value_engine.historical_value("7d")
 
     @property
     def historical_value_1m(self):
-        interval_hours = 24
-        now = datetime.now(pytz.timezone("Europe/Warsaw"))
-        start_time = now - timedelta(days=30)
-        time_points = [
-            start_time + timedelta(hours=i * interval_hours)
-            for i in range(int(30 * 24 / interval_hours) + 1)
-        ]
-        results = []
-        sorted_stock_transactions = sorted(
-            self.stock_transactions, key=lambda tx: tx.transaction_date
+        return self.value_engine.historical_value_from_snapshots(
+            "1m", self.load_value_snapshots
         )
 
-        for time_point in time_points:
-            total_value = 0
-            for transaction in sorted_stock_transactions:
-                if transaction.transaction_date <= time_point:
-                    price_at_time = None
-                    if transaction.stock and transaction.stock.historical_prices:
-                        for historical_price in transaction.stock.historical_prices:
-                            if (
-                                historical_price.period == "1m"
-                                and historical_price.date <= time_point
-                            ):
-                                price_at_time = historical_price.close_price
-                    # Jeśli nie znaleziono historycznej ceny, użyj aktualnej ceny
-                    if price_at_time is None and transaction.stock:
-                        price_at_time = transaction.stock.price
-                    if price_at_time is not None:
-                        if transaction.transaction_type.lower() == "buy":
-                            total_value += transaction.amount * price_at_time
-                        elif transaction.transaction_type.lower() == "sell":
-                            total_value -= transaction.amount * price_at_time
-
-            results.append({"date": time_point, "value": round(total_value, 2)})
-        return results
-
     @property
     def historical_value_1y(self):
-        interval_days = 14
-        now = datetime.now(pytz.timezone("Europe/Warsaw"))
-        start_time = now - timedelta(days=365)
-        time_points = [
-            start_time + timedelta(days=i * interval_days)
-            for i in range(int(365 / interval_days) + 1)
-        ]
-
-        results = []
-        sorted_stock_transactions = sorted(
-            self.stock_transactions, key=lambda tx: tx.transaction_date
+        return self.value_engine.historical_value_from_snapshots(
+            "1y", self.load_value_snapshots
         )
 
-        for time_point in time_points:
-            total_value = 0
-            for transaction in sorted_stock_transactions:
-                if transaction.transaction_date <= time_point:
-                    price_at_time = None
-                    if transaction.stock and transaction.stock.historical_prices:
-                        for historical_price in transaction.stock.historical_prices:
-                            if (
-                                historical_price.period == "1y"
-                                and historical_price.date <= time_point
-                            ):
-                                price_at_time = historical_price.close_price
-                    # Jeśli nie znaleziono historycznej ceny, użyj aktualnej ceny
-                    if price_at_time is None and transaction.stock:
-                        price_at_time = transaction.stock.price
-                    if price_at_time is not None:
-                        if transaction.transaction_type.lower() == "buy":
-                            total_value += transaction.amount * price_at_time
-                        elif transaction.transaction_type.lower() == "sell":
-                            total_value -= transaction.amount * price_at_time
-
-            results.append({"date": time_point, "value": round(total_value, 2)})
-        return results
-
 
 # Portfolio for user to store crypto investments
 class CryptoPortfolio(BasePortfolio):
@@ -342,6 +319,35 @@ class CryptoPortfolio(BasePortfolio):
         back_populates="portfolio",
         cascade="all, delete-orphan",
     )
+    crypto_positions = relationship(
+        "CryptoPosition", back_populates="portfolio", cascade="all, delete-orphan"
+    )
+    value_snapshots = relationship(
+        "CryptoPortfolioValueSnapshot",
+        back_populates="portfolio",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+        lazy="dynamic",
+    )
+
+    @property
+    def positions(self):
+        # Reused until the positions collection is reloaded, which happens
+        # after every commit since the session expires it
+        position_rows = self.crypto_positions
+        cached = getattr(self, "_positions_cache", None)
+        if (
+            cached is None
+            or cached[0] is not position_rows
+            or cached[1] != len(position_rows)
+        ):
+            cached = (
+                position_rows,
+                len(position_rows),
+                PositionAggregate.from_rows(position_rows, "crypto"),
+            )
+            self._positions_cache = cached
+        return cached[2]
 
     @property
     def total_watched(self):
@@ -353,14 +359,7 @@ class CryptoPortfolio(BasePortfolio):
 
     @property
     def total_investment(self):
-        return round(
-            sum(
-                tx.amount * tx.price_per_unit
-                for tx in self.crypto_transactions
-                if tx.transaction_type.lower() == "buy"
-            ),
-            2,
-        )
+        return round(self.positions.total_invested, 2)
 
     @property
     def profit_loss(self):
@@ -397,19 +396,7 @@ class CryptoPortfolio(BasePortfolio):
 
     @property
     def current_value(self):
-        return round(
-            sum(
-                tx.amount * tx.crypto.price
-                for tx in self.crypto_transactions
-                if tx.transaction_type == "buy"
-            )
-            - sum(
-                tx.amount * tx.crypto.price
-                for tx in self.crypto_transactions
-                if tx.transaction_type == "sell"
-            ),
-            2,
-        )
+        return round(self.positions.current_value, 2)
 
     @property
     def holdings_percentage(self):
@@ -439,120 +426,55 @@ class CryptoPortfolio(BasePortfolio):
         return result
 
     @property
-    def historical_value_7d(self):
-        interval_hours = 12
-        now = datetime.now(pytz.timezone("Europe/Warsaw"))
-        start_time = now - timedelta(days=7)
-        time_points = [
-            start_time + timedelta(hours=i * interval_hours)
-            for i in range(int(7 * 24 / interval_hours) + 1)
-        ]
-        results = []
-        sorted_crypto_transactions = sorted(
-            self.crypto_transactions, key=lambda tx: tx.transaction_date
+    def value_engine(self):
+        # Prices are queried per chart window instead of loading every candle
+        db = object_session(self)
+        return VectorizedValueEngine(
+            self.crypto_transactions,
+            "crypto",
+            price_series_loader=(
+                partial(load_price_series, db, CryptoHistoricalPrice, "crypto")
+                if db is not None
+                else None
+            ),
+        )
+
+    def load_value_snapshots(self, days):
+        snapshots = self.value_snapshots.filter(
+            CryptoPortfolioValueSnapshot.day.in_(days)
         )
+        return {snapshot.day: snapshot.value for snapshot in snapshots}
 
-        for time_point in time_points:
-            total_value = 0
-            for transaction in sorted_crypto_transactions:
-                if transaction.transaction_date <= time_point:
-                    price_at_time = None
-                    if transaction.crypto and transaction.crypto.historical_prices:
-                        for historical_price in transaction.crypto.historical_prices:
-                            if (
-                                historical_price.period == "1w"
-                                and historical_price.date <= time_point
-                            ):
-                                price_at_time = historical_price.close_price
-                    # Jeśli nie znaleziono historycznej ceny, użyj aktualnej ceny
-                    if price_at_time is None and transaction.crypto:
-                        price_at_time = transaction.crypto.price
-                    if price_at_time is not None:
-                        if transaction.transaction_type.lower() == "buy":
-                            total_value += transaction.amount * price_at_time
-                        elif transaction.transaction_type.lower() == "sell":
-                            total_value -= transaction.amount * price_at_time
-
-            results.append({"date": time_point, "value": round(total_value, 2)})
-        return results
+    @property
+    def historical_values(self):
+        # The 7d chart is intraday, 1m and 1y are read from daily snapshots
+        engine = self.value_engine
+        return {
+            "historical_value_7d": engine.historical_value("7d"),
+            "historical_value_1m": engine.historical_value_from_snapshots(
+                "1m", self.load_value_snapshots
+            ),
+            "historical_value_1y": engine.historical_value_from_snapshots(
+                "1y", self.load_value_snapshots
+            ),
+        }
+
+    @property
+    def historical_value_7d(self):
+        return self.value_engine.historical_value("7d")
 
     @property
     def historical_value_1m(self):
-        interval_hours = 24
-        now = datetime.now(pytz.timezone("Europe/Warsaw"))
-        start_time = now - timedelta(days=30)
-        time_points = [
-            start_time + timedelta(hours=i * interval_hours)
-            for i in range(int(30 * 24 / interval_hours) + 1)
-        ]
-        results = []
-        sorted_crypto_transactions = sorted(
-            self.crypto_transactions, key=lambda tx: tx.transaction_date
+        return self.value_engine.historical_value_from_snapshots(
+            "1m", self.load_value_snapshots
         )
 
-        for time_point in time_points:
-            total_value = 0
-            for transaction in sorted_crypto_transactions:
-                if transaction.transaction_date <= time_point:
-                    price_at_time = None
-                    if transaction.crypto and transaction.crypto.historical_prices:
-                        for historical_price in transaction.crypto.historical_prices:
-                            if (
-                                historical_price.period == "1m"
-                                and historical_price.date <= time_point
-                            ):
-                                price_at_time = historical_price.close_price
-                    # Jeśli nie znaleziono historycznej ceny, użyj aktualnej ceny
-                    if price_at_time is None and transaction.crypto:
-                        price_at_time = transaction.crypto.price
-                    if price_at_time is not None:
-                        if transaction.transaction_type.lower() == "buy":
-                            total_value += transaction.amount * price_at_time
-                        elif transaction.transaction_type.lower() == "sell":
-                            total_value -= transaction.amount * price_at_time
-
-            results.append({"date": time_point, "value": round(total_value, 2)})
-        return results
-
     @property
     def historical_value_1y(self):
-        interval_days = 14
-        now = datetime.now(pytz.timezone("Europe/Warsaw"))
-        start_time = now - timedelta(days=365)
-        time_points = [
-            start_time + timedelta(days=i * interval_days)
-            for i in range(int(365 / interval_days) + 1)
-        ]
-
-        results = []
-        sorted_crypto_transactions = sorted(
-            self.crypto_transactions, key=lambda tx: tx.transaction_date
+        return self.value_engine.historical_value_from_snapshots(
+            "1y", self.load_value_snapshots
         )
 
-        for time_point in time_points:
-            total_value = 0
-            for transaction in sorted_crypto_transactions:
-                if transaction.transaction_date <= time_point:
-                    price_at_time = None
-                    if transaction.crypto and transaction.crypto.historical_prices:
-                        for historical_price in transaction.crypto.historical_prices:
-                            if (
-                                historical_price.period == "1y"
-                                and historical_price.date <= time_point
-                            ):
-                                price_at_time = historical_price.close_price
-                    # Jeśli nie znaleziono historycznej ceny, użyj aktualnej ceny
-                    if price_at_time is None and transaction.crypto:
-                        price_at_time = transaction.crypto.price
-                    if price_at_time is not None:
-                        if transaction.transaction_type.lower() == "buy":
-                            total_value += transaction.amount * price_at_time
-                        elif transaction.transaction_type.lower() == "sell":
-                            total_value -= transaction.amount * price_at_time
-
-            results.append({"date": time_point, "value": round(total_value, 2)})
-        return results
-
 
 ### ASSETS ###
 # Transaction for stock investments
@@ -604,6 +526,15 @@ class Crypto(BaseAsset):
 # Transaction for stock investments
 class StockTransaction(BaseTransaction):
     __tablename__ = "stock_transactions"
+    __table_args__ = (
+        # Transaction history is read per portfolio, newest first
+        Index(
+            "ix_stock_transactions_portfolio_date",
+            "portfolio_id",
+            "transaction_date",
+            "id",
+        ),
+    )
 
     portfolio_id = Column(
         UUID(as_uuid=True),
@@ -638,6 +569,15 @@ class StockTransaction(BaseTransaction):
 # Transaction for crypto investments
 class CryptoTransaction(BaseTransaction):
     __tablename__ = "crypto_transactions"
+    __table_args__ = (
+        # Transaction history is read per portfolio, newest first
+        Index(
+            "ix_crypto_transactions_portfolio_date",
+            "portfolio_id",
+            "transaction_date",
+            "id",
+        ),
+    )
 
     portfolio_id = Column(
         UUID(as_uuid=True),
@@ -669,10 +609,87 @@ class CryptoTransaction(BaseTransaction):
         return round((self.profit_loss / invested_value) * 100, 2)
 
 
+### POSITIONS ###
+# Materialized holdings of a stock in a portfolio, kept in sync with transactions
+class StockPosition(BasePosition):
+    __tablename__ = "stock_positions"
+
+    portfolio_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("stock_portfolios.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    stock_id = Column(
+        Integer, ForeignKey("stocks.id", ondelete="CASCADE"), primary_key=True
+    )
+
+    portfolio = relationship("StockPortfolio", back_populates="stock_positions")
+    stock = relationship("Stock")
+
+
+# Materialized holdings of a crypto in a portfolio, kept in sync with transactions
+class CryptoPosition(BasePosition):
+    __tablename__ = "crypto_positions"
+
+    portfolio_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("crypto_portfolios.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    crypto_id = Column(
+        Integer, ForeignKey("cryptos.id", ondelete="CASCADE"), primary_key=True
+    )
+
+    portfolio = relationship("CryptoPortfolio", back_populates="crypto_positions")
+    crypto = relationship("Crypto")
+
+
+### VALUE SNAPSHOTS ###
+# End-of-day value of a stock portfolio, served to the 1m and 1y charts
+class StockPortfolioValueSnapshot(BasePortfolioValueSnapshot):
+    __tablename__ = "stock_portfolio_value_snapshots"
+
+    portfolio_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("stock_portfolios.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+
+    portfolio = relationship("StockPortfolio", back_populates="value_snapshots")
+
+
+# End-of-day value of a crypto portfolio, served to the 1m and 1y charts
+class CryptoPortfolioValueSnapshot(BasePortfolioValueSnapshot):
+    __tablename__ = "crypto_portfolio_value_snapshots"
+
+    portfolio_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("crypto_portfolios.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+
+    portfolio = relationship("CryptoPortfolio", back_populates="value_snapshots")
+
+
 ### HISTORICAL PRICES ###
 # Historical prices for stock investments
 class StockHistoricalPrice(BaseHistoricalPrice):
     __tablename__ = "stock_historical_prices"
+    __table_args__ = (
+        UniqueConstraint(
+            "stock_id",
+            "period",
+            "interval",
+            "date",
+            name="uq_stock_historical_prices_candle",
+        ),
+        # Every read filters by asset, period and a date range
+        Index(
+            "ix_stock_historical_prices_stock_period_date", "stock_id", "period", "date"
+        ),
+        # Monthly partitions, see app.domain.portfolio.migrations
+        {"postgresql_partition_by": "RANGE (date)"},
+    )
 
     stock_id = Column(
         Integer, ForeignKey("stocks.id", ondelete="CASCADE"), nullable=False
@@ -683,6 +700,24 @@ class StockHistoricalPrice(BaseHistoricalPrice):
 # Historical prices for crypto investments
 class CryptoHistoricalPrice(BaseHistoricalPrice):
     __tablename__ = "crypto_historical_prices"
+    __table_args__ = (
+        UniqueConstraint(
+            "crypto_id",
+            "period",
+            "interval",
+            "date",
+            name="uq_crypto_historical_prices_candle",
+        ),
+        # Every read filters by asset, period and a date range
+        Index(
+            "ix_crypto_historical_prices_crypto_period_date",
+            "crypto_id",
+            "period",
+            "date",
+        ),
+        # Monthly partitions, see app.domain.portfolio.migrations
+        {"postgresql_partition_by": "RANGE (date)"},
+    )
 
     crypto_id = Column(
         Integer, ForeignKey("cryptos.id", ondelete="CASCADE"), nullable=False
@@ -690,6 +725,14 @@ class CryptoHistoricalPrice(BaseHistoricalPrice):
     crypto = relationship("Crypto", back_populates="historical_prices")
 
 
+for historical_price_model in (StockHistoricalPrice, CryptoHistoricalPrice):
+    event.listen(
+        historical_price_model.__table__,
+        "after_create",
+        create_partitions_after_create,
+    )
+
+
 #
 class CurrencyPairRate(Base):
     __tablename__ = "currency_pair_rates"
@@ -715,90 +758,41 @@ class WatchedCryptoInPortfolio(Base):
     portfolio = relationship("CryptoPortfolio", back_populates="watched_cryptos")
     crypto = relationship("Crypto", back_populates="watched_in_portfolios")
 
+    @property
+    def position(self):
+        return self.portfolio.positions.get(self.crypto_id, self.crypto)
+
     @property
     def total_invested(self):
-        return sum(
-            tx.amount * tx.price_per_unit
-            for tx in self.portfolio.crypto_transactions
-            if tx.crypto_id == self.crypto_id and tx.transaction_type.lower() == "buy"
-        )
+        return self.position.total_invested
 
     @property
     def avg_buy_price(self):
-        total_cost = sum(
-            tx.amount * tx.price_per_unit
-            for tx in self.portfolio.crypto_transactions
-            if tx.crypto_id == self.crypto_id and tx.transaction_type.lower() == "buy"
-        )
-        total_proceeds = sum(
-            tx.amount * tx.price_per_unit
-            for tx in self.portfolio.crypto_transactions
-            if tx.crypto_id == self.crypto_id and tx.transaction_type.lower() == "sell"
-        )
-        holdings = self.holdings
-        if holdings == 0:
-            return 0
-        avg_net_cost = (total_cost - total_proceeds) / holdings
-        return avg_net_cost
+        return self.position.avg_buy_price
 
     @property
     def holdings(self):
-        return sum(
-            tx.amount
-            for tx in self.portfolio.crypto_transactions
-            if tx.crypto_id == self.crypto_id and tx.transaction_type.lower() == "buy"
-        ) - sum(
-            tx.amount
-            for tx in self.portfolio.crypto_transactions
-            if tx.crypto_id == self.crypto_id and tx.transaction_type.lower() == "sell"
-        )
+        return self.position.holdings
 
     @property
     def profit_loss_24h(self):
-        if self.crypto and self.crypto.price_change_percentage_24h is not None:
-            # Calculate profit/loss for 24h based on holdings and price change
-            return round(
-                (self.crypto.price_change_percentage_24h / 100) * self.current_value,
-                2,
-            )
-        return 0
+        return self.position.profit_loss_24h
 
     @property
     def percentage_profit_loss_24h(self):
-        if self.total_invested == 0:
-            return 0
-        return round((self.profit_loss_24h / self.current_value) * 100, 2)
+        return self.position.percentage_profit_loss_24h
 
     @property
     def profit_loss(self):
-        if self.crypto:
-            total_bought = sum(
-                tx.amount * tx.price_per_unit
-                for tx in self.portfolio.crypto_transactions
-                if tx.crypto_id == self.crypto_id
-                and tx.transaction_type.lower() == "buy"
-            )
-            total_sold = sum(
-                tx.amount * tx.price_per_unit
-                for tx in self.portfolio.crypto_transactions
-                if tx.crypto_id == self.crypto_id
-                and tx.transaction_type.lower() == "sell"
-            )
-            profit = total_sold - total_bought + self.current_value
-            return profit
-        return 0
+        return self.position.profit_loss
 
     @property
     def profit_loss_percentage(self):
-        if self.total_invested == 0:
-            return 0
-        return round((self.profit_loss / self.current_value) * 100, 2)
+        return self.position.profit_loss_percentage
 
     @property
     def current_value(self):
-        if self.crypto:
-            return self.holdings * self.crypto.price
-        return 0
+        return self.position.current_value
 
 
 class WatchedStockInPortfolio(Base):
@@ -812,86 +806,38 @@ class WatchedStockInPortfolio(Base):
     portfolio = relationship("StockPortfolio", back_populates="watched_stocks")
     stock = relationship("Stock", back_populates="watched_in_portfolios")
 
+    @property
+    def position(self):
+        return self.portfolio.positions.get(self.stock_id, self.stock)
+
     @property
     def total_invested(self):
-        return sum(
-            tx.amount * tx.price_per_unit
-            for tx in self.portfolio.stock_transactions
-            if tx.stock_id == self.stock_id and tx.transaction_type.lower() == "buy"
-        )
+        return self.position.total_invested
 
     @property
     def avg_buy_price(self):
-        total_cost = sum(
-            tx.amount * tx.price_per_unit
-            for tx in self.portfolio.stock_transactions
-            if tx.stock_id == self.stock_id and tx.transaction_type.lower() == "buy"
-        )
-        total_proceeds = sum(
-            tx.amount * tx.price_per_unit
-            for tx in self.portfolio.stock_transactions
-            if tx.stock_id == self.stock_id and tx.transaction_type.lower() == "sell"
-        )
-        holdings = self.holdings
-        if holdings == 0:
-            return 0
-        avg_net_cost = (total_cost - total_proceeds) / holdings
-        return avg_net_cost
+        return self.position.avg_buy_price
 
     @property
     def holdings(self):
-        return sum(
-            tx.amount
-            for tx in self.portfolio.stock_transactions
-            if tx.stock_id == self.stock_id and tx.transaction_type.lower() == "buy"
-        ) - sum(
-            tx.amount
-            for tx in self.portfolio.stock_transactions
-            if tx.stock_id == self.stock_id and tx.transaction_type.lower() == "sell"
-        )
+        return self.position.holdings
 
     @property
     def profit_loss_24h(self):
-        if self.stock and self.stock.price_change_percentage_24h is not None:
-            # Calculate profit/loss for 24h based on holdings and price change
-            return round(
-                (self.stock.price_change_percentage_24h / 100) * self.current_value,
-                2,
-            )
-        return 0
+        return self.position.profit_loss_24h
 
     @property
     def percentage_profit_loss_24h(self):
-        if self.total_invested == 0:
-            return 0
-        return round((self.profit_loss_24h / self.current_value) * 100, 2)
+        return self.position.percentage_profit_loss_24h
 
     @property
     def profit_loss(self):
-        if self.stock:
-            total_bought = sum(
-                tx.amount * tx.price_per_unit
-                for tx in self.portfolio.stock_transactions
-                if tx.stock_id == self.stock_id and tx.transaction_type.lower() == "buy"
-            )
-            total_sold = sum(
-                tx.amount * tx.price_per_unit
-                for tx in self.portfolio.stock_transactions
-                if tx.stock_id == self.stock_id
-                and tx.transaction_type.lower() == "sell"
-            )
-            profit = total_sold - total_bought + self.current_value
-            return profit
-        return 0
+        return self.position.profit_loss
 
     @property
     def profit_loss_percentage(self):
-        if self.total_invested == 0:
-            return 0
-        return round((self.profit_loss / self.current_value) * 100, 2)
+        return self.position.profit_loss_percentage
 
     @property
     def current_value(self):
-        if self.stock:
-            return self.holdings * self.stock.price
-        return 0
+        return self.position.current_value
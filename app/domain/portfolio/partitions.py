@@ -0,0 +1,67 @@
+from datetime import date, timedelta
+import logging
+from sqlalchemy import Table, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import SQLAlchemyError
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def create_monthly_partitions(conn: Connection, table: str, months_ahead: int) -> None:
+    """
+    Creates the default partition of the candle table `table` and its monthly
+    partitions from the current month to `months_ahead` months ahead, where
+    missing.
+    """
+    conn.execute(
+        text(f"CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT")
+    )
+
+    month = date.today().replace(day=1)
+    for _ in range(months_ahead + 1):
+        next_month = _next_month(month)
+        partition = f"{table}_p{month:%Y_%m}"
+        try:
+            # A failing partition must not roll back the others
+            with conn.begin_nested():
+                conn.execute(
+                    text(
+                        f"CREATE TABLE IF NOT EXISTS {partition} PARTITION OF {table} "
+                        f"FOR VALUES FROM ('{month} 00:00+00') TO ('{next_month} 00:00+00')"
+                    )
+                )
+        except SQLAlchemyError as e:
+            # The default partition already holds candles of that month
+            logger.warning("Error creating partition %s: %s", partition, e)
+        month = next_month
+
+
+def create_partitions_after_create(
+    table: Table, connection: Connection, **kwargs
+) -> None:
+    """
+    `after_create` listener of the partitioned candle tables. `create_all`
+    only creates the parent table, which rejects every row until a partition
+    covers it.
+
+    Candles older than the current month (the 1y and max series, and the rows
+    copied in when an existing table is partitioned) go to one archive
+    partition, so monthly partitions only exist for fine-grained data.
+    """
+    if connection.dialect.name != "postgresql":
+        return
+    first_month = date.today().replace(day=1)
+    connection.execute(
+        text(
+            f"CREATE TABLE IF NOT EXISTS {table.name}_archive PARTITION OF {table.name} "
+            f"FOR VALUES FROM (MINVALUE) TO ('{first_month} 00:00+00')"
+        )
+    )
+    create_monthly_partitions(
+        connection, table.name, settings.HISTORICAL_PRICE_PARTITION_MONTHS_AHEAD
+    )
+
+
+def _next_month(month: date) -> date:
+    return (month.replace(day=28) + timedelta(days=4)).replace(day=1)
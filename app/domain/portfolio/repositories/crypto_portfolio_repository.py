@@ -4,10 +4,17 @@ from app.domain.portfolio.models import (
     CryptoTransaction,
     Crypto,
     WatchedCryptoInPortfolio,
+    CryptoPosition,
+    CryptoPortfolioValueSnapshot,
 )
-from sqlalchemy.orm import Session
-from typing import List, Dict
-from datetime import datetime
+from fastapi_pagination.bases import AbstractPage
+from fastapi_pagination.ext.sqlalchemy import paginate
+from sqlalchemy import case, func, select, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session, joinedload, selectinload
+from typing import List, Dict, Tuple
+from datetime import date, datetime
+from uuid import UUID
 
 
 class CryptoPortfolioRepository:
@@ -22,14 +29,71 @@ class CryptoPortfolioRepository:
 
         return crypto_portfolio
 
+    def _portfolio_list_options(self) -> list:
+        # Everything behind the totals of CryptoPortfolioSchema
+        return [
+            selectinload(CryptoPortfolio.watched_cryptos),
+            selectinload(CryptoPortfolio.crypto_transactions),
+            selectinload(CryptoPortfolio.crypto_positions).joinedload(
+                CryptoPosition.crypto
+            ),
+        ]
+
+    def _portfolio_detail_options(self) -> list:
+        # List totals plus the cryptos of watched entries and transactions;
+        # historical prices are queried per chart window by the value engine
+        return self._portfolio_list_options() + [
+            selectinload(CryptoPortfolio.watched_cryptos).joinedload(
+                WatchedCryptoInPortfolio.crypto
+            ),
+            selectinload(CryptoPortfolio.crypto_transactions).joinedload(
+                CryptoTransaction.crypto
+            ),
+        ]
+
     def get_all_crypto_portfolios(self, user_id: str) -> List[CryptoPortfolio]:
         return (
             self.db.query(CryptoPortfolio)
+            .options(*self._portfolio_list_options())
+            .filter(CryptoPortfolio.owner_id == user_id)
+            .order_by(CryptoPortfolio.created_at.desc())
+            .all()
+        )
+
+    def get_crypto_portfolios_page(self, user_id: str) -> AbstractPage[CryptoPortfolio]:
+        """
+        Returns the requested page of the user's portfolios, read with LIMIT and
+        OFFSET, so the totals are only loaded for the portfolios on it.
+        """
+        return paginate(
+            self.db,
+            select(CryptoPortfolio)
+            .options(*self._portfolio_list_options())
+            .where(CryptoPortfolio.owner_id == user_id)
+            .order_by(CryptoPortfolio.created_at.desc(), CryptoPortfolio.id),
+        )
+
+    def get_all_crypto_portfolios_with_details(
+        self, user_id: str
+    ) -> List[CryptoPortfolio]:
+        return (
+            self.db.query(CryptoPortfolio)
+            .options(*self._portfolio_detail_options())
             .filter(CryptoPortfolio.owner_id == user_id)
             .order_by(CryptoPortfolio.created_at.desc())
             .all()
         )
 
+    def get_crypto_portfolio_detail_by_id(
+        self, portfolio_id: str
+    ) -> CryptoPortfolio | None:
+        return (
+            self.db.query(CryptoPortfolio)
+            .options(*self._portfolio_detail_options())
+            .filter(CryptoPortfolio.id == portfolio_id)
+            .first()
+        )
+
     def delete_all_crypto_portfolios(self, user_id: str) -> None:
         crypto_portfolios = (
             self.db.query(CryptoPortfolio)
@@ -156,6 +220,46 @@ class CryptoPortfolioRepository:
             query = query.filter(CryptoTransaction.crypto == crypto)
         return query.order_by(CryptoTransaction.transaction_date.desc()).all()
 
+    def _transactions_in_crypto_portfolio_query(
+        self, portfolio_id: str, crypto: Crypto = None
+    ):
+        query = (
+            select(CryptoTransaction)
+            .options(joinedload(CryptoTransaction.crypto))
+            .where(CryptoTransaction.portfolio_id == portfolio_id)
+        )
+        if crypto:
+            query = query.where(CryptoTransaction.crypto_id == crypto.id)
+        return query.order_by(
+            CryptoTransaction.transaction_date.desc(), CryptoTransaction.id.desc()
+        )
+
+    def get_crypto_transactions_page(
+        self, portfolio_id: str, crypto: Crypto = None
+    ) -> AbstractPage[CryptoTransaction]:
+        return paginate(
+            self.db, self._transactions_in_crypto_portfolio_query(portfolio_id, crypto)
+        )
+
+    def get_crypto_transactions_after(
+        self,
+        portfolio_id: str,
+        crypto: Crypto = None,
+        after: Tuple[datetime, UUID] | None = None,
+        limit: int = 50,
+    ) -> List[CryptoTransaction]:
+        """
+        Returns up to `limit` transactions following the (date, id) key `after`,
+        newest first. Served by the portfolio/date index without an OFFSET scan.
+        """
+        query = self._transactions_in_crypto_portfolio_query(portfolio_id, crypto)
+        if after is not None:
+            query = query.where(
+                tuple_(CryptoTransaction.transaction_date, CryptoTransaction.id)
+                < tuple_(*after)
+            )
+        return self.db.scalars(query.limit(limit)).unique().all()
+
     def get_transaction_in_crypto_portfolio_by_id(
         self, portfolio_id: str, transaction_id: str
     ) -> CryptoTransaction | None:
@@ -173,6 +277,10 @@ class CryptoPortfolioRepository:
     ) -> CryptoTransaction:
         transaction = CryptoTransaction(**transaction_data)
         self.db.add(transaction)
+        # flush assigns crypto_id from the crypto relationship
+        self.db.flush()
+        position = self._apply_transaction_to_position(transaction, 1)
+        self._refresh_position_last_tx_date(position)
         self.db.commit()
         self.db.refresh(transaction)
 
@@ -181,11 +289,17 @@ class CryptoPortfolioRepository:
     def update_transaction_in_crypto_portfolio(
         self, transaction: CryptoTransaction, update_data: Dict
     ) -> CryptoTransaction:
+        old_position = self._apply_transaction_to_position(transaction, -1)
         for key, value in update_data.items():
             if value is None:
                 continue
             setattr(transaction, key, value)
 
+        self.db.flush()
+        new_position = self._apply_transaction_to_position(transaction, 1)
+        self._refresh_position_last_tx_date(old_position)
+        if new_position is not old_position:
+            self._refresh_position_last_tx_date(new_position)
         self.db.commit()
         self.db.refresh(transaction)
 
@@ -194,7 +308,9 @@ class CryptoPortfolioRepository:
     def delete_transaction_in_crypto_portfolio(
         self, transaction: CryptoTransaction
     ) -> bool:
+        position = self._apply_transaction_to_position(transaction, -1)
         self.db.delete(transaction)
+        self._refresh_position_last_tx_date(position)
         self.db.commit()
         return True
 
@@ -211,5 +327,161 @@ class CryptoPortfolioRepository:
             return False
         for transaction in transactions:
             self.db.delete(transaction)
+
+        positions = self.db.query(CryptoPosition).filter(
+            CryptoPosition.portfolio_id == portfolio_id
+        )
+        if crypto:
+            positions = positions.filter(CryptoPosition.crypto_id == crypto.id)
+        positions.delete(synchronize_session="fetch")
         self.db.commit()
         return True
+
+    def get_crypto_position(
+        self, portfolio_id: str, crypto_id: int
+    ) -> CryptoPosition | None:
+        return self.db.get(CryptoPosition, (UUID(str(portfolio_id)), crypto_id))
+
+    def _apply_transaction_to_position(
+        self, transaction: CryptoTransaction, sign: int
+    ) -> CryptoPosition:
+        """
+        Adds (`sign=1`) or removes (`sign=-1`) the transaction from the running
+        totals of its position. Changes are left for the caller to commit
+        together with the transaction itself.
+
+        The totals are incremented in a single upsert, which locks the row
+        until commit, so concurrent transactions on the same position neither
+        lose an update nor race to create it.
+        """
+        portfolio_id = UUID(str(transaction.portfolio_id))
+        value = transaction.amount * transaction.price_per_unit
+        transaction_type = transaction.transaction_type.lower()
+        quantity = cost = proceeds = 0
+        if transaction_type == "buy":
+            quantity = sign * transaction.amount
+            cost = sign * value
+        elif transaction_type == "sell":
+            quantity = -sign * transaction.amount
+            proceeds = sign * value
+
+        statement = insert(CryptoPosition).values(
+            portfolio_id=portfolio_id,
+            crypto_id=transaction.crypto_id,
+            quantity=quantity,
+            cost=cost,
+            proceeds=proceeds,
+        )
+        self.db.execute(
+            statement.on_conflict_do_update(
+                index_elements=[CryptoPosition.portfolio_id, CryptoPosition.crypto_id],
+                set_={
+                    "quantity": CryptoPosition.quantity + statement.excluded.quantity,
+                    "cost": CryptoPosition.cost + statement.excluded.cost,
+                    "proceeds": CryptoPosition.proceeds + statement.excluded.proceeds,
+                },
+            )
+        )
+        return self.db.get(
+            CryptoPosition,
+            (portfolio_id, transaction.crypto_id),
+            populate_existing=True,
+        )
+
+    def _refresh_position_last_tx_date(self, position: CryptoPosition) -> None:
+        self.db.flush()
+        last_tx_date = (
+            self.db.query(func.max(CryptoTransaction.transaction_date))
+            .filter(
+                CryptoTransaction.portfolio_id == position.portfolio_id,
+                CryptoTransaction.crypto_id == position.crypto_id,
+            )
+            .scalar()
+        )
+        if last_tx_date is None:
+            # no transactions left for this asset
+            self.db.delete(position)
+        else:
+            position.last_tx_date = last_tx_date
+
+    def rebuild_crypto_positions(self, portfolio_id: str = None) -> int:
+        """
+        Recomputes the materialized positions from the transactions, for one
+        portfolio or for all of them. Used to backfill existing portfolios.
+        """
+        transaction_type = func.lower(CryptoTransaction.transaction_type)
+        value = CryptoTransaction.amount * CryptoTransaction.price_per_unit
+        totals = self.db.query(
+            CryptoTransaction.portfolio_id,
+            CryptoTransaction.crypto_id,
+            func.sum(
+                case(
+                    (transaction_type == "buy", CryptoTransaction.amount),
+                    (transaction_type == "sell", -CryptoTransaction.amount),
+                    else_=0,
+                )
+            ),
+            func.sum(case((transaction_type == "buy", value), else_=0)),
+            func.sum(case((transaction_type == "sell", value), else_=0)),
+            func.max(CryptoTransaction.transaction_date),
+        ).group_by(CryptoTransaction.portfolio_id, CryptoTransaction.crypto_id)
+        positions = self.db.query(CryptoPosition)
+        if portfolio_id:
+            totals = totals.filter(CryptoTransaction.portfolio_id == portfolio_id)
+            positions = positions.filter(CryptoPosition.portfolio_id == portfolio_id)
+
+        totals = totals.all()
+        positions.delete(synchronize_session="fetch")
+        self.db.add_all(
+            [
+                CryptoPosition(
+                    portfolio_id=row_portfolio_id,
+                    crypto_id=crypto_id,
+                    quantity=quantity,
+                    cost=cost,
+                    proceeds=proceeds,
+                    last_tx_date=last_tx_date,
+                )
+                for (
+                    row_portfolio_id,
+                    crypto_id,
+                    quantity,
+                    cost,
+                    proceeds,
+                    last_tx_date,
+                ) in totals
+            ]
+        )
+        self.db.commit()
+        return len(totals)
+
+    def get_every_crypto_portfolio(self) -> List[CryptoPortfolio]:
+        return self.db.query(CryptoPortfolio).all()
+
+    def get_last_crypto_portfolio_value_snapshot_day(
+        self, portfolio_id: str
+    ) -> date | None:
+        return (
+            self.db.query(func.max(CryptoPortfolioValueSnapshot.day))
+            .filter(CryptoPortfolioValueSnapshot.portfolio_id == portfolio_id)
+            .scalar()
+        )
+
+    def replace_crypto_portfolio_value_snapshots(
+        self, portfolio_id: str, from_day: date, snapshots: List[Dict]
+    ) -> None:
+        """
+        Replaces the snapshots of the portfolio from `from_day` onwards, so days
+        left without holdings by a changed transaction are dropped as well.
+        """
+        self.db.query(CryptoPortfolioValueSnapshot).filter(
+            CryptoPortfolioValueSnapshot.portfolio_id == portfolio_id,
+            CryptoPortfolioValueSnapshot.day >= from_day,
+        ).delete(synchronize_session=False)
+        self.db.add_all(
+            [
+                CryptoPortfolioValueSnapshot(portfolio_id=portfolio_id, **snapshot)
+                for snapshot in snapshots
+            ]
+        )
+        self.db.commit()
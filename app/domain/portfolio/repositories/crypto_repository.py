@@ -1,8 +1,22 @@
 # gpw_repository.py
 from app.domain.portfolio.models import Crypto, CryptoHistoricalPrice
+from app.domain.portfolio.asset_search import asset_search_query, search_assets
+from fastapi_pagination.bases import AbstractPage
+from fastapi_pagination.ext.sqlalchemy import paginate
+from app.domain.portfolio.valuation.price_series import load_price_series
+from app.domain.portfolio.valuation.ohlcv_resampling import (
+    load_period_first_dates,
+    resample_prices,
+)
+from sqlalchemy import and_, func, literal_column, or_, select, text, update
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import Session
-from typing import List, Dict
-from datetime import datetime
+from typing import List, Dict, Iterable, Tuple
+from datetime import datetime, timedelta
+import numpy as np
+
+# date_trunc unit of the intervals candles can be rolled into
+DATE_TRUNC_UNITS = {"1h": "hour", "1d": "day", "1w": "week"}
 
 
 def update_model(model: Crypto, data: dict) -> Crypto:
@@ -27,6 +41,19 @@ class CryptoRepository:
     def get_all_cryptos(self) -> List[Crypto]:
         return self.db.query(Crypto).order_by(Crypto.market_cap_rank.asc()).all()
 
+    def get_cryptos_page(self, name_or_symbol: str = None) -> AbstractPage[Crypto]:
+        """
+        Returns the requested page of cryptos by market cap rank, or of the
+        matches of `name_or_symbol`, read with LIMIT and OFFSET.
+        """
+        if name_or_symbol:
+            query = asset_search_query(Crypto, name_or_symbol)
+        else:
+            query = select(Crypto).order_by(
+                Crypto.market_cap_rank.asc().nulls_last(), Crypto.id
+            )
+        return paginate(self.db, query)
+
     def update_crypto(self, update_data: Dict) -> Crypto:
         existing_crypto = self.get_crypto_by_symbol(update_data["symbol"])
         if not existing_crypto:
@@ -41,6 +68,50 @@ class CryptoRepository:
 
         return existing_crypto
 
+    def update_cryptos(self, update_data: List[Dict]) -> None:
+        """
+        Updates many cryptos in one executemany and one commit. Every dict
+        needs the crypto `id`.
+        """
+        if not update_data:
+            return
+        self.db.execute(update(Crypto), update_data)
+        self.db.commit()
+
+    def upsert_cryptos(self, cryptos_data: List[Dict]) -> Dict[str, int]:
+        """
+        Inserts or updates all cryptos in one `INSERT ... ON CONFLICT (symbol)
+        DO UPDATE` statement and returns `{"inserted": n, "updated": n}`.
+
+        When a symbol repeats in the input, its first entry is kept.
+        """
+        unique_cryptos = {}
+        for crypto_data in cryptos_data:
+            row = {
+                key: value for key, value in crypto_data.items() if key != "updated_at"
+            }
+            unique_cryptos.setdefault(row["symbol"], row)
+        if not unique_cryptos:
+            return {"inserted": 0, "updated": 0}
+
+        statement = insert(Crypto).values(list(unique_cryptos.values()))
+        updated_columns = {
+            column: statement.excluded[column]
+            for column in next(iter(unique_cryptos.values()))
+            if column != "symbol"
+        }
+        updated_columns["updated_at"] = func.timezone("Europe/Warsaw", func.now())
+        statement = statement.on_conflict_do_update(
+            index_elements=[Crypto.symbol], set_=updated_columns
+        ).returning(
+            # xmax is 0 only for rows inserted by this statement
+            literal_column("xmax = 0").label("inserted")
+        )
+        inserted = [row.inserted for row in self.db.execute(statement)]
+        self.db.commit()
+
+        return {"inserted": sum(inserted), "updated": len(inserted) - sum(inserted)}
+
     def get_crypto_by_symbol(self, symbol: str) -> Crypto | None:
         return self.db.query(Crypto).filter(Crypto.symbol == symbol).first()
 
@@ -55,6 +126,97 @@ class CryptoRepository:
 
         return historical_price
 
+    def upsert_crypto_historical_prices(
+        self, historical_prices: List[Dict], batch_size: int = 1000
+    ) -> int:
+        """
+        Writes candles with `INSERT ... ON CONFLICT DO UPDATE` and one commit.
+
+        Stored candles get their prices updated, as the latest candle keeps
+        changing until its interval closes. A candle repeated in the input is
+        written once, with its last values. Returns the number of candles written.
+        """
+        unique_prices = {
+            (data["crypto_id"], data["period"], data["interval"], data["date"]): data
+            for data in historical_prices
+        }
+        rows = list(unique_prices.values())
+
+        for start in range(0, len(rows), batch_size):
+            statement = insert(CryptoHistoricalPrice).values(
+                rows[start : start + batch_size]
+            )
+            statement = statement.on_conflict_do_update(
+                constraint="uq_crypto_historical_prices_candle",
+                set_={
+                    column: statement.excluded[column]
+                    for column in (
+                        "open_price",
+                        "close_price",
+                        "high_price",
+                        "low_price",
+                        "volume",
+                    )
+                },
+            )
+            self.db.execute(statement)
+        self.db.commit()
+
+        return len(rows)
+
+    def downsample_crypto_historical_prices(
+        self, period: str, keep: timedelta, interval: str
+    ) -> int:
+        """
+        Rolls the candles of `period` older than `keep` into `interval` bars
+        (first open, max high, min low, last close, summed volume) and deletes
+        the originals, in one statement. Only whole bars before the cutoff are
+        rolled, so every bar is built from all of its candles. Returns the
+        number of candles rolled up.
+        """
+        unit = DATE_TRUNC_UNITS[interval]
+        statement = text("""
+            WITH rolled AS (
+                DELETE FROM crypto_historical_prices
+                WHERE period = :period
+                  AND interval <> :interval
+                  AND date < date_trunc(:unit, now() - :keep, 'Europe/Warsaw')
+                RETURNING crypto_id, date, open_price, high_price, low_price,
+                          close_price, volume
+            ), inserted AS (
+                INSERT INTO crypto_historical_prices AS stored (
+                    crypto_id, period, interval, date, open_price, high_price,
+                    low_price, close_price, volume
+                )
+                SELECT
+                    crypto_id,
+                    :period,
+                    :interval,
+                    date_trunc(:unit, date, 'Europe/Warsaw') AS bar,
+                    (array_agg(open_price ORDER BY date))[1],
+                    max(high_price),
+                    min(low_price),
+                    (array_agg(close_price ORDER BY date DESC))[1],
+                    sum(volume)
+                FROM rolled
+                GROUP BY crypto_id, bar
+                ON CONFLICT ON CONSTRAINT uq_crypto_historical_prices_candle
+                DO UPDATE SET
+                    high_price = greatest(stored.high_price, excluded.high_price),
+                    low_price = least(stored.low_price, excluded.low_price),
+                    close_price = excluded.close_price,
+                    volume = coalesce(stored.volume, 0) + coalesce(excluded.volume, 0)
+            )
+            SELECT count(*) FROM rolled
+            """)
+        rolled = self.db.execute(
+            statement,
+            {"period": period, "interval": interval, "unit": unit, "keep": keep},
+        ).scalar()
+        self.db.commit()
+
+        return rolled
+
     def update_crypto_historical_price(
         self, historical_price: CryptoHistoricalPrice, update_data: Dict
     ) -> CryptoHistoricalPrice:
@@ -107,26 +269,138 @@ class CryptoRepository:
             .all()
         )
 
-    def get_cryptos_by_name_or_symbol_alike(self, name_or_symbol: str) -> List[Crypto]:
-        return (
-            self.db.query(Crypto)
-            .filter(
-                Crypto.name.ilike(f"%{name_or_symbol}%")
-                | Crypto.symbol.ilike(f"%{name_or_symbol}%")
+    def get_crypto_price_series(
+        self,
+        crypto_ids: Iterable[int],
+        periods: Iterable[str],
+        since: datetime = None,
+        until: datetime = None,
+    ) -> Dict[int, Tuple[np.ndarray, np.ndarray]]:
+        return load_price_series(
+            self.db, CryptoHistoricalPrice, "crypto", crypto_ids, periods, since, until
+        )
+
+    def get_crypto_period_first_dates(
+        self, crypto_id: int
+    ) -> Dict[Tuple[str, str], datetime]:
+        return load_period_first_dates(
+            self.db, CryptoHistoricalPrice, "crypto", crypto_id
+        )
+
+    def get_crypto_resampled_prices(
+        self,
+        crypto_id: int,
+        period: str,
+        intervals: List[str],
+        seconds: int,
+        from_date: datetime,
+        to_date: datetime,
+    ) -> List[Dict]:
+        return resample_prices(
+            self.db,
+            CryptoHistoricalPrice,
+            "crypto",
+            crypto_id,
+            period,
+            intervals,
+            seconds,
+            from_date,
+            to_date,
+        )
+
+    def get_crypto_candle_high_water_marks(
+        self, symbols: Iterable[str]
+    ) -> Dict[str, Dict[str, datetime]]:
+        """
+        Returns `{symbol: {period: date}}` with the date of the last stored
+        candle of every period.
+        """
+        rows = (
+            self.db.query(
+                Crypto.symbol,
+                CryptoHistoricalPrice.period,
+                func.max(CryptoHistoricalPrice.date),
+            )
+            .join(CryptoHistoricalPrice.crypto)
+            .filter(Crypto.symbol.in_(list(symbols)))
+            .group_by(Crypto.symbol, CryptoHistoricalPrice.period)
+            .all()
+        )
+        high_water_marks = {}
+        for symbol, period, date in rows:
+            high_water_marks.setdefault(symbol, {})[period] = date
+        return high_water_marks
+
+    def get_crypto_first_open_prices(
+        self, symbols: Iterable[str], windows: Dict[str, datetime | None]
+    ) -> Dict[str, Dict[str, float]]:
+        """
+        Returns `{symbol: {period: open_price}}` with the open of the first
+        stored candle of every period in `windows`, starting at the window date
+        (or at the first candle if it is None).
+        """
+        conditions = [
+            (
+                and_(
+                    CryptoHistoricalPrice.period == period,
+                    CryptoHistoricalPrice.date >= since,
+                )
+                if since is not None
+                else CryptoHistoricalPrice.period == period
+            )
+            for period, since in windows.items()
+        ]
+        rows = (
+            self.db.query(
+                Crypto.symbol,
+                CryptoHistoricalPrice.period,
+                CryptoHistoricalPrice.open_price,
+            )
+            .join(CryptoHistoricalPrice.crypto)
+            .filter(Crypto.symbol.in_(list(symbols)), or_(*conditions))
+            .distinct(Crypto.symbol, CryptoHistoricalPrice.period)
+            .order_by(
+                Crypto.symbol, CryptoHistoricalPrice.period, CryptoHistoricalPrice.date
             )
-            .order_by(Crypto.market_cap_rank.asc())
             .all()
         )
+        first_opens = {}
+        for symbol, period, open_price in rows:
+            first_opens.setdefault(symbol, {})[period] = open_price
+        return first_opens
+
+    def get_cryptos_by_name_or_symbol_alike(
+        self, name_or_symbol: str, limit: int = None
+    ) -> List[Crypto]:
+        return search_assets(self.db, Crypto, name_or_symbol, limit)
+
+    def get_cryptos_prices(self) -> List[Tuple[str, float]]:
+        return self.db.query(Crypto.symbol, Crypto.price).all()
+
+    def get_cryptos_names(self) -> List[Tuple[str, str, int | None]]:
+        return self.db.query(Crypto.symbol, Crypto.name, Crypto.market_cap_rank).all()
+
+    def get_cryptos_market_totals(self) -> Tuple[float, float]:
+        """Returns the summed 24h volume and market cap of all cryptos."""
+        totals = self.db.query(
+            func.coalesce(func.sum(Crypto.volume_24h), 0),
+            func.coalesce(func.sum(Crypto.market_cap), 0),
+        ).one()
+        # The market cap sum is numeric
+        return tuple(float(total) for total in totals)
 
     def get_cryptos_biggest_market_cap(self, limit: int = 3) -> List[Crypto] | None:
         return (
-            self.db.query(Crypto).order_by(Crypto.market_cap.desc()).limit(limit).all()
+            self.db.query(Crypto)
+            .order_by(Crypto.market_cap.desc().nulls_last())
+            .limit(limit)
+            .all()
         )
 
     def get_cryptos_biggest_gainers(self, limit: int = 3) -> List[Crypto] | None:
         return (
             self.db.query(Crypto)
-            .order_by(Crypto.price_change_percentage_24h.desc())
+            .order_by(Crypto.price_change_percentage_24h.desc().nulls_last())
             .limit(limit)
             .all()
         )
@@ -134,7 +408,7 @@ class CryptoRepository:
     def get_cryptos_biggest_losers(self, limit: int = 3) -> List[Crypto] | None:
         return (
             self.db.query(Crypto)
-            .order_by(Crypto.price_change_percentage_24h.asc())
+            .order_by(Crypto.price_change_percentage_24h.asc().nulls_last())
             .limit(limit)
             .all()
         )
@@ -4,10 +4,17 @@ from app.domain.portfolio.models import (
     StockTransaction,
     Stock,
     WatchedStockInPortfolio,
+    StockPosition,
+    StockPortfolioValueSnapshot,
 )
-from sqlalchemy.orm import Session
-from typing import List, Dict
-from datetime import datetime
+from fastapi_pagination.bases import AbstractPage
+from fastapi_pagination.ext.sqlalchemy import paginate
+from sqlalchemy import case, func, select, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session, joinedload, selectinload
+from typing import List, Dict, Tuple
+from datetime import date, datetime
+from uuid import UUID
 
 
 class StockPortfolioRepository:
@@ -22,14 +29,71 @@ class StockPortfolioRepository:
 
         return stock_portfolio
 
+    def _portfolio_list_options(self) -> list:
+        # Everything behind the totals of StockPortfolioSchema
+        return [
+            selectinload(StockPortfolio.watched_stocks),
+            selectinload(StockPortfolio.stock_transactions),
+            selectinload(StockPortfolio.stock_positions).joinedload(
+                StockPosition.stock
+            ),
+        ]
+
+    def _portfolio_detail_options(self) -> list:
+        # List totals plus the stocks of watched entries and transactions;
+        # historical prices are queried per chart window by the value engine
+        return self._portfolio_list_options() + [
+            selectinload(StockPortfolio.watched_stocks).joinedload(
+                WatchedStockInPortfolio.stock
+            ),
+            selectinload(StockPortfolio.stock_transactions).joinedload(
+                StockTransaction.stock
+            ),
+        ]
+
     def get_all_stock_portfolios(self, user_id: str) -> List[StockPortfolio]:
         return (
             self.db.query(StockPortfolio)
+            .options(*self._portfolio_list_options())
+            .filter(StockPortfolio.owner_id == user_id)
+            .order_by(StockPortfolio.created_at.desc())
+            .all()
+        )
+
+    def get_stock_portfolios_page(self, user_id: str) -> AbstractPage[StockPortfolio]:
+        """
+        Returns the requested page of the user's portfolios, read with LIMIT and
+        OFFSET, so the totals are only loaded for the portfolios on it.
+        """
+        return paginate(
+            self.db,
+            select(StockPortfolio)
+            .options(*self._portfolio_list_options())
+            .where(StockPortfolio.owner_id == user_id)
+            .order_by(StockPortfolio.created_at.desc(), StockPortfolio.id),
+        )
+
+    def get_all_stock_portfolios_with_details(
+        self, user_id: str
+    ) -> List[StockPortfolio]:
+        return (
+            self.db.query(StockPortfolio)
+            .options(*self._portfolio_detail_options())
             .filter(StockPortfolio.owner_id == user_id)
             .order_by(StockPortfolio.created_at.desc())
             .all()
         )
 
+    def get_stock_portfolio_detail_by_id(
+        self, portfolio_id: str
+    ) -> StockPortfolio | None:
+        return (
+            self.db.query(StockPortfolio)
+            .options(*self._portfolio_detail_options())
+            .filter(StockPortfolio.id == portfolio_id)
+            .first()
+        )
+
     def delete_all_stock_portfolios(self, user_id: str) -> None:
         stock_portfolios = (
             self.db.query(StockPortfolio)
@@ -152,6 +216,46 @@ class StockPortfolioRepository:
             query = query.filter(StockTransaction.stock == stock)
         return query.order_by(StockTransaction.transaction_date.desc()).all()
 
+    def _transactions_in_stock_portfolio_query(
+        self, portfolio_id: str, stock: Stock = None
+    ):
+        query = (
+            select(StockTransaction)
+            .options(joinedload(StockTransaction.stock))
+            .where(StockTransaction.portfolio_id == portfolio_id)
+        )
+        if stock:
+            query = query.where(StockTransaction.stock_id == stock.id)
+        return query.order_by(
+            StockTransaction.transaction_date.desc(), StockTransaction.id.desc()
+        )
+
+    def get_stock_transactions_page(
+        self, portfolio_id: str, stock: Stock = None
+    ) -> AbstractPage[StockTransaction]:
+        return paginate(
+            self.db, self._transactions_in_stock_portfolio_query(portfolio_id, stock)
+        )
+
+    def get_stock_transactions_after(
+        self,
+        portfolio_id: str,
+        stock: Stock = None,
+        after: Tuple[datetime, UUID] | None = None,
+        limit: int = 50,
+    ) -> List[StockTransaction]:
+        """
+        Returns up to `limit` transactions following the (date, id) key `after`,
+        newest first. Served by the portfolio/date index without an OFFSET scan.
+        """
+        query = self._transactions_in_stock_portfolio_query(portfolio_id, stock)
+        if after is not None:
+            query = query.where(
+                tuple_(StockTransaction.transaction_date, StockTransaction.id)
+                < tuple_(*after)
+            )
+        return self.db.scalars(query.limit(limit)).unique().all()
+
     def get_transaction_in_stock_portfolio_by_id(
         self, portfolio_id: str, transaction_id: str
     ) -> StockTransaction | None:
@@ -169,6 +273,10 @@ class StockPortfolioRepository:
     ) -> StockTransaction:
         transaction = StockTransaction(**transaction_data)
         self.db.add(transaction)
+        # flush assigns stock_id from the stock relationship
+        self.db.flush()
+        position = self._apply_transaction_to_position(transaction, 1)
+        self._refresh_position_last_tx_date(position)
         self.db.commit()
         self.db.refresh(transaction)
 
@@ -177,11 +285,17 @@ class StockPortfolioRepository:
     def update_transaction_in_stock_portfolio(
         self, transaction: StockTransaction, update_data: Dict
     ) -> StockTransaction:
+        old_position = self._apply_transaction_to_position(transaction, -1)
         for key, value in update_data.items():
             if value is None:
                 continue
             setattr(transaction, key, value)
 
+        self.db.flush()
+        new_position = self._apply_transaction_to_position(transaction, 1)
+        self._refresh_position_last_tx_date(old_position)
+        if new_position is not old_position:
+            self._refresh_position_last_tx_date(new_position)
         self.db.commit()
         self.db.refresh(transaction)
 
@@ -190,7 +304,9 @@ class StockPortfolioRepository:
     def delete_transaction_in_stock_portfolio(
         self, transaction: StockTransaction
     ) -> bool:
+        position = self._apply_transaction_to_position(transaction, -1)
         self.db.delete(transaction)
+        self._refresh_position_last_tx_date(position)
         self.db.commit()
         return True
 
@@ -207,5 +323,159 @@ class StockPortfolioRepository:
             return False
         for transaction in transactions:
             self.db.delete(transaction)
+
+        positions = self.db.query(StockPosition).filter(
+            StockPosition.portfolio_id == portfolio_id
+        )
+        if stock:
+            positions = positions.filter(StockPosition.stock_id == stock.id)
+        positions.delete(synchronize_session="fetch")
         self.db.commit()
         return True
+
+    def get_stock_position(
+        self, portfolio_id: str, stock_id: int
+    ) -> StockPosition | None:
+        return self.db.get(StockPosition, (UUID(str(portfolio_id)), stock_id))
+
+    def _apply_transaction_to_position(
+        self, transaction: StockTransaction, sign: int
+    ) -> StockPosition:
+        """
+        Adds (`sign=1`) or removes (`sign=-1`) the transaction from the running
+        totals of its position. Changes are left for the caller to commit
+        together with the transaction itself.
+
+        The totals are incremented in a single upsert, which locks the row
+        until commit, so concurrent transactions on the same position neither
+        lose an update nor race to create it.
+        """
+        portfolio_id = UUID(str(transaction.portfolio_id))
+        value = transaction.amount * transaction.price_per_unit
+        transaction_type = transaction.transaction_type.lower()
+        quantity = cost = proceeds = 0
+        if transaction_type == "buy":
+            quantity = sign * transaction.amount
+            cost = sign * value
+        elif transaction_type == "sell":
+            quantity = -sign * transaction.amount
+            proceeds = sign * value
+
+        statement = insert(StockPosition).values(
+            portfolio_id=portfolio_id,
+            stock_id=transaction.stock_id,
+            quantity=quantity,
+            cost=cost,
+            proceeds=proceeds,
+        )
+        self.db.execute(
+            statement.on_conflict_do_update(
+                index_elements=[StockPosition.portfolio_id, StockPosition.stock_id],
+                set_={
+                    "quantity": StockPosition.quantity + statement.excluded.quantity,
+                    "cost": StockPosition.cost + statement.excluded.cost,
+                    "proceeds": StockPosition.proceeds + statement.excluded.proceeds,
+                },
+            )
+        )
+        return self.db.get(
+            StockPosition, (portfolio_id, transaction.stock_id), populate_existing=True
+        )
+
+    def _refresh_position_last_tx_date(self, position: StockPosition) -> None:
+        self.db.flush()
+        last_tx_date = (
+            self.db.query(func.max(StockTransaction.transaction_date))
+            .filter(
+                StockTransaction.portfolio_id == position.portfolio_id,
+                StockTransaction.stock_id == position.stock_id,
+            )
+            .scalar()
+        )
+        if last_tx_date is None:
+            # no transactions left for this asset
+            self.db.delete(position)
+        else:
+            position.last_tx_date = last_tx_date
+
+    def rebuild_stock_positions(self, portfolio_id: str = None) -> int:
+        """
+        Recomputes the materialized positions from the transactions, for one
+        portfolio or for all of them. Used to backfill existing portfolios.
+        """
+        transaction_type = func.lower(StockTransaction.transaction_type)
+        value = StockTransaction.amount * StockTransaction.price_per_unit
+        totals = self.db.query(
+            StockTransaction.portfolio_id,
+            StockTransaction.stock_id,
+            func.sum(
+                case(
+                    (transaction_type == "buy", StockTransaction.amount),
+                    (transaction_type == "sell", -StockTransaction.amount),
+                    else_=0,
+                )
+            ),
+            func.sum(case((transaction_type == "buy", value), else_=0)),
+            func.sum(case((transaction_type == "sell", value), else_=0)),
+            func.max(StockTransaction.transaction_date),
+        ).group_by(StockTransaction.portfolio_id, StockTransaction.stock_id)
+        positions = self.db.query(StockPosition)
+        if portfolio_id:
+            totals = totals.filter(StockTransaction.portfolio_id == portfolio_id)
+            positions = positions.filter(StockPosition.portfolio_id == portfolio_id)
+
+        totals = totals.all()
+        positions.delete(synchronize_session="fetch")
+        self.db.add_all(
+            [
+                StockPosition(
+                    portfolio_id=row_portfolio_id,
+                    stock_id=stock_id,
+                    quantity=quantity,
+                    cost=cost,
+                    proceeds=proceeds,
+                    last_tx_date=last_tx_date,
+                )
+                for (
+                    row_portfolio_id,
+                    stock_id,
+                    quantity,
+                    cost,
+                    proceeds,
+                    last_tx_date,
+                ) in totals
+            ]
+        )
+        self.db.commit()
+        return len(totals)
+
+    def get_every_stock_portfolio(self) -> List[StockPortfolio]:
+        return self.db.query(StockPortfolio).all()
+
+    def get_last_stock_portfolio_value_snapshot_day(
+        self, portfolio_id: str
+    ) -> date | None:
+        return (
+            self.db.query(func.max(StockPortfolioValueSnapshot.day))
+            .filter(StockPortfolioValueSnapshot.portfolio_id == portfolio_id)
+            .scalar()
+        )
+
+    def replace_stock_portfolio_value_snapshots(
+        self, portfolio_id: str, from_day: date, snapshots: List[Dict]
+    ) -> None:
+        """
+        Replaces the snapshots of the portfolio from `from_day` onwards, so days
+        left without holdings by a changed transaction are dropped as well.
+        """
+        self.db.query(StockPortfolioValueSnapshot).filter(
+            StockPortfolioValueSnapshot.portfolio_id == portfolio_id,
+            StockPortfolioValueSnapshot.day >= from_day,
+        ).delete(synchronize_session=False)
+        self.db.add_all(
+            [
+                StockPortfolioValueSnapshot(portfolio_id=portfolio_id, **snapshot)
+                for snapshot in snapshots
+            ]
+        )
+        self.db.commit()
@@ -1,8 +1,22 @@
 # gpw_repository.py
 from app.domain.portfolio.models import Stock, StockHistoricalPrice
+from app.domain.portfolio.asset_search import asset_search_query, search_assets
+from fastapi_pagination.bases import AbstractPage
+from fastapi_pagination.ext.sqlalchemy import paginate
+from app.domain.portfolio.valuation.price_series import load_price_series
+from app.domain.portfolio.valuation.ohlcv_resampling import (
+    load_period_first_dates,
+    resample_prices,
+)
+from sqlalchemy import and_, func, or_, select, text
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import Session
-from typing import List, Dict
-from datetime import datetime
+from typing import List, Dict, Iterable, Tuple
+from datetime import datetime, timedelta
+import numpy as np
+
+# date_trunc unit of the intervals candles can be rolled into
+DATE_TRUNC_UNITS = {"1h": "hour", "1d": "day", "1w": "week"}
 
 
 def update_model(model: Stock, data: dict) -> Stock:
@@ -27,16 +41,23 @@ class StockRepository:
     def get_all_stocks(self) -> List[Stock]:
         return self.db.query(Stock).order_by(Stock.market_cap_rank.asc()).all()
 
-    def get_stock_by_name_or_symbol_alike(self, name_or_symbol: str) -> List[Stock]:
-        return (
-            self.db.query(Stock)
-            .filter(
-                Stock.name.ilike(f"%{name_or_symbol}%")
-                | Stock.symbol.ilike(f"%{name_or_symbol}%")
+    def get_stocks_page(self, name_or_symbol: str = None) -> AbstractPage[Stock]:
+        """
+        Returns the requested page of stocks by market cap rank, or of the
+        matches of `name_or_symbol`, read with LIMIT and OFFSET.
+        """
+        if name_or_symbol:
+            query = asset_search_query(Stock, name_or_symbol)
+        else:
+            query = select(Stock).order_by(
+                Stock.market_cap_rank.asc().nulls_last(), Stock.id
             )
-            .order_by(Stock.market_cap_rank.asc())
-            .all()
-        )
+        return paginate(self.db, query)
+
+    def get_stock_by_name_or_symbol_alike(
+        self, name_or_symbol: str, limit: int = None
+    ) -> List[Stock]:
+        return search_assets(self.db, Stock, name_or_symbol, limit)
 
     def update_stock(self, update_data: Dict) -> Stock:
         existing_stock = self.get_stock_by_symbol(update_data["symbol"])
@@ -66,6 +87,97 @@ class StockRepository:
 
         return historical_price
 
+    def upsert_stock_historical_prices(
+        self, historical_prices: List[Dict], batch_size: int = 1000
+    ) -> int:
+        """
+        Writes candles with `INSERT ... ON CONFLICT DO UPDATE` and one commit.
+
+        Stored candles get their prices updated, as the latest candle keeps
+        changing until its interval closes. A candle repeated in the input is
+        written once, with its last values. Returns the number of candles written.
+        """
+        unique_prices = {
+            (data["stock_id"], data["period"], data["interval"], data["date"]): data
+            for data in historical_prices
+        }
+        rows = list(unique_prices.values())
+
+        for start in range(0, len(rows), batch_size):
+            statement = insert(StockHistoricalPrice).values(
+                rows[start : start + batch_size]
+            )
+            statement = statement.on_conflict_do_update(
+                constraint="uq_stock_historical_prices_candle",
+                set_={
+                    column: statement.excluded[column]
+                    for column in (
+                        "open_price",
+                        "close_price",
+                        "high_price",
+                        "low_price",
+                        "volume",
+                    )
+                },
+            )
+            self.db.execute(statement)
+        self.db.commit()
+
+        return len(rows)
+
+    def downsample_stock_historical_prices(
+        self, period: str, keep: timedelta, interval: str
+    ) -> int:
+        """
+        Rolls the candles of `period` older than `keep` into `interval` bars
+        (first open, max high, min low, last close, summed volume) and deletes
+        the originals, in one statement. Only whole bars before the cutoff are
+        rolled, so every bar is built from all of its candles. Returns the
+        number of candles rolled up.
+        """
+        unit = DATE_TRUNC_UNITS[interval]
+        statement = text("""
+            WITH rolled AS (
+                DELETE FROM stock_historical_prices
+                WHERE period = :period
+                  AND interval <> :interval
+                  AND date < date_trunc(:unit, now() - :keep, 'Europe/Warsaw')
+                RETURNING stock_id, date, open_price, high_price, low_price,
+                          close_price, volume
+            ), inserted AS (
+                INSERT INTO stock_historical_prices AS stored (
+                    stock_id, period, interval, date, open_price, high_price,
+                    low_price, close_price, volume
+                )
+                SELECT
+                    stock_id,
+                    :period,
+                    :interval,
+                    date_trunc(:unit, date, 'Europe/Warsaw') AS bar,
+                    (array_agg(open_price ORDER BY date))[1],
+                    max(high_price),
+                    min(low_price),
+                    (array_agg(close_price ORDER BY date DESC))[1],
+                    sum(volume)
+                FROM rolled
+                GROUP BY stock_id, bar
+                ON CONFLICT ON CONSTRAINT uq_stock_historical_prices_candle
+                DO UPDATE SET
+                    high_price = greatest(stored.high_price, excluded.high_price),
+                    low_price = least(stored.low_price, excluded.low_price),
+                    close_price = excluded.close_price,
+                    volume = coalesce(stored.volume, 0) + coalesce(excluded.volume, 0)
+            )
+            SELECT count(*) FROM rolled
+            """)
+        rolled = self.db.execute(
+            statement,
+            {"period": period, "interval": interval, "unit": unit, "keep": keep},
+        ).scalar()
+        self.db.commit()
+
+        return rolled
+
     def update_stock_historical_price(
         self, historical_price: StockHistoricalPrice, update_data: Dict
     ) -> StockHistoricalPrice:
@@ -142,6 +254,104 @@ class StockRepository:
             .all()
         )
 
+    def get_stock_price_series(
+        self,
+        stock_ids: Iterable[int],
+        periods: Iterable[str],
+        since: datetime = None,
+        until: datetime = None,
+    ) -> Dict[int, Tuple[np.ndarray, np.ndarray]]:
+        return load_price_series(
+            self.db, StockHistoricalPrice, "stock", stock_ids, periods, since, until
+        )
+
+    def get_stock_period_first_dates(
+        self, stock_id: int
+    ) -> Dict[Tuple[str, str], datetime]:
+        return load_period_first_dates(self.db, StockHistoricalPrice, "stock", stock_id)
+
+    def get_stock_resampled_prices(
+        self,
+        stock_id: int,
+        period: str,
+        intervals: List[str],
+        seconds: int,
+        from_date: datetime,
+        to_date: datetime,
+    ) -> List[Dict]:
+        return resample_prices(
+            self.db,
+            StockHistoricalPrice,
+            "stock",
+            stock_id,
+            period,
+            intervals,
+            seconds,
+            from_date,
+            to_date,
+        )
+
+    def get_stock_candle_high_water_marks(
+        self, symbols: Iterable[str]
+    ) -> Dict[str, Dict[str, datetime]]:
+        """
+        Returns `{symbol: {period: date}}` with the date of the last stored
+        candle of every period.
+        """
+        rows = (
+            self.db.query(
+                Stock.symbol,
+                StockHistoricalPrice.period,
+                func.max(StockHistoricalPrice.date),
+            )
+            .join(StockHistoricalPrice.stock)
+            .filter(Stock.symbol.in_(list(symbols)))
+            .group_by(Stock.symbol, StockHistoricalPrice.period)
+            .all()
+        )
+        high_water_marks = {}
+        for symbol, period, date in rows:
+            high_water_marks.setdefault(symbol, {})[period] = date
+        return high_water_marks
+
+    def get_stock_first_open_prices(
+        self, symbols: Iterable[str], windows: Dict[str, datetime | None]
+    ) -> Dict[str, Dict[str, float]]:
+        """
+        Returns `{symbol: {period: open_price}}` with the open of the first
+        stored candle of every period in `windows`, starting at the window date
+        (or at the first candle if it is None).
+        """
+        conditions = [
+            (
+                and_(
+                    StockHistoricalPrice.period == period,
+                    StockHistoricalPrice.date >= since,
+                )
+                if since is not None
+                else StockHistoricalPrice.period == period
+            )
+            for period, since in windows.items()
+        ]
+        rows = (
+            self.db.query(
+                Stock.symbol,
+                StockHistoricalPrice.period,
+                StockHistoricalPrice.open_price,
+            )
+            .join(StockHistoricalPrice.stock)
+            .filter(Stock.symbol.in_(list(symbols)), or_(*conditions))
+            .distinct(Stock.symbol, StockHistoricalPrice.period)
+            .order_by(
+                Stock.symbol, StockHistoricalPrice.period, StockHistoricalPrice.date
+            )
+            .all()
+        )
+        first_opens = {}
+        for symbol, period, open_price in rows:
+            first_opens.setdefault(symbol, {})[period] = open_price
+        return first_opens
+
     def get_stocks_biggest_market_cap(self, limit: int = 3) -> List[Stock] | None:
         return (
             self.db.query(Stock)
@@ -161,13 +371,33 @@ class StockRepository:
             .all()
         )
 
+    def get_stocks_prices(self) -> List[Tuple[str, float]]:
+        return self.db.query(Stock.symbol, Stock.price).all()
+
+    def get_stocks_names(self) -> List[Tuple[str, str, int | None]]:
+        return self.db.query(Stock.symbol, Stock.name, Stock.market_cap_rank).all()
+
+    def get_stocks_market_totals(self) -> Tuple[float, float]:
+        """Returns the summed 24h volume and market cap of all stocks."""
+        totals = self.db.query(
+            func.coalesce(func.sum(Stock.volume_24h), 0),
+            func.coalesce(func.sum(Stock.market_cap), 0),
+        ).one()
+        # The market cap sum is numeric
+        return tuple(float(total) for total in totals)
+
     def get_stocks_biggest_market_cap(self, limit: int = 3) -> List[Stock] | None:
-        return self.db.query(Stock).order_by(Stock.market_cap.desc()).limit(limit).all()
+        return (
+            self.db.query(Stock)
+            .order_by(Stock.market_cap.desc().nulls_last())
+            .limit(limit)
+            .all()
+        )
 
     def get_stocks_biggest_gainers(self, limit: int = 3) -> List[Stock] | None:
         return (
             self.db.query(Stock)
-            .order_by(Stock.price_change_percentage_24h.desc())
+            .order_by(Stock.price_change_percentage_24h.desc().nulls_last())
             .limit(limit)
             .all()
         )
@@ -175,7 +405,7 @@ class StockRepository:
     def get_stocks_biggest_losers(self, limit: int = 3) -> List[Stock] | None:
         return (
             self.db.query(Stock)
-            .order_by(Stock.price_change_percentage_24h.asc())
+            .order_by(Stock.price_change_percentage_24h.asc().nulls_last())
             .limit(limit)
             .all()
         )
@@ -10,7 +10,7 @@ from app.domain.portfolio.schemas.stock_schemas import (
     StockBiggestMarketSchema,
     StockSearchSchema,
 )
-from typing import List
+from typing import List, Literal
 
 
 class GlobalCryptoPerformanceSchema(BaseModel):
@@ -54,6 +54,12 @@ class CurrencyConvertList(StockConvertList):
     pass
 
 
+class AutocompleteResultSchema(BaseModel):
+    symbol: str
+    name: str
+    asset_type: Literal["stock", "crypto"]
+
+
 class GlobalAssetsToConvert(BaseModel):
     stocks: List[StockConvertList]
     cryptos: List[CryptoConvertList]
@@ -0,0 +1,98 @@
+from bisect import bisect_left
+from typing import Any, Dict, List, NamedTuple, Tuple
+import heapq
+import unicodedata
+from sqlalchemy.orm import Session
+from app.core import cache
+from app.core.cache import InProcessIndex
+from app.domain.portfolio.repositories.crypto_repository import CryptoRepository
+from app.domain.portfolio.repositories.stock_repository import StockRepository
+
+# Letters NFKD does not decompose into a base letter and a diacritic
+FOLDED_LETTERS = str.maketrans({"ł": "l", "Ł": "L", "ø": "o", "Ø": "O", "ß": "ss"})
+
+# Match kinds, better first
+EXACT_SYMBOL, SYMBOL_PREFIX, NAME_PREFIX = 0, 1, 2
+
+
+def fold(text: str) -> str:
+    """Lowercases `text` and strips diacritics, so `Łódź` matches `lodz`."""
+    decomposed = unicodedata.normalize("NFKD", text.translate(FOLDED_LETTERS))
+    return "".join(
+        char for char in decomposed if not unicodedata.combining(char)
+    ).casefold()
+
+
+class AutocompleteData(NamedTuple):
+    # Sorted folded symbols, names and name words
+    keys: List[str]
+    # (asset, match kind) of each key
+    postings: List[Tuple[int, int]]
+    # Assets ordered by market cap rank, the tiebreak between equal matches
+    assets: List[Dict[str, Any]]
+
+
+class AssetAutocompleteIndex(InProcessIndex):
+    """
+    Sorted array of the folded symbols and names of all stocks and cryptos,
+    kept in process memory, so search-as-you-type is answered with a binary
+    search instead of database queries.
+    """
+
+    NAMESPACES = (cache.STOCKS, cache.CRYPTOS)
+
+    def search(self, prefix: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Returns up to `limit` assets with a symbol, name or name word starting
+        with `prefix`: the exact symbol first, then symbol and name prefix
+        matches, by market cap rank.
+        """
+        prefix = fold(prefix.strip())
+        if not prefix:
+            return []
+        data: AutocompleteData = self.get()
+
+        best_kinds = {}
+        for position in range(bisect_left(data.keys, prefix), len(data.keys)):
+            key = data.keys[position]
+            if not key.startswith(prefix):
+                break
+            asset, kind = data.postings[position]
+            if kind == SYMBOL_PREFIX and key == prefix:
+                kind = EXACT_SYMBOL
+            best_kinds[asset] = min(kind, best_kinds.get(asset, kind))
+
+        ranked = heapq.nsmallest(
+            limit, best_kinds, key=lambda asset: (best_kinds[asset], asset)
+        )
+        return [data.assets[asset] for asset in ranked]
+
+    def load(self, db: Session) -> AutocompleteData:
+        rows = [
+            (rank, "stock", symbol, name)
+            for symbol, name, rank in StockRepository(db_session=db).get_stocks_names()
+        ] + [
+            (rank, "crypto", symbol, name)
+            for symbol, name, rank in CryptoRepository(
+                db_session=db
+            ).get_cryptos_names()
+        ]
+        rows.sort(key=lambda row: (row[0] is None, row[0] or 0, row[2]))
+
+        entries = []
+        assets = []
+        for asset, (_, asset_type, symbol, name) in enumerate(rows):
+            assets.append({"symbol": symbol, "name": name, "asset_type": asset_type})
+            entries.append((fold(symbol), asset, SYMBOL_PREFIX))
+            folded_name = fold(name)
+            entries.append((folded_name, asset, NAME_PREFIX))
+            # Later words too, so `polski` finds `PKO Bank Polski`
+            for word in folded_name.split()[1:]:
+                entries.append((word, asset, NAME_PREFIX))
+        entries.sort()
+
+        return AutocompleteData(
+            keys=[key for key, _, _ in entries],
+            postings=[(asset, kind) for _, asset, kind in entries],
+            assets=assets,
+        )
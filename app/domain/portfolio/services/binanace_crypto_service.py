@@ -1,5 +1,10 @@
 from typing import List, Dict, Any
+from datetime import datetime, timedelta
+import pytz
+from app.core import cache
+from app.core.cache import ResponseCache
 from app.domain.portfolio.fetchers.crypto_fetchers import BinanaceCryptoFetcher
+from app.domain.portfolio.fetchers.binance_symbol_index import BinanceSymbolIndex
 from app.domain.portfolio.repositories.crypto_repository import CryptoRepository
 from app.domain.portfolio.schemas.crypto_historical_schemas import (
     CryptoHistoricalPriceSchema,
@@ -16,10 +21,14 @@ class BinanaceCryptoService:
         fetcher: BinanaceCryptoFetcher,
         repository: CryptoRepository,
         pair_rate_repository: CurrencyPairRateRepository,
+        symbol_index: BinanceSymbolIndex = None,
+        response_cache: ResponseCache = None,
     ):
         self.fetcher = fetcher
         self.pair_rate_repository = pair_rate_repository
         self.repository = repository
+        self.symbol_index = symbol_index
+        self.response_cache = response_cache
 
     def fetch_and_save_historical_crypto_data(self):
         cryptos = self.repository.get_all_cryptos()
@@ -27,24 +36,48 @@ class BinanaceCryptoService:
         usd_to_pln = self.pair_rate_repository.get_currency_pair_rate_by_quote_and_base(
             "PLN", "USD"
         )
+        symbols = [crypto.symbol for crypto in cryptos]
+        # Candles before the last stored one of each period are not fetched
+        # again, so the price changes start from the first stored candles
+        high_water_marks = self.repository.get_crypto_candle_high_water_marks(symbols)
+        now = datetime.now(pytz.timezone("Europe/Warsaw"))
+        first_opens = self.repository.get_crypto_first_open_prices(
+            symbols,
+            {
+                "1m": now - timedelta(days=30),
+                "1y": now - timedelta(weeks=52),
+                "max": None,
+            },
+        )
+        # Coins not listed on Binance are skipped without any request
+        pairs = self.symbol_index.get_pairs() if self.symbol_index else None
+        # Fetched concurrently, the candles are then saved in this thread
+        historical_data_by_symbol = self.fetcher.fetch_historical_cryptos_data(
+            symbols, usd_to_pln.rate, since=high_water_marks, pairs=pairs
+        )
+        # Candles and price changes of all coins are written in bulk at the end
+        historical_prices = []
+        price_changes = []
         for crypto in cryptos:
-            historical_data = self.fetcher.fetch_historical_crypto_data(
-                crypto.symbol, usd_to_pln.rate
-            )
+            crypto_first_opens = first_opens.get(crypto.symbol, {})
+            historical_data = historical_data_by_symbol.get(crypto.symbol)
             historical_data_list.append(historical_data)
             percentaged_calculated_1m = False
             percentaged_calculated_1y = False
             percentaged_calculated_max = False
             if not historical_data:
                 continue
-            price_change_percentage_dict = {"symbol": crypto.symbol}
+            price_change_percentage_dict = {"id": crypto.id}
             for i, data_point in enumerate(historical_data, start=1):
 
                 validated_data = CryptoHistoricalPriceSchema(**data_point).model_dump()
 
                 if not percentaged_calculated_1m and validated_data["period"] == "1m":
                     price_change_percentage = self.calculate_percentage_price_change(
-                        old_price=validated_data["open_price"], new_price=crypto.price
+                        old_price=crypto_first_opens.get(
+                            validated_data["period"], validated_data["open_price"]
+                        ),
+                        new_price=crypto.price,
                     )
 
                     price_change_percentage_dict["price_change_percentage_30d"] = (
@@ -53,7 +86,10 @@ class BinanaceCryptoService:
                     percentaged_calculated_1m = True
                 elif not percentaged_calculated_1y and validated_data["period"] == "1y":
                     price_change_percentage = self.calculate_percentage_price_change(
-                        old_price=validated_data["open_price"], new_price=crypto.price
+                        old_price=crypto_first_opens.get(
+                            validated_data["period"], validated_data["open_price"]
+                        ),
+                        new_price=crypto.price,
                     )
                     price_change_percentage_dict["price_change_percentage_1y"] = (
                         price_change_percentage
@@ -63,23 +99,26 @@ class BinanaceCryptoService:
                     not percentaged_calculated_max and validated_data["period"] == "max"
                 ):
                     price_change_percentage = self.calculate_percentage_price_change(
-                        old_price=validated_data["open_price"], new_price=crypto.price
+                        old_price=crypto_first_opens.get(
+                            validated_data["period"], validated_data["open_price"]
+                        ),
+                        new_price=crypto.price,
                     )
                     price_change_percentage_dict["price_change_percentage_max"] = (
                         price_change_percentage
                     )
                     percentaged_calculated_max = True
 
-                if self.repository.get_crypto_historical_prices_by_symbol_period_date(
-                    symbol=crypto.symbol,
-                    period=validated_data["period"],
-                    date=validated_data["date"],
-                ):
-                    continue
-                self.repository.create_crypto_historical_price(crypto, validated_data)
+                historical_prices.append({**validated_data, "crypto_id": crypto.id})
+
+            price_changes.append(price_change_percentage_dict)
 
-            self.repository.update_crypto(price_change_percentage_dict)
+        self.repository.upsert_crypto_historical_prices(historical_prices)
+        self.repository.update_cryptos(price_changes)
 
+        # The price changes are part of the cached crypto lists
+        if self.response_cache:
+            self.response_cache.bump(cache.CRYPTOS)
         return {}
 
     @staticmethod
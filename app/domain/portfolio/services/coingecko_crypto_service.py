@@ -1,3 +1,6 @@
+from typing import Dict
+from app.core import cache
+from app.core.cache import ResponseCache
 from app.domain.portfolio.models import Crypto
 from app.domain.portfolio.fetchers.crypto_fetchers import CoinGeckoCryptoFetcher
 from app.domain.portfolio.repositories.crypto_repository import CryptoRepository
@@ -5,22 +8,27 @@ from app.domain.portfolio.schemas.crypto_schemas import CryptoFetcherSchema
 
 
 class CoinGeckoCryptoService:
-    def __init__(self, fetcher: CoinGeckoCryptoFetcher, repository: CryptoRepository):
+    def __init__(
+        self,
+        fetcher: CoinGeckoCryptoFetcher,
+        repository: CryptoRepository,
+        response_cache: ResponseCache = None,
+    ):
         self.fetcher = fetcher
         self.repository = repository
+        self.response_cache = response_cache
 
-    def fetch_and_save_crypto_data(self):
+    def fetch_and_save_crypto_data(self) -> Dict[str, int]:
         crypto_data = self.fetcher.fetch_crypto_data()
         if not crypto_data:
             raise Exception("No crypto data found")
 
-        for data in crypto_data:
-            validated_data = CryptoFetcherSchema(**data).model_dump()
+        # Validate the whole payload before writing anything
+        validated_data = [
+            CryptoFetcherSchema(**data).model_dump() for data in crypto_data
+        ]
 
-            crypto = self.repository.get_crypto_by_symbol(validated_data["symbol"])
-            if crypto:
-                self.repository.update_crypto(validated_data)
-            else:
-                self.repository.create_crypto(validated_data)
-
-        return crypto_data
+        counts = self.repository.upsert_cryptos(validated_data)
+        if self.response_cache:
+            self.response_cache.bump(cache.CRYPTOS)
+        return counts
@@ -0,0 +1,36 @@
+from typing import Dict
+from sqlalchemy.orm import Session
+from app.core import cache
+from app.core.cache import InProcessIndex
+from app.domain.portfolio.repositories.crypto_repository import CryptoRepository
+from app.domain.portfolio.repositories.currency_repository import (
+    CurrencyPairRateRepository,
+)
+from app.domain.portfolio.repositories.stock_repository import StockRepository
+
+
+class ConverterPriceIndex(InProcessIndex):
+    """
+    Prices of every stock, crypto and fiat currency by symbol, kept in process
+    memory so conversions run without database queries.
+    """
+
+    NAMESPACES = (cache.STOCKS, cache.CRYPTOS, cache.CURRENCIES)
+
+    def get_price(self, symbol: str) -> float | None:
+        return self.get().get(symbol)
+
+    def load(self, db: Session) -> Dict[str, float]:
+        prices = {}
+        # A symbol resolves to a stock first, then a crypto, then a currency,
+        # as the symbols are looked up in the database
+        for symbol, price in StockRepository(db_session=db).get_stocks_prices():
+            prices.setdefault(symbol, price)
+        for symbol, price in CryptoRepository(db_session=db).get_cryptos_prices():
+            prices.setdefault(symbol, price)
+        for pair_rate in CurrencyPairRateRepository(
+            db_session=db
+        ).get_all_currency_pair_rates():
+            prices.setdefault(pair_rate.base_currency, pair_rate.rate)
+        prices.setdefault("PLN", 1.0)
+        return prices
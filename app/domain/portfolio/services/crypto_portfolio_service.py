@@ -1,8 +1,16 @@
 from app.domain.portfolio.repositories.crypto_portfolio_repository import (
     CryptoPortfolioRepository,
 )
+from app.celery_app import celery_app
 from app.core.exceptions import UnauthorizedError, NotFoundError, BadRequestError
-from app.domain.portfolio.models import Crypto
+from app.core.pagination import decode_cursor, encode_cursor
+from app.domain.portfolio.models import Crypto, CryptoPortfolio, CryptoTransaction
+from fastapi_pagination.bases import AbstractPage
+from kombu.exceptions import OperationalError
+from datetime import datetime
+from typing import Any, Dict
+from uuid import UUID
+import pytz
 
 
 class CryptoPortfolioService:
@@ -13,9 +21,15 @@ class CryptoPortfolioService:
         self.repository = crypto_portfolio_repository
         self.user_id = user_id
 
+    def get_portfolios_page(self) -> AbstractPage[CryptoPortfolio]:
+        return self.repository.get_crypto_portfolios_page(self.user_id)
+
     def get_all_portfolios(self):
         return self.repository.get_all_crypto_portfolios(self.user_id)
 
+    def get_all_portfolios_with_details(self):
+        return self.repository.get_all_crypto_portfolios_with_details(self.user_id)
+
     def create_portfolio(self, portfolio_data: dict):
         portfolio_data["owner_id"] = self.user_id
         return self.repository.create_crypto_portfolio(portfolio_data)
@@ -45,9 +59,17 @@ class CryptoPortfolioService:
         return self.repository.delete_all_crypto_portfolios(self.user_id)
 
     def get_portfolio_by_id(
-        self, portfolio_id: str, validate_permission_to_edit: bool = False
+        self,
+        portfolio_id: str,
+        validate_permission_to_edit: bool = False,
+        with_details: bool = False,
     ):
-        crypto_portfolio = self.repository.get_crypto_portfolio_by_id(portfolio_id)
+        if with_details:
+            crypto_portfolio = self.repository.get_crypto_portfolio_detail_by_id(
+                portfolio_id
+            )
+        else:
+            crypto_portfolio = self.repository.get_crypto_portfolio_by_id(portfolio_id)
         if not crypto_portfolio:
             raise NotFoundError("Nie znaleziono portfela")
 
@@ -155,29 +177,40 @@ class CryptoPortfolioService:
             if not crypto_id:
                 raise BadRequestError("Brak identyfikatora kryptowaluty w transakcji")
 
-            # Pobierz wszystkie transakcje dla tej kryptowaluty w portfelu
-            transactions = crypto_portfolio.crypto_transactions
-            total_bought = sum(
-                t.amount
-                for t in transactions
-                if t.crypto_id == crypto_id
-                and t.transaction_type == "buy"
-                and t.transaction_date <= transaction_data["transaction_date"]
-            )
-            total_sold = sum(
-                t.amount
-                for t in transactions
-                if t.crypto_id == crypto_id
-                and t.transaction_type == "sell"
-                and t.transaction_date <= transaction_data["transaction_date"]
-            )
-            current_amount = total_bought - total_sold
+            position = self.repository.get_crypto_position(portfolio_id, crypto_id)
+            if position is None:
+                current_amount = 0
+            elif transaction_data["transaction_date"] >= position.last_tx_date:
+                # Sprzedaż po ostatniej transakcji - wystarczy stan pozycji
+                current_amount = position.quantity
+            else:
+                # Sprzedaż wsteczna - stan na dzień transakcji z historii
+                transactions = crypto_portfolio.crypto_transactions
+                total_bought = sum(
+                    t.amount
+                    for t in transactions
+                    if t.crypto_id == crypto_id
+                    and t.transaction_type == "buy"
+                    and t.transaction_date <= transaction_data["transaction_date"]
+                )
+                total_sold = sum(
+                    t.amount
+                    for t in transactions
+                    if t.crypto_id == crypto_id
+                    and t.transaction_type == "sell"
+                    and t.transaction_date <= transaction_data["transaction_date"]
+                )
+                current_amount = total_bought - total_sold
 
             if transaction_data["amount"] > current_amount:
                 raise BadRequestError(
                     "Nie można sprzedać więcej niż posiadasz w portfelu w danym momencie czasu"
                 )
-        return self.repository.create_transaction_in_crypto_portfolio(transaction_data)
+        transaction = self.repository.create_transaction_in_crypto_portfolio(
+            transaction_data
+        )
+        self._refresh_value_snapshots(portfolio_id, transaction.transaction_date)
+        return transaction
 
     def get_transaction_in_portfolio(self, portfolio_id: str, transaction_id: str):
         crypto_portfolio = self.get_portfolio_by_id(
@@ -191,6 +224,53 @@ class CryptoPortfolioService:
         return transaction
 
     def get_transactions_in_portfolio(self, portfolio_id: str, crypto: Crypto = None):
+        self._check_transactions_filter(portfolio_id, crypto)
+        transactions = self.repository.get_all_transactions_in_crypto_portfolio(
+            portfolio_id, crypto=crypto
+        )
+
+        return transactions
+
+    def get_transactions_in_portfolio_page(
+        self, portfolio_id: str, crypto: Crypto = None
+    ) -> AbstractPage[CryptoTransaction]:
+        self._check_transactions_filter(portfolio_id, crypto)
+        return self.repository.get_crypto_transactions_page(portfolio_id, crypto=crypto)
+
+    def get_transactions_in_portfolio_after(
+        self,
+        portfolio_id: str,
+        crypto: Crypto = None,
+        cursor: str = None,
+        size: int = 50,
+    ) -> Dict[str, Any]:
+        """
+        Returns `size` transactions after `cursor` (newest first when None) and
+        the cursor of the next page, None on the last one.
+        """
+        self._check_transactions_filter(portfolio_id, crypto)
+        after = None
+        if cursor:
+            try:
+                transaction_date, transaction_id = decode_cursor(cursor)
+                after = (datetime.fromisoformat(transaction_date), UUID(transaction_id))
+            except (TypeError, ValueError):
+                raise BadRequestError("Nieprawidłowy kursor")
+
+        # One extra row tells whether there is a next page
+        transactions = self.repository.get_crypto_transactions_after(
+            portfolio_id, crypto=crypto, after=after, limit=size + 1
+        )
+        next_cursor = None
+        if len(transactions) > size:
+            transactions = transactions[:size]
+            last = transactions[-1]
+            next_cursor = encode_cursor(
+                [last.transaction_date.isoformat(), str(last.id)]
+            )
+        return {"items": transactions, "next_cursor": next_cursor}
+
+    def _check_transactions_filter(self, portfolio_id: str, crypto: Crypto = None):
         crypto_portfolio = self.get_portfolio_by_id(
             portfolio_id, validate_permission_to_edit=False
         )
@@ -203,11 +283,6 @@ class CryptoPortfolioService:
             )
         ):
             raise BadRequestError("Kryptowaluta nie jest obserwowana w tym portfelu")
-        transactions = self.repository.get_all_transactions_in_crypto_portfolio(
-            portfolio_id, crypto=crypto
-        )
-
-        return transactions
 
     def update_transaction_in_portfolio(
         self, portfolio_id: str, transaction_id: str, update_data: dict
@@ -256,32 +331,26 @@ class CryptoPortfolioService:
             if not crypto_id:
                 raise BadRequestError("Brak identyfikatora kryptowaluty w transakcji")
 
-            # Pobierz wszystkie transakcje dla tej kryptowaluty w portfelu
-            transactions = crypto_portfolio.crypto_transactions
-            total_bought = sum(
-                t.amount
-                for t in transactions
-                if t.crypto_id == crypto_id
-                and t.transaction_type == "buy"
-                and str(transaction_id) != str(t.id)
-            )
-            total_sold = sum(
-                t.amount
-                for t in transactions
-                if t.crypto_id == crypto_id
-                and t.transaction_type == "sell"
-                and str(transaction_id) != str(t.id)
-            )
-            print("total_bought:", total_bought, "total_sold:", total_sold)
-            current_amount = total_bought - total_sold
+            # Stan pozycji bez edytowanej transakcji
+            position = self.repository.get_crypto_position(portfolio_id, crypto_id)
+            current_amount = position.quantity if position else 0
+            if transaction.crypto_id == crypto_id:
+                if transaction.transaction_type == "buy":
+                    current_amount -= transaction.amount
+                elif transaction.transaction_type == "sell":
+                    current_amount += transaction.amount
 
             if update_data["amount"] > current_amount:
                 raise BadRequestError(
                     "Nie można sprzedać więcej niż posiadasz w portfelu"
                 )
+        previous_transaction_date = transaction.transaction_date
         transaction = self.repository.update_transaction_in_crypto_portfolio(
             transaction, update_data
         )
+        self._refresh_value_snapshots(
+            portfolio_id, min(previous_transaction_date, transaction.transaction_date)
+        )
 
         return transaction
 
@@ -296,7 +365,9 @@ class CryptoPortfolioService:
         if not transaction:
             raise NotFoundError("Nie znaleziono transakcji")
 
+        transaction_date = transaction.transaction_date
         self.repository.delete_transaction_in_crypto_portfolio(transaction)
+        self._refresh_value_snapshots(portfolio_id, transaction_date)
         return True
 
     def delete_all_transactions_in_portfolio(
@@ -320,14 +391,38 @@ class CryptoPortfolioService:
         if not avoid_non_found and len(transactions) == 0:
             raise NotFoundError("Brak transakcji w tym portfelu")
 
+        first_transaction_date = min(
+            (t.transaction_date for t in transactions), default=None
+        )
         self.repository.delete_all_transactions_in_crypto_portfolio(
             portfolio_id, crypto=crypto
         )
+        if first_transaction_date:
+            self._refresh_value_snapshots(portfolio_id, first_transaction_date)
 
         return True
 
+    def _refresh_value_snapshots(self, portfolio_id: str, transaction_date: datetime):
+        # Snapshots of past days are stale after a back-dated change, recompute
+        # them in the background from the day of the transaction
+        timezone = pytz.timezone("Europe/Warsaw")
+        day = transaction_date.astimezone(timezone).date()
+        if day >= datetime.now(timezone).date():
+            return
+        try:
+            # By name, as app.tasks imports the services of every ingestion job
+            celery_app.send_task(
+                "app.tasks.refresh_portfolio_value_snapshots",
+                args=["crypto", str(portfolio_id), day.isoformat()],
+            )
+        except OperationalError as e:
+            # The transaction is already saved, the nightly snapshot catches up
+            print(f"Error scheduling portfolio value snapshots refresh: {e}")
+
     def get_portfolios_summary(self):
-        portfolios = self.repository.get_all_crypto_portfolios(self.user_id)
+        portfolios = self.repository.get_all_crypto_portfolios_with_details(
+            self.user_id
+        )
         portfolio_summary = {
             "total_investment": 0,
             "current_value": 0,
@@ -385,7 +480,10 @@ class CryptoPortfolioService:
                 new_holdings["Other"] = round(other_sum, 2)
             portfolio_summary["holdings_percentage"] = new_holdings
             # Aggregate historical values for 7d, 1m, 1y
-            for idx, historical_value_7 in enumerate(portfolio.historical_value_7d):
+            historical_values = portfolio.historical_values
+            for idx, historical_value_7 in enumerate(
+                historical_values["historical_value_7d"]
+            ):
                 if len(portfolio_summary["historical_value_7d"]) <= idx:
                     portfolio_summary["historical_value_7d"].append(
                         {
@@ -398,7 +496,9 @@ class CryptoPortfolioService:
                         historical_value_7["value"], 2
                     )
 
-            for idx, historical_value_1m in enumerate(portfolio.historical_value_1m):
+            for idx, historical_value_1m in enumerate(
+                historical_values["historical_value_1m"]
+            ):
                 if len(portfolio_summary["historical_value_1m"]) <= idx:
                     portfolio_summary["historical_value_1m"].append(
                         {
@@ -411,7 +511,9 @@ class CryptoPortfolioService:
                         historical_value_1m["value"], 2
                     )
 
-            for idx, historical_value_1y in enumerate(portfolio.historical_value_1y):
+            for idx, historical_value_1y in enumerate(
+                historical_values["historical_value_1y"]
+            ):
                 if len(portfolio_summary["historical_value_1y"]) <= idx:
                     portfolio_summary["historical_value_1y"].append(
                         {
@@ -1,25 +1,53 @@
 from typing import List, Dict, Any
 from fastapi import HTTPException, status
+from fastapi_pagination.bases import AbstractPage
+from app.core.config import settings
+from app.core.exceptions import BadRequestError, NotFoundError
 from app.domain.portfolio.models import Crypto, CryptoHistoricalPrice
 
 from app.domain.portfolio.repositories.crypto_repository import CryptoRepository
+from app.domain.portfolio.valuation.ohlcv_resampling import (
+    choose_base_period,
+    fit_interval,
+    parse_interval,
+    resolve_range,
+    stored_series,
+)
 from datetime import datetime, timedelta
 
 
 class CryptoService:
+    # Interval label and length in seconds of the candles stored per period
+    PERIOD_INTERVALS = {
+        "1h": ("1m", 60),
+        "1d": ("1h", 3600),
+        "1w": ("6h", 21600),
+        "1m": ("1d", 86400),
+        "1y": ("1w", 604800),
+        "max": ("1M", 2592000),
+    }
+    SERIES_INTERVALS = stored_series(
+        PERIOD_INTERVALS, settings.CRYPTO_HISTORICAL_PRICE_RETENTION
+    )
+
     def __init__(self, repository: CryptoRepository):
         self.repository = repository
 
-    def search_cryptos(self, search: str | None) -> List[Crypto]:
+    def search_cryptos(self, search: str | None, limit: int = None) -> List[Crypto]:
         if search:
             search = search.lower()
             cryptos = self.repository.get_cryptos_by_name_or_symbol_alike(
-                name_or_symbol=search
+                name_or_symbol=search, limit=limit
             )
         else:
             cryptos = self.repository.get_all_cryptos()
         return cryptos
 
+    def search_cryptos_page(self, search: str | None) -> AbstractPage[Crypto]:
+        return self.repository.get_cryptos_page(
+            name_or_symbol=search.lower() if search else None
+        )
+
     def get_crypto_by_symbol(self, symbol: str) -> Crypto | None:
         return self.repository.get_crypto_by_symbol(symbol=symbol)
 
@@ -66,11 +94,47 @@ class CryptoService:
 
         return historical_prices
 
-    def get_global_performance_data(self) -> Dict[str, Any]:
-        cryptos = self.repository.get_all_cryptos()
+    def get_crypto_resampled_historical_data(
+        self,
+        crypto: Crypto,
+        interval: str,
+        from_date: datetime | None = None,
+        to_date: datetime | None = None,
+        max_points: int = settings.HISTORICAL_MAX_POINTS,
+    ) -> List[Dict[str, Any]]:
+        """
+        Returns OHLCV bars of `interval` between `from_date` and `to_date`,
+        resampled from the finest stored period covering the range. The
+        interval is widened when the range would need more than `max_points`
+        bars. The range defaults to the last 30 days.
+        """
+        try:
+            seconds = parse_interval(interval)
+        except ValueError:
+            raise BadRequestError(
+                f"Nieprawidłowy interwał '{interval}'. Przykłady: 15m, 4h, 1d, 1w."
+            )
+        from_date, to_date = resolve_range(from_date, to_date)
+        if from_date >= to_date:
+            raise BadRequestError("Data początkowa musi być wcześniejsza niż końcowa.")
 
-        total_volume_24h = sum(c.volume_24h or 0 for c in cryptos)
-        total_market_cap = sum(c.market_cap or 0 for c in cryptos)
+        seconds = fit_interval(seconds, from_date, to_date, max_points)
+        base = choose_base_period(
+            self.SERIES_INTERVALS,
+            self.repository.get_crypto_period_first_dates(crypto.id),
+            seconds,
+            from_date,
+        )
+        if base is None:
+            raise NotFoundError(f"Brak danych historycznych dla '{crypto.symbol}'.")
+
+        period, intervals = base
+        return self.repository.get_crypto_resampled_prices(
+            crypto.id, period, intervals, seconds, from_date, to_date
+        )
+
+    def get_global_performance_data(self) -> Dict[str, Any]:
+        total_volume_24h, total_market_cap = self.repository.get_cryptos_market_totals()
         top_gainers_24h = self.repository.get_cryptos_biggest_gainers()
         top_losers_24h = self.repository.get_cryptos_biggest_losers()
         top_biggest_market_cap = self.repository.get_cryptos_biggest_market_cap()
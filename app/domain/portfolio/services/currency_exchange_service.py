@@ -1,4 +1,6 @@
 from typing import List, Dict, Any
+from app.core import cache
+from app.core.cache import ResponseCache
 from fastapi import HTTPException, status
 from app.domain.portfolio.repositories.currency_repository import (
     CurrencyPairRateRepository,
@@ -14,9 +16,11 @@ class ExchangeRateCurrencyService:
         self,
         fetcher: ExchangerateCurrencyRateFetcher,
         repository: CurrencyPairRateRepository,
+        response_cache: ResponseCache = None,
     ):
         self.fetcher = fetcher
         self.repository = repository
+        self.response_cache = response_cache
 
     def fetch_and_save_currency_pair_rate(self):
         rates = self.fetcher.fetch_rates()
@@ -45,4 +49,7 @@ class ExchangeRateCurrencyService:
 
             except Exception as e:
                 print(f"Error fetching currency rates: {str(e)}")
+
+        if self.response_cache:
+            self.response_cache.bump(cache.CURRENCIES)
         return rates
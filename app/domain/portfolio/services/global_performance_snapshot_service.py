@@ -0,0 +1,71 @@
+from redis import Redis, RedisError
+from app.core.cache import serialize
+from app.domain.portfolio.schemas.global_schemas import (
+    GlobalCryptoPerformanceSchema,
+    GlobalStockPerformanceSchema,
+)
+from app.domain.portfolio.services.crypto_service import CryptoService
+from app.domain.portfolio.services.stock_service import StockService
+
+
+class GlobalPerformanceSnapshotService:
+    """
+    Global market performance of stocks and cryptos, computed by the ingestion
+    tasks after each run and kept serialized in Redis, so the endpoint reads
+    two keys instead of aggregating the asset tables.
+    """
+
+    STOCK_REDIS_KEY = "global_performance:stock"
+    CRYPTO_REDIS_KEY = "global_performance:crypto"
+
+    def __init__(
+        self, stock_service: StockService, crypto_service: CryptoService, redis: Redis
+    ):
+        self.stock_service = stock_service
+        self.crypto_service = crypto_service
+        self.redis = redis
+
+    def refresh_stock_snapshot(self) -> str:
+        snapshot = serialize(
+            GlobalStockPerformanceSchema,
+            self.stock_service.get_global_performance_data(),
+        )
+        self._store(self.STOCK_REDIS_KEY, snapshot)
+        return snapshot
+
+    def refresh_crypto_snapshot(self) -> str:
+        snapshot = serialize(
+            GlobalCryptoPerformanceSchema,
+            self.crypto_service.get_global_performance_data(),
+        )
+        self._store(self.CRYPTO_REDIS_KEY, snapshot)
+        return snapshot
+
+    def get_snapshot(self) -> str:
+        """
+        Returns the JSON of `GlobalMarketPerformanceSchema`. A missing part
+        (before the first ingestion run) is computed and stored.
+        """
+        try:
+            stock_snapshot, crypto_snapshot = self.redis.mget(
+                [self.STOCK_REDIS_KEY, self.CRYPTO_REDIS_KEY]
+            )
+        except RedisError as e:
+            print(f"Error reading global performance snapshot: {e}")
+            stock_snapshot, crypto_snapshot = None, None
+
+        if stock_snapshot is None:
+            stock_snapshot = self.refresh_stock_snapshot()
+        if crypto_snapshot is None:
+            crypto_snapshot = self.refresh_crypto_snapshot()
+        return (
+            f'{{"global_crypto_data":{crypto_snapshot},'
+            f'"global_stock_data":{stock_snapshot}}}'
+        )
+
+    def _store(self, key: str, snapshot: str) -> None:
+        try:
+            # Kept until the next run replaces it
+            self.redis.set(key, snapshot)
+        except RedisError as e:
+            print(f"Error saving global performance snapshot: {e}")
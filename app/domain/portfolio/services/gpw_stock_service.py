@@ -1,5 +1,9 @@
 from typing import List, Dict, Any
-from fastapi import HTTPException, status
+import time
+from datetime import datetime, timedelta
+from app.core import cache
+from app.core.cache import ResponseCache
+from app.core.config import settings
 from app.domain.portfolio.repositories.stock_repository import StockRepository
 from app.domain.portfolio.models import Stock, StockHistoricalPrice
 from app.domain.portfolio.fetchers.stock_gpw_fetcher import GPWStockFetcher
@@ -7,40 +11,81 @@ from app.domain.portfolio.schemas.stock_schemas import StockFetcherSchema
 
 
 class GPWStockService:
-    def __init__(self, fetcher: GPWStockFetcher, repository: StockRepository):
+    def __init__(
+        self,
+        fetcher: GPWStockFetcher,
+        repository: StockRepository,
+        response_cache: ResponseCache = None,
+    ):
         self.fetcher = fetcher
         self.repository = repository
+        self.response_cache = response_cache
 
-    def fetch_and_save_stock_data(self):
-        for ticker in self.fetcher.tickers:
-            stock_data = self.fetcher.fetch_stock_data_by_ticker(ticker)
+    def fetch_and_save_stock_data(
+        self,
+        batch_size: int = 25,
+        time_budget: int = settings.GPW_FETCH_TIME_BUDGET_SEC,
+    ) -> List[str]:
+        """
+        Downloads the candles of a batch of tickers together and fetches their
+        details in parallel, then saves them in this thread, so the session is
+        never shared between the fetch workers.
 
-            if not stock_data:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail=f"Stock data for ticker {ticker} not found",
-                )
-            stock = self.repository.get_stock_by_symbol(ticker)
+        A ticker that fails or returns no data is skipped, and tickers not
+        started within `time_budget` seconds are left for the next run.
+        Returns the tickers that were not saved.
 
-            validated_stock_data = StockFetcherSchema(**stock_data).model_dump()
+        Candles older than the last stored candle of their period are not
+        fetched again (see `GPWStockFetcher.INCREMENTAL_PERIODS`) nor written.
+        """
+        deadline = time.monotonic() + time_budget
+        tickers = self.fetcher.tickers
+        failed_tickers = []
+        for start in range(0, len(tickers), batch_size):
+            batch = tickers[start : start + batch_size]
+            high_water_marks = self.repository.get_stock_candle_high_water_marks(batch)
+            now = datetime.now(self.fetcher.timezone)
+            first_opens = self.repository.get_stock_first_open_prices(
+                batch, {"1y": now - timedelta(days=365), "max": None}
+            )
+            results, errors = self.fetcher.fetch_stocks_data_batch(
+                batch,
+                deadline=deadline,
+                since=high_water_marks,
+                first_opens=first_opens,
+            )
 
-            if stock:
-                self.repository.update_stock(validated_stock_data)
-            else:
-                stock = self.repository.create_stock(validated_stock_data)
+            # Candles of a batch of tickers are written together in one upsert
+            historical_prices = []
+            for ticker in batch:
+                stock_data, ticker_history = results.get(ticker, (None, None))
+                if not stock_data:
+                    error = errors.get(ticker, "no data")
+                    print(f"Error fetching stock data for {ticker}: {error}")
+                    failed_tickers.append(ticker)
+                    continue
+                stock = self.repository.get_stock_by_symbol(ticker)
 
-            historical_data = self.fetcher.historical_data_from_last_fetch()
+                validated_stock_data = StockFetcherSchema(**stock_data).model_dump()
 
-            for data in historical_data:
-                historical_stock_price = (
-                    self.repository.get_stock_historical_price_by_symbol_period_date(
-                        symbol=stock.symbol, period=data["period"], date=data["date"]
-                    )
-                )
-                if historical_stock_price:
-                    continue
+                if stock:
+                    self.repository.update_stock(validated_stock_data)
                 else:
-                    self.repository.create_stock_historical_price(stock, data)
+                    stock = self.repository.create_stock(validated_stock_data)
+
+                ticker_marks = high_water_marks.get(ticker, {})
+                historical_prices.extend(
+                    {**data, "stock_id": stock.id}
+                    for data in ticker_history
+                    if data["period"] not in ticker_marks
+                    or data["date"] >= ticker_marks[data["period"]]
+                )
+
+            self.repository.upsert_stock_historical_prices(historical_prices)
+
+        if self.response_cache:
+            self.response_cache.bump(cache.STOCKS)
+        return failed_tickers
 
     def do_ranking(self) -> None:
         stocks = self.repository.get_all_stocks()
@@ -49,3 +94,6 @@ class GPWStockService:
             self.repository.update_stock(
                 {"market_cap_rank": rank, "symbol": stock.symbol}
             )
+
+        if self.response_cache:
+            self.response_cache.bump(cache.STOCKS)
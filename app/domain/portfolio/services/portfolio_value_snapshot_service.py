@@ -0,0 +1,100 @@
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Tuple
+import pytz
+
+from app.domain.portfolio.repositories.stock_portfolio_repository import (
+    StockPortfolioRepository,
+)
+from app.domain.portfolio.repositories.crypto_portfolio_repository import (
+    CryptoPortfolioRepository,
+)
+
+
+class PortfolioValueSnapshotService:
+    """
+    Writes the end-of-day value snapshots of stock and crypto portfolios.
+
+    Every run continues from the last stored day of a portfolio, so the first
+    run backfills the whole history from the first transaction and later runs
+    only append the days that passed. Back-dated transactions recompute the
+    days from their date onwards.
+    """
+
+    def __init__(
+        self,
+        stock_portfolio_repository: StockPortfolioRepository,
+        crypto_portfolio_repository: CryptoPortfolioRepository,
+        timezone: pytz.timezone = pytz.timezone("Europe/Warsaw"),
+    ):
+        self.stock_repository = stock_portfolio_repository
+        self.crypto_repository = crypto_portfolio_repository
+        self.timezone = timezone
+
+    def snapshot_all_portfolios(self) -> None:
+        yesterday = self._yesterday()
+        for portfolio in self.stock_repository.get_every_stock_portfolio():
+            last_day = (
+                self.stock_repository.get_last_stock_portfolio_value_snapshot_day(
+                    portfolio.id
+                )
+            )
+            if last_day is None or last_day < yesterday:
+                self.refresh_stock_portfolio(
+                    portfolio, last_day + timedelta(days=1) if last_day else None
+                )
+
+        for portfolio in self.crypto_repository.get_every_crypto_portfolio():
+            last_day = (
+                self.crypto_repository.get_last_crypto_portfolio_value_snapshot_day(
+                    portfolio.id
+                )
+            )
+            if last_day is None or last_day < yesterday:
+                self.refresh_crypto_portfolio(
+                    portfolio, last_day + timedelta(days=1) if last_day else None
+                )
+
+    def refresh_stock_portfolio_by_id(self, portfolio_id: str, from_day: date) -> None:
+        portfolio = self.stock_repository.get_stock_portfolio_by_id(portfolio_id)
+        if portfolio:
+            self.refresh_stock_portfolio(portfolio, from_day)
+
+    def refresh_crypto_portfolio_by_id(self, portfolio_id: str, from_day: date) -> None:
+        portfolio = self.crypto_repository.get_crypto_portfolio_by_id(portfolio_id)
+        if portfolio:
+            self.refresh_crypto_portfolio(portfolio, from_day)
+
+    def refresh_stock_portfolio(self, portfolio, from_day: date = None) -> None:
+        from_day, snapshots = self._build_snapshots(portfolio, from_day)
+        if from_day is not None:
+            self.stock_repository.replace_stock_portfolio_value_snapshots(
+                portfolio.id, from_day, snapshots
+            )
+
+    def refresh_crypto_portfolio(self, portfolio, from_day: date = None) -> None:
+        from_day, snapshots = self._build_snapshots(portfolio, from_day)
+        if from_day is not None:
+            self.crypto_repository.replace_crypto_portfolio_value_snapshots(
+                portfolio.id, from_day, snapshots
+            )
+
+    def _yesterday(self) -> date:
+        return datetime.now(self.timezone).date() - timedelta(days=1)
+
+    def _build_snapshots(
+        self, portfolio, from_day: date = None
+    ) -> Tuple[date | None, List[Dict]]:
+        # Days from `from_day` (or the first transaction) until yesterday,
+        # today's value is always computed live
+        engine = portfolio.value_engine
+        first_transaction_date = engine.first_transaction_date
+        if first_transaction_date is None:
+            return from_day, []
+
+        first_day = first_transaction_date.astimezone(self.timezone).date()
+        start_day = max(from_day, first_day) if from_day else first_day
+        days = [
+            start_day + timedelta(days=i)
+            for i in range((self._yesterday() - start_day).days + 1)
+        ]
+        return from_day or start_day, engine.daily_snapshots(days)
@@ -1,22 +1,44 @@
 from typing import List, Dict, Any
 from fastapi import HTTPException, status
+from fastapi_pagination.bases import AbstractPage
+from app.core.config import settings
+from app.core.exceptions import BadRequestError, NotFoundError
 from app.domain.portfolio.models import Stock, StockHistoricalPrice
 from app.domain.portfolio.repositories.stock_repository import StockRepository
 
+from app.domain.portfolio.valuation.ohlcv_resampling import (
+    choose_base_period,
+    fit_interval,
+    parse_interval,
+    resolve_range,
+    stored_series,
+)
 from datetime import datetime, timedelta
 
 
 class StockService:
+    # Interval label and length in seconds of the candles stored per period
+    PERIOD_INTERVALS = {
+        "1d": ("1h", 3600),
+        "1w": ("4h", 14400),
+        "1m": ("1d", 86400),
+        "1y": ("1w", 604800),
+        "max": ("1mo", 2592000),
+    }
+    SERIES_INTERVALS = stored_series(
+        PERIOD_INTERVALS, settings.STOCK_HISTORICAL_PRICE_RETENTION
+    )
+
     def __init__(self, repository: StockRepository):
         self.repository = repository
 
-    def search_stocks(self, search: str | None) -> List[Stock]:
+    def search_stocks(self, search: str | None, limit: int = None) -> List[Stock]:
 
         if search:
             search = search.lower()
 
             stocks = self.repository.get_stock_by_name_or_symbol_alike(
-                name_or_symbol=search
+                name_or_symbol=search, limit=limit
             )
 
         else:
@@ -24,6 +46,11 @@ class StockService:
 
         return stocks if stocks else []
 
+    def search_stocks_page(self, search: str | None) -> AbstractPage[Stock]:
+        return self.repository.get_stocks_page(
+            name_or_symbol=search.lower() if search else None
+        )
+
     def get_stock_by_symbol(self, symbol: str) -> Stock:
         stock = self.repository.get_stock_by_symbol(symbol=symbol)
 
@@ -70,11 +97,48 @@ class StockService:
 
         return historical_prices
 
-    def get_global_performance_data(self) -> Dict[str, Any]:
-        stocks = self.repository.get_all_stocks()
+    def get_stock_resampled_historical_data(
+        self,
+        stock: Stock,
+        interval: str,
+        from_date: datetime | None = None,
+        to_date: datetime | None = None,
+        max_points: int = settings.HISTORICAL_MAX_POINTS,
+    ) -> List[Dict[str, Any]]:
+        """
+        Returns OHLCV bars of `interval` between `from_date` and `to_date`,
+        resampled from the finest stored period covering the range. The
+        interval is widened when the range would need more than `max_points`
+        bars. The range defaults to the last 30 days.
+        """
+        try:
+            seconds = parse_interval(interval)
+        except ValueError:
+            raise BadRequestError(
+                f"Nieprawidłowy interwał '{interval}'. Przykłady: 15m, 4h, 1d, 1w."
+            )
+        from_date, to_date = resolve_range(from_date, to_date)
+        if from_date >= to_date:
+            raise BadRequestError("Data początkowa musi być wcześniejsza niż końcowa.")
+
+        seconds = fit_interval(seconds, from_date, to_date, max_points)
+        base = choose_base_period(
+            self.SERIES_INTERVALS,
+            self.repository.get_stock_period_first_dates(stock.id),
+            seconds,
+            from_date,
+        )
+        if base is None:
+            raise NotFoundError(f"Brak danych historycznych dla '{stock.symbol}'.")
+
+        period, intervals = base
+        return self.repository.get_stock_resampled_prices(
+            stock.id, period, intervals, seconds, from_date, to_date
+        )
 
-        total_volume_24h = sum(float(c.volume_24h) or 0 for c in stocks)
-        total_market_cap = round(sum(float(c.market_cap) or 0 for c in stocks), 0)
+    def get_global_performance_data(self) -> Dict[str, Any]:
+        total_volume_24h, total_market_cap = self.repository.get_stocks_market_totals()
+        total_market_cap = round(total_market_cap, 0)
         top_gainers_24h = self.repository.get_stocks_biggest_gainers()
         top_losers_24h = self.repository.get_stocks_biggest_losers()
         top_biggest_market_cap = self.repository.get_stocks_biggest_market_cap()
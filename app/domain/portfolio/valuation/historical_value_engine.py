@@ -0,0 +1,231 @@
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Tuple, Union
+import pytz
+
+# Chart ranges served by portfolios: name -> (price period, span, step)
+HISTORICAL_VALUE_RANGES: Dict[str, Tuple[str, timedelta, timedelta]] = {
+    "7d": ("1w", timedelta(days=7), timedelta(hours=12)),
+    "1m": ("1m", timedelta(days=30), timedelta(hours=24)),
+    "1y": ("1y", timedelta(days=365), timedelta(days=14)),
+}
+
+# Longest gap between two closes of a period, weekends and holidays included:
+# the close carried into a time point is never older than that
+PERIOD_LOOKBACK: Dict[str, timedelta] = {
+    "1y": timedelta(days=14),
+    "max": timedelta(days=62),
+}
+DEFAULT_PERIOD_LOOKBACK = timedelta(days=5)
+
+# Periods priced together for end-of-day values: daily closes of the last month,
+# then weekly and monthly ones further back
+DAILY_PRICE_PERIODS: Tuple[str, ...] = ("1m", "1y", "max")
+
+# (asset_ids, periods, since) -> {asset_id: (timestamps, closes)}
+PriceSeriesLoader = Callable[
+    [List[int], Tuple[str, ...], datetime], Dict[int, Tuple[Any, Any]]
+]
+
+
+def period_lookback(period: Union[str, Tuple[str, ...]]) -> timedelta:
+    periods = (period,) if isinstance(period, str) else period
+    return max(
+        PERIOD_LOOKBACK.get(period_name, DEFAULT_PERIOD_LOOKBACK)
+        for period_name in periods
+    )
+
+
+class HistoricalValueEngine:
+    """
+    Computes the value of a portfolio over time from its transactions and the
+    historical prices of the traded assets.
+
+    Transactions and price points are sorted once and then swept together with
+    two cursors while walking the time grid, carrying running holdings and the
+    last known price of every asset. One series costs O(N + H + T) instead of
+    re-scanning every transaction and price row for each time point.
+
+    With a `price_series_loader` only the closes of the requested period and
+    time window are queried; otherwise the `historical_prices` relationship of
+    every asset is read.
+    """
+
+    def __init__(
+        self,
+        transactions: Iterable[Any],
+        asset_attr: str,
+        timezone: pytz.timezone = pytz.timezone("Europe/Warsaw"),
+        price_series_loader: PriceSeriesLoader = None,
+    ):
+        self.asset_attr = asset_attr
+        self.timezone = timezone
+        self.price_series_loader = price_series_loader
+        self._transactions = sorted(
+            (tx for tx in transactions if getattr(tx, asset_attr) is not None),
+            key=lambda tx: tx.transaction_date,
+        )
+        self._assets = {}
+        for tx in self._transactions:
+            asset = getattr(tx, asset_attr)
+            self._assets[asset.id] = asset
+        self._price_points: Dict[Any, List[Tuple[datetime, int, float]]] = {}
+
+    @property
+    def first_transaction_date(self) -> datetime | None:
+        if not self._transactions:
+            return None
+        return self._transactions[0].transaction_date
+
+    def _get_price_points(
+        self, period: Union[str, Tuple[str, ...]], since: datetime = None
+    ) -> List[Tuple[datetime, int, float]]:
+        # A tuple of periods merges their closes into one price history
+        key = (period, since)
+        if key not in self._price_points:
+            periods = (period,) if isinstance(period, str) else period
+            if self.price_series_loader is not None:
+                price_points = [
+                    (datetime.fromtimestamp(timestamp, self.timezone), asset_id, close)
+                    for asset_id, (timestamps, closes) in self.price_series_loader(
+                        list(self._assets), periods, since
+                    ).items()
+                    for timestamp, close in zip(timestamps.tolist(), closes.tolist())
+                ]
+            else:
+                price_points = [
+                    (historical_price.date, asset_id, historical_price.close_price)
+                    for asset_id, asset in self._assets.items()
+                    for historical_price in asset.historical_prices
+                    if historical_price.period in periods
+                    and historical_price.close_price is not None
+                ]
+            price_points.sort(key=lambda point: point[0])
+            self._price_points[key] = price_points
+        return self._price_points[key]
+
+    def _price_window_start(
+        self, period: Union[str, Tuple[str, ...]], time_points: List[datetime]
+    ) -> datetime | None:
+        # Oldest close that can still be carried into the first point
+        if self.price_series_loader is None:
+            return None
+        return time_points[0] - period_lookback(period)
+
+    def time_grid(
+        self, start: datetime, end: datetime, step: timedelta
+    ) -> List[datetime]:
+        return [start + step * i for i in range(int((end - start) / step) + 1)]
+
+    def end_of_day(self, day: date) -> datetime:
+        return self.timezone.localize(datetime.combine(day, datetime.max.time()))
+
+    def value_series(
+        self, period: Union[str, Tuple[str, ...]], time_points: List[datetime]
+    ) -> List[Dict[str, Any]]:
+        """
+        Returns `{"date", "value"}` points for ascending `time_points`, pricing
+        holdings with the latest close of `period` at or before each point and
+        falling back to the current asset price when there is none yet.
+        """
+        if not time_points:
+            return []
+        price_points = self._get_price_points(
+            period, self._price_window_start(period, time_points)
+        )
+        prices = {asset_id: asset.price for asset_id, asset in self._assets.items()}
+        holdings = {asset_id: 0.0 for asset_id in self._assets}
+        total_value = 0.0
+        tx_index = 0
+        price_index = 0
+
+        results = []
+        for time_point in time_points:
+            while (
+                tx_index < len(self._transactions)
+                and self._transactions[tx_index].transaction_date <= time_point
+            ):
+                transaction = self._transactions[tx_index]
+                tx_index += 1
+                transaction_type = transaction.transaction_type.lower()
+                if transaction_type == "buy":
+                    amount = transaction.amount
+                elif transaction_type == "sell":
+                    amount = -transaction.amount
+                else:
+                    continue
+                asset_id = getattr(transaction, self.asset_attr).id
+                holdings[asset_id] += amount
+                total_value += amount * prices[asset_id]
+
+            while (
+                price_index < len(price_points)
+                and price_points[price_index][0] <= time_point
+            ):
+                _, asset_id, close_price = price_points[price_index]
+                price_index += 1
+                total_value += holdings[asset_id] * (close_price - prices[asset_id])
+                prices[asset_id] = close_price
+
+            # + 0.0 turns a -0.0 left by float cancellation into 0.0
+            results.append({"date": time_point, "value": round(total_value, 2) + 0.0})
+        return results
+
+    def historical_value(self, name: str, now: datetime = None) -> List[Dict[str, Any]]:
+        period, span, step = HISTORICAL_VALUE_RANGES[name]
+        now = now or datetime.now(self.timezone)
+        return self.value_series(period, self.time_grid(now - span, now, step))
+
+    def historical_value_from_snapshots(
+        self,
+        name: str,
+        load_snapshots: Callable[[List[date]], Dict[date, float]],
+        now: datetime = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Returns the end-of-day values of the days of the `historical_value`
+        grid, and today's value at `now`, read from daily value snapshots where
+        `load_snapshots(days)` returns them as `{day: value}`.
+
+        Points without a snapshot are computed like the snapshots themselves,
+        from the `DAILY_PRICE_PERIODS` closes at the end of the day, so the
+        whole series is a single valuation.
+        """
+        _, span, step = HISTORICAL_VALUE_RANGES[name]
+        now = now or datetime.now(self.timezone)
+        today = now.astimezone(self.timezone).date()
+        first_transaction_date = self.first_transaction_date
+
+        # A 24h step crossing a DST change may land twice on the same day
+        days = list(
+            dict.fromkeys(
+                time_point.astimezone(self.timezone).date()
+                for time_point in self.time_grid(now - span, now, step)
+            )
+        )
+        time_points = [self.end_of_day(day) if day < today else now for day in days]
+        snapshots = load_snapshots([day for day in days if day < today])
+        values = {}
+        missing = []
+        for time_point, day in zip(time_points, days):
+            if first_transaction_date is None or time_point < first_transaction_date:
+                values[time_point] = 0.0
+            elif day < today and day in snapshots:
+                values[time_point] = round(snapshots[day], 2) + 0.0
+            else:
+                missing.append(time_point)
+        for point in self.value_series(DAILY_PRICE_PERIODS, missing):
+            values[point["date"]] = point["value"]
+
+        return [
+            {"date": time_point, "value": values[time_point]}
+            for time_point in time_points
+        ]
+
+    def all_historical_values(
+        self, now: datetime = None
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        now = now or datetime.now(self.timezone)
+        return {
+            f"historical_value_{name}": self.historical_value(name, now)
+            for name in HISTORICAL_VALUE_RANGES
+        }
@@ -0,0 +1,240 @@
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Tuple
+import math
+import pytz
+import re
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+INTERVAL_UNITS = {"m": 60, "h": 3600, "d": 86400, "w": 604800}
+INTERVAL_PATTERN = re.compile(r"^(\d+)(m|h|d|w)$")
+# Intervals a too fine request is widened to, the first one fitting the range
+CHART_INTERVALS = [
+    60,
+    300,
+    900,
+    1800,
+    3600,
+    7200,
+    14400,
+    21600,
+    43200,
+    86400,
+    604800,
+]
+# Buckets start on a Monday 00:00, so weekly bars begin on Mondays
+BUCKET_ORIGIN = 4 * 86400
+TIMEZONE = pytz.timezone("Europe/Warsaw")
+
+
+def parse_interval(interval: str) -> int:
+    """
+    Returns the length in seconds of an interval like `15m`, `4h`, `1d` or
+    `2w`. Raises `ValueError` for anything else.
+    """
+    match = INTERVAL_PATTERN.match(interval or "")
+    if not match or int(match.group(1)) == 0:
+        raise ValueError(f"Invalid interval '{interval}'")
+    return int(match.group(1)) * INTERVAL_UNITS[match.group(2)]
+
+
+def format_interval(seconds: int) -> str:
+    """Returns the label of an interval, in the largest unit dividing it."""
+    for unit, unit_seconds in sorted(
+        INTERVAL_UNITS.items(), key=lambda item: item[1], reverse=True
+    ):
+        if seconds % unit_seconds == 0:
+            return f"{seconds // unit_seconds}{unit}"
+    raise ValueError(f"Interval of {seconds}s is not a whole number of minutes")
+
+
+def resolve_range(
+    from_date: datetime | None,
+    to_date: datetime | None,
+    default_span: timedelta = timedelta(days=30),
+) -> Tuple[datetime, datetime]:
+    """
+    Fills in a missing end with now and a missing start with `default_span`
+    before the end. Naive dates are taken as Warsaw time.
+    """
+    if to_date is None:
+        to_date = datetime.now(TIMEZONE)
+    elif to_date.tzinfo is None:
+        to_date = TIMEZONE.localize(to_date)
+    if from_date is None:
+        from_date = to_date - default_span
+    elif from_date.tzinfo is None:
+        from_date = TIMEZONE.localize(from_date)
+    return from_date, to_date
+
+
+def fit_interval(
+    seconds: int, from_date: datetime, to_date: datetime, max_points: int
+) -> int:
+    """
+    Returns `seconds`, or the shortest chart interval which keeps the buckets
+    between `from_date` and `to_date` within `max_points`.
+    """
+    # The first and last bucket can both be partial, hence the one spare point
+    needed = math.ceil((to_date - from_date).total_seconds() / max(max_points - 1, 1))
+    if seconds >= needed:
+        return seconds
+    for chart_interval in CHART_INTERVALS:
+        if chart_interval >= needed:
+            return chart_interval
+    week = INTERVAL_UNITS["w"]
+    return math.ceil(needed / week) * week
+
+
+def stored_series(
+    native_intervals: Dict[str, Tuple[str, int]],
+    retention: Dict[str, Tuple[timedelta, str]],
+) -> Dict[Tuple[str, str], int]:
+    """
+    Returns `{(period, interval): seconds}` of every candle series stored:
+    the native candles of each period, and the bars its older candles are
+    rolled into by the retention job.
+    """
+    series = {
+        (period, interval): seconds
+        for period, (interval, seconds) in native_intervals.items()
+    }
+    for period, (_, interval) in retention.items():
+        if period in native_intervals:
+            series[(period, interval)] = parse_interval(interval)
+    return series
+
+
+def choose_base_period(
+    series_intervals: Dict[Tuple[str, str], int],
+    first_dates: Dict[Tuple[str, str], datetime],
+    seconds: int,
+    from_date: datetime,
+) -> Tuple[str, List[str]] | None:
+    """
+    Returns the stored period to resample into `seconds` buckets from
+    `from_date`, with the intervals of its candles to read: the finest period
+    whose candles not coarser than the buckets reach back to `from_date`, so
+    a period only counts from its first native candle unless the older ones
+    were rolled into fine enough bars. Without any, the finest period reaching
+    back to `from_date` with all its candles, else the one reaching furthest.
+    """
+    stored: Dict[str, List[str]] = {}
+    for period, interval in series_intervals:
+        if (period, interval) in first_dates:
+            stored.setdefault(period, []).append(interval)
+    if not stored:
+        return None
+
+    def finest(period: str) -> int:
+        return min(series_intervals[(period, interval)] for interval in stored[period])
+
+    def reach(period: str, intervals: List[str]) -> datetime:
+        return min(first_dates[(period, interval)] for interval in intervals)
+
+    periods = sorted(stored, key=finest)
+    for period in periods:
+        intervals = [
+            interval
+            for interval in stored[period]
+            if series_intervals[(period, interval)] <= seconds
+        ]
+        if intervals and reach(period, intervals) <= from_date:
+            return period, intervals
+    covering = [
+        period for period in periods if reach(period, stored[period]) <= from_date
+    ]
+    if covering:
+        return covering[0], stored[covering[0]]
+    period = min(periods, key=lambda period: reach(period, stored[period]))
+    return period, stored[period]
+
+
+def load_period_first_dates(
+    db: Session, price_model: Any, asset_attr: str, asset_id: int
+) -> Dict[Tuple[str, str], datetime]:
+    """
+    Returns `{(period, interval): date}` with the date of the first stored
+    candle of every series.
+    """
+    table = price_model.__tablename__
+    rows = db.execute(
+        text(f"""
+            SELECT period, interval, MIN(date) FROM {table}
+            WHERE {asset_attr}_id = :asset_id
+            GROUP BY period, interval
+            """),
+        {"asset_id": asset_id},
+    ).all()
+    return {(period, interval): first_date for period, interval, first_date in rows}
+
+
+def resample_prices(
+    db: Session,
+    price_model: Any,
+    asset_attr: str,
+    asset_id: int,
+    period: str,
+    intervals: List[str],
+    seconds: int,
+    from_date: datetime,
+    to_date: datetime,
+) -> List[Dict[str, Any]]:
+    """
+    Returns the candles of `period` stored at one of `intervals` between
+    `from_date` and `to_date` merged into `seconds` long OHLCV bars,
+    aggregated by the database. Rolled-up bars and the native candles after
+    them never overlap, so both can feed the same buckets.
+
+    Buckets are aligned to Warsaw wall time, so daily bars start at midnight
+    and weekly bars on Mondays, as the stored 1d and 1wk candles do.
+    """
+    table = price_model.__tablename__
+    rows = db.execute(
+        text(f"""
+            SELECT
+                (to_timestamp(
+                    floor(
+                        (extract(epoch FROM date AT TIME ZONE 'Europe/Warsaw') - :origin)
+                        / :seconds
+                    ) * :seconds + :origin
+                ) AT TIME ZONE 'UTC') AT TIME ZONE 'Europe/Warsaw' AS bucket,
+                (array_agg(open_price ORDER BY date))[1] AS open_price,
+                MAX(high_price) AS high_price,
+                MIN(low_price) AS low_price,
+                (array_agg(close_price ORDER BY date DESC))[1] AS close_price,
+                SUM(volume) AS volume
+            FROM {table}
+            WHERE {asset_attr}_id = :asset_id
+              AND period = :period
+              AND interval = ANY(:intervals)
+              AND date >= :from_date
+              AND date < :to_date
+            GROUP BY bucket
+            ORDER BY bucket
+            """),
+        {
+            "asset_id": asset_id,
+            "period": period,
+            "intervals": list(intervals),
+            "seconds": seconds,
+            "origin": BUCKET_ORIGIN,
+            "from_date": from_date,
+            "to_date": to_date,
+        },
+    ).all()
+
+    interval = format_interval(seconds)
+    return [
+        {
+            "date": row.bucket,
+            "open_price": row.open_price,
+            "high_price": row.high_price,
+            "low_price": row.low_price,
+            "close_price": row.close_price,
+            "volume": row.volume,
+            "interval": interval,
+            "period": period,
+        }
+        for row in rows
+    ]
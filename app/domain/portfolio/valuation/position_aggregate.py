@@ -0,0 +1,135 @@
+from typing import Any, Dict, Iterable, Iterator
+
+
+class AssetPosition:
+    """
+    Totals of all transactions of one asset in a portfolio.
+
+    Built either from the transactions themselves or from a materialized
+    position row. Only the transaction sums are stored; values depending on the
+    current price are derived from `asset` on access so price updates are
+    picked up.
+    """
+
+    def __init__(
+        self,
+        asset: Any = None,
+        quantity: float = 0.0,
+        total_invested: float = 0.0,
+        total_proceeds: float = 0.0,
+    ):
+        self.asset = asset
+        self.quantity = quantity
+        self.total_invested = total_invested
+        self.total_proceeds = total_proceeds
+
+    @classmethod
+    def from_row(cls, row: Any, asset_attr: str) -> "AssetPosition":
+        return cls(
+            asset=getattr(row, asset_attr),
+            quantity=row.quantity,
+            total_invested=row.cost,
+            total_proceeds=row.proceeds,
+        )
+
+    def add_transaction(self, transaction: Any) -> None:
+        transaction_type = transaction.transaction_type.lower()
+        if transaction_type == "buy":
+            self.quantity += transaction.amount
+            self.total_invested += transaction.amount * transaction.price_per_unit
+        elif transaction_type == "sell":
+            self.quantity -= transaction.amount
+            self.total_proceeds += transaction.amount * transaction.price_per_unit
+
+    @property
+    def holdings(self):
+        return self.quantity
+
+    @property
+    def avg_buy_price(self):
+        holdings = self.holdings
+        if holdings == 0:
+            return 0
+        return (self.total_invested - self.total_proceeds) / holdings
+
+    @property
+    def current_value(self):
+        if self.asset:
+            return self.holdings * self.asset.price
+        return 0
+
+    @property
+    def profit_loss(self):
+        if self.asset:
+            return self.total_proceeds - self.total_invested + self.current_value
+        return 0
+
+    @property
+    def profit_loss_percentage(self):
+        current_value = self.current_value
+        if self.total_invested == 0 or current_value == 0:
+            return 0
+        return round((self.profit_loss / current_value) * 100, 2)
+
+    @property
+    def profit_loss_24h(self):
+        if self.asset and self.asset.price_change_percentage_24h is not None:
+            return round(
+                (self.asset.price_change_percentage_24h / 100) * self.current_value, 2
+            )
+        return 0
+
+    @property
+    def percentage_profit_loss_24h(self):
+        current_value = self.current_value
+        if self.total_invested == 0 or current_value == 0:
+            return 0
+        return round((self.profit_loss_24h / current_value) * 100, 2)
+
+
+class PositionAggregate:
+    """
+    Groups the transactions of a portfolio by asset in a single pass, or wraps
+    the materialized position rows of the portfolio.
+
+    Watched-asset properties, portfolio totals, the summary and the PDF
+    reports all read from one aggregate instead of re-scanning transactions
+    for every field.
+    """
+
+    def __init__(self, transactions: Iterable[Any], asset_attr: str):
+        self.asset_attr = asset_attr
+        self._positions: Dict[int, AssetPosition] = {}
+        for transaction in transactions:
+            asset_id = getattr(transaction, f"{asset_attr}_id")
+            position = self._positions.get(asset_id)
+            if position is None:
+                position = AssetPosition(getattr(transaction, asset_attr))
+                self._positions[asset_id] = position
+            position.add_transaction(transaction)
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Any], asset_attr: str) -> "PositionAggregate":
+        aggregate = cls([], asset_attr)
+        for row in rows:
+            aggregate._positions[getattr(row, f"{asset_attr}_id")] = (
+                AssetPosition.from_row(row, asset_attr)
+            )
+        return aggregate
+
+    def get(self, asset_id: int, asset: Any = None) -> AssetPosition:
+        position = self._positions.get(asset_id)
+        if position is None:
+            return AssetPosition(asset)
+        return position
+
+    def __iter__(self) -> Iterator[AssetPosition]:
+        return iter(self._positions.values())
+
+    @property
+    def total_invested(self):
+        return sum(position.total_invested for position in self)
+
+    @property
+    def current_value(self):
+        return sum(position.current_value for position in self)
@@ -0,0 +1,54 @@
+from datetime import datetime
+from typing import Any, Dict, Iterable, Tuple
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+
+def load_price_series(
+    db: Session,
+    price_model: Any,
+    asset_attr: str,
+    asset_ids: Iterable[int],
+    periods: Iterable[str],
+    since: datetime = None,
+    until: datetime = None,
+) -> Dict[int, Tuple[np.ndarray, np.ndarray]]:
+    """
+    Returns `{asset_id: (timestamps, closes)}` with the closes of `periods`
+    between `since` and `until`, sorted by date.
+
+    Only the asset id, date and close columns are selected, in one query for all
+    assets, so no ORM objects are built for the candles.
+    """
+    asset_ids = list(asset_ids)
+    if not asset_ids:
+        return {}
+    asset_column = getattr(price_model, f"{asset_attr}_id")
+
+    query = select(asset_column, price_model.date, price_model.close_price).where(
+        asset_column.in_(asset_ids),
+        price_model.period.in_(list(periods)),
+        price_model.close_price.is_not(None),
+    )
+    if since is not None:
+        query = query.where(price_model.date >= since)
+    if until is not None:
+        query = query.where(price_model.date <= until)
+    rows = db.execute(query.order_by(asset_column, price_model.date)).all()
+    if not rows:
+        return {}
+
+    row_assets = np.fromiter((row[0] for row in rows), dtype=int, count=len(rows))
+    timestamps = np.fromiter(
+        (row[1].timestamp() for row in rows), dtype=float, count=len(rows)
+    )
+    closes = np.fromiter((row[2] for row in rows), dtype=float, count=len(rows))
+
+    # Rows are grouped by asset, so each asset is one contiguous slice
+    found_assets, starts = np.unique(row_assets, return_index=True)
+    ends = np.append(starts[1:], len(rows))
+    return {
+        int(asset_id): (timestamps[start:end], closes[start:end])
+        for asset_id, start, end in zip(found_assets, starts, ends)
+    }
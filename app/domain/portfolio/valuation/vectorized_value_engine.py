@@ -0,0 +1,165 @@
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Tuple, Union
+import numpy as np
+import pytz
+
+from app.domain.portfolio.valuation.historical_value_engine import (
+    DAILY_PRICE_PERIODS,
+    HistoricalValueEngine,
+    PriceSeriesLoader,
+)
+
+
+class VectorizedValueEngine(HistoricalValueEngine):
+    """
+    NumPy variant of `HistoricalValueEngine` producing the same series.
+
+    Transactions become signed-quantity arrays, holdings per asset are a
+    `cumsum` over the shared time grid, prices are forward-filled onto the grid
+    with `searchsorted`, and the value curve is the row-wise dot product of the
+    holdings and prices matrices.
+    """
+
+    def __init__(
+        self,
+        transactions: Iterable[Any],
+        asset_attr: str,
+        timezone: pytz.timezone = pytz.timezone("Europe/Warsaw"),
+        price_series_loader: PriceSeriesLoader = None,
+    ):
+        super().__init__(transactions, asset_attr, timezone, price_series_loader)
+        self._asset_index = {
+            asset_id: index for index, asset_id in enumerate(self._assets)
+        }
+        signs = {"buy": 1.0, "sell": -1.0}
+        self._tx_dates = np.array(
+            [tx.transaction_date.timestamp() for tx in self._transactions],
+            dtype=float,
+        )
+        self._tx_assets = np.array(
+            [
+                self._asset_index[getattr(tx, asset_attr).id]
+                for tx in self._transactions
+            ],
+            dtype=int,
+        )
+        self._tx_quantities = np.array(
+            [
+                signs.get(tx.transaction_type.lower(), 0.0) * tx.amount
+                for tx in self._transactions
+            ],
+            dtype=float,
+        )
+        self._tx_costs = np.array(
+            [
+                (
+                    tx.amount * tx.price_per_unit
+                    if tx.transaction_type.lower() == "buy"
+                    else 0.0
+                )
+                for tx in self._transactions
+            ],
+            dtype=float,
+        )
+        self._tx_proceeds = np.array(
+            [
+                (
+                    tx.amount * tx.price_per_unit
+                    if tx.transaction_type.lower() == "sell"
+                    else 0.0
+                )
+                for tx in self._transactions
+            ],
+            dtype=float,
+        )
+        self._current_prices = np.array(
+            [asset.price for asset in self._assets.values()], dtype=float
+        )
+        self._price_arrays: Dict[Any, Dict[int, Tuple[np.ndarray, np.ndarray]]] = {}
+
+    def _get_price_arrays(
+        self, period: Union[str, Tuple[str, ...]], since: datetime = None
+    ) -> Dict[int, Tuple[np.ndarray, np.ndarray]]:
+        key = (period, since)
+        if key not in self._price_arrays:
+            if self.price_series_loader is not None:
+                periods = (period,) if isinstance(period, str) else period
+                self._price_arrays[key] = self.price_series_loader(
+                    list(self._assets), periods, since
+                )
+            else:
+                grouped: Dict[int, Tuple[List[float], List[float]]] = {}
+                for date, asset_id, close_price in self._get_price_points(period):
+                    dates, closes = grouped.setdefault(asset_id, ([], []))
+                    dates.append(date.timestamp())
+                    closes.append(close_price)
+                self._price_arrays[key] = {
+                    asset_id: (
+                        np.array(dates, dtype=float),
+                        np.array(closes, dtype=float),
+                    )
+                    for asset_id, (dates, closes) in grouped.items()
+                }
+        return self._price_arrays[key]
+
+    def value_series(
+        self, period: Union[str, Tuple[str, ...]], time_points: List[datetime]
+    ) -> List[Dict[str, Any]]:
+        if not time_points:
+            return []
+        grid = np.array([time_point.timestamp() for time_point in time_points])
+
+        # Row i holds the quantities that become effective at time_points[i];
+        # transactions after the last point land in the extra row and drop out
+        deltas = np.zeros((len(grid) + 1, len(self._assets)))
+        np.add.at(
+            deltas,
+            (np.searchsorted(grid, self._tx_dates, side="left"), self._tx_assets),
+            self._tx_quantities,
+        )
+        holdings = np.cumsum(deltas[:-1], axis=0)
+
+        prices = np.tile(self._current_prices, (len(grid), 1))
+        price_arrays = self._get_price_arrays(
+            period, self._price_window_start(period, time_points)
+        )
+        for asset_id, (dates, closes) in price_arrays.items():
+            positions = np.searchsorted(dates, grid, side="right") - 1
+            known = positions >= 0
+            prices[known, self._asset_index[asset_id]] = closes[positions[known]]
+
+        values = np.einsum("ta,ta->t", holdings, prices)
+        return [
+            {"date": time_point, "value": round(float(value), 2) + 0.0}
+            for time_point, value in zip(time_points, values)
+        ]
+
+    def daily_snapshots(self, days: List[date]) -> List[Dict[str, Any]]:
+        """
+        Returns `{"day", "value", "invested", "pnl"}` for ascending `days`, as of
+        the end of each day. `invested` and `pnl` follow the portfolio's
+        `total_investment` and `profit_loss`.
+        """
+        if not days:
+            return []
+        time_points = [self.end_of_day(day) for day in days]
+        values = self.value_series(DAILY_PRICE_PERIODS, time_points)
+
+        grid = np.array([time_point.timestamp() for time_point in time_points])
+        # Number of transactions made up to each point
+        counts = np.searchsorted(self._tx_dates, grid, side="right")
+        invested = np.concatenate(([0.0], np.cumsum(self._tx_costs)))[counts]
+        proceeds = np.concatenate(([0.0], np.cumsum(self._tx_proceeds)))[counts]
+
+        return [
+            {
+                "day": day,
+                "value": point["value"],
+                "invested": round(float(day_invested), 2) + 0.0,
+                "pnl": round(float(day_proceeds - day_invested) + point["value"], 2)
+                + 0.0,
+            }
+            for day, point, day_invested, day_proceeds in zip(
+                days, values, invested, proceeds
+            )
+        ]
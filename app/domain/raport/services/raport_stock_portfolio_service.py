@@ -34,7 +34,7 @@ class RaportStockPortfolioService:
         return self.stock_portfolio_service.get_portfolios_summary()
 
     def get_all_portfolios(self):
-        return self.stock_portfolio_service.get_all_portfolios()
+        return self.stock_portfolio_service.get_all_portfolios_with_details()
 
     def prepare_dataframe(self, data):
         df = pd.DataFrame(data)
@@ -1,3 +1,4 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi_pagination import add_pagination
 from fastapi.staticfiles import StaticFiles
@@ -5,8 +6,14 @@ from fastapi.middleware.cors import CORSMiddleware
 from slowapi.errors import RateLimitExceeded
 from starlette.responses import JSONResponse
 from app.core.database import engine
+from app.api.deps import asset_autocomplete_index, converter_price_index
 from app.api.main import router as router_api
 from app.domain.model_base import Base
+from app.domain.portfolio.migrations import (
+    backfill_portfolio_positions,
+    create_asset_search_indexes,
+    create_transaction_indexes,
+)
 from app.admin import create_admin
 from app.core.utils import limiter
 from app.core.handlers import custom_rate_limit_handler
@@ -19,11 +26,28 @@ def create_db() -> None:
     """
     # Create the database
     Base.metadata.create_all(bind=engine)
+    # Indexes added to tables that already existed. Candle tables are
+    # partitioned by the one-off app.domain.portfolio.migrations command.
+    create_asset_search_indexes(engine)
+    create_transaction_indexes(engine)
+    # Positions of portfolios created before the positions tables
+    backfill_portfolio_positions(engine)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Started in every worker process serving requests, not on import
+    converter_price_index.listen()
+    asset_autocomplete_index.listen()
+    yield
 
 
 def get_configured_server_app() -> FastAPI:
     disable_installed_extensions_check()
-    app = FastAPI(swagger_ui_parameters={"syntaxHighlight.theme": "obsidian"})
+    app = FastAPI(
+        lifespan=lifespan,
+        swagger_ui_parameters={"syntaxHighlight.theme": "obsidian"},
+    )
 
     app.state.limiter = limiter
 
@@ -1,14 +1,22 @@
-from typing import List
+from typing import Dict, List
 from sqlalchemy.orm import Session
-from app.core.database import SessionLocal
+from app.core.config import settings
+from app.core.cache import ResponseCache
+from app.core.database import SessionLocal, engine, redis_db
 
 from app.domain.portfolio.repositories.stock_repository import StockRepository
+from app.domain.portfolio.services.stock_service import StockService
+from app.domain.portfolio.services.crypto_service import CryptoService
+from app.domain.portfolio.services.global_performance_snapshot_service import (
+    GlobalPerformanceSnapshotService,
+)
 from app.domain.portfolio.services.gpw_stock_service import GPWStockService
 from app.domain.portfolio.fetchers.stock_gpw_fetcher import GPWStockFetcher
 from app.domain.portfolio.fetchers.crypto_fetchers import (
     CoinGeckoCryptoFetcher,
     BinanaceCryptoFetcher,
 )
+from app.domain.portfolio.fetchers.binance_symbol_index import BinanceSymbolIndex
 from app.domain.portfolio.services.coingecko_crypto_service import (
     CoinGeckoCryptoService,
 )
@@ -23,32 +31,61 @@ from app.domain.portfolio.repositories.currency_repository import (
 from app.domain.portfolio.services.currency_exchange_service import (
     ExchangeRateCurrencyService,
 )
+from app.domain.portfolio.repositories.stock_portfolio_repository import (
+    StockPortfolioRepository,
+)
+from app.domain.portfolio.repositories.crypto_portfolio_repository import (
+    CryptoPortfolioRepository,
+)
+from app.domain.portfolio.services.portfolio_value_snapshot_service import (
+    PortfolioValueSnapshotService,
+)
+from app.domain.portfolio import migrations
+from datetime import date
 
 from app.celery_app import celery_app
 
 
+def get_global_performance_snapshot_service(
+    db: Session,
+) -> GlobalPerformanceSnapshotService:
+    return GlobalPerformanceSnapshotService(
+        stock_service=StockService(StockRepository(db_session=db)),
+        crypto_service=CryptoService(CryptoRepository(db_session=db)),
+        redis=redis_db,
+    )
+
+
 @celery_app.task(name="app.tasks.fetch_gpw_data_by_tickers")
-def fetch_gpw_data_by_tickers(tickers: List[str]) -> None:
+def fetch_gpw_data_by_tickers(tickers: List[str]) -> List[str]:
     db: Session = SessionLocal()
     try:
         stock_service = GPWStockService(
             fetcher=GPWStockFetcher(tickers=tickers),
             repository=StockRepository(db_session=db),
+            response_cache=ResponseCache(redis_db),
         )
-        stock_service.fetch_and_save_stock_data()
+        failed_tickers = stock_service.fetch_and_save_stock_data()
         stock_service.do_ranking()
+        get_global_performance_snapshot_service(db).refresh_stock_snapshot()
+        return failed_tickers
     finally:
         db.close()
 
 
 @celery_app.task(name="app.tasks.fetch_coingecko_data")
-def fetch_coingecko_data() -> None:
+def fetch_coingecko_data() -> Dict[str, int]:
     db: Session = SessionLocal()
     try:
         stock_service = CoinGeckoCryptoService(
-            fetcher=CoinGeckoCryptoFetcher(), repository=CryptoRepository(db_session=db)
+            fetcher=CoinGeckoCryptoFetcher(),
+            repository=CryptoRepository(db_session=db),
+            response_cache=ResponseCache(redis_db),
         )
-        stock_service.fetch_and_save_crypto_data()
+        # Inserted and updated counts end up in the task result
+        counts = stock_service.fetch_and_save_crypto_data()
+        get_global_performance_snapshot_service(db).refresh_crypto_snapshot()
+        return counts
     finally:
         db.close()
 
@@ -57,12 +94,16 @@ def fetch_coingecko_data() -> None:
 def fetch_binanace_data() -> None:
     db: Session = SessionLocal()
     try:
+        binanace_fetcher = BinanaceCryptoFetcher()
         binanace_crypto_service = BinanaceCryptoService(
-            fetcher=BinanaceCryptoFetcher(),
+            fetcher=binanace_fetcher,
             repository=CryptoRepository(db_session=db),
             pair_rate_repository=CurrencyPairRateRepository(db_session=db),
+            symbol_index=BinanceSymbolIndex(binanace_fetcher, redis_db),
+            response_cache=ResponseCache(redis_db),
         )
         binanace_crypto_service.fetch_and_save_historical_crypto_data()
+        get_global_performance_snapshot_service(db).refresh_crypto_snapshot()
     finally:
         db.close()
 
@@ -75,7 +116,81 @@ def fetch_currency_exchange_rates() -> None:
         currency_service = ExchangeRateCurrencyService(
             fetcher=ExchangerateCurrencyRateFetcher(),
             repository=CurrencyPairRateRepository(db_session=db),
+            response_cache=ResponseCache(redis_db),
         )
         currency_service.fetch_and_save_currency_pair_rate()
     finally:
         db.close()
+
+
+@celery_app.task(name="app.tasks.rebuild_portfolio_positions")
+def rebuild_portfolio_positions() -> None:
+    db: Session = SessionLocal()
+    try:
+        StockPortfolioRepository(db_session=db).rebuild_stock_positions()
+        CryptoPortfolioRepository(db_session=db).rebuild_crypto_positions()
+    finally:
+        db.close()
+
+
+@celery_app.task(name="app.tasks.snapshot_portfolio_values")
+def snapshot_portfolio_values() -> None:
+    db: Session = SessionLocal()
+    try:
+        snapshot_service = PortfolioValueSnapshotService(
+            stock_portfolio_repository=StockPortfolioRepository(db_session=db),
+            crypto_portfolio_repository=CryptoPortfolioRepository(db_session=db),
+        )
+        snapshot_service.snapshot_all_portfolios()
+    finally:
+        db.close()
+
+
+@celery_app.task(name="app.tasks.refresh_portfolio_value_snapshots")
+def refresh_portfolio_value_snapshots(
+    portfolio_type: str, portfolio_id: str, from_day: str
+) -> None:
+    db: Session = SessionLocal()
+    try:
+        snapshot_service = PortfolioValueSnapshotService(
+            stock_portfolio_repository=StockPortfolioRepository(db_session=db),
+            crypto_portfolio_repository=CryptoPortfolioRepository(db_session=db),
+        )
+        if portfolio_type == "stock":
+            snapshot_service.refresh_stock_portfolio_by_id(
+                portfolio_id, date.fromisoformat(from_day)
+            )
+        elif portfolio_type == "crypto":
+            snapshot_service.refresh_crypto_portfolio_by_id(
+                portfolio_id, date.fromisoformat(from_day)
+            )
+    finally:
+        db.close()
+
+
+@celery_app.task(name="app.tasks.create_historical_price_partitions")
+def create_historical_price_partitions() -> None:
+    # Partitions exist before the first candle of their month arrives
+    migrations.create_historical_price_partitions(engine)
+
+
+@celery_app.task(name="app.tasks.downsample_historical_prices")
+def downsample_historical_prices() -> Dict[str, int]:
+    db: Session = SessionLocal()
+    try:
+        stock_repository = StockRepository(db_session=db)
+        crypto_repository = CryptoRepository(db_session=db)
+        rolled = {"stock": 0, "crypto": 0}
+        retention = settings.STOCK_HISTORICAL_PRICE_RETENTION
+        for period, (keep, interval) in retention.items():
+            rolled["stock"] += stock_repository.downsample_stock_historical_prices(
+                period, keep, interval
+            )
+        retention = settings.CRYPTO_HISTORICAL_PRICE_RETENTION
+        for period, (keep, interval) in retention.items():
+            rolled["crypto"] += crypto_repository.downsample_crypto_historical_prices(
+                period, keep, interval
+            )
+        return rolled
+    finally:
+        db.close()
@@ -0,0 +1,55 @@
+from app.domain.portfolio.services.asset_autocomplete_index import (
+    AssetAutocompleteIndex,
+    fold,
+)
+from app.domain.portfolio.repositories.crypto_repository import CryptoRepository
+from app.domain.portfolio.repositories.stock_repository import StockRepository
+from unittest.mock import MagicMock
+import pytest
+
+
+@pytest.fixture
+def index(monkeypatch):
+    monkeypatch.setattr(
+        StockRepository,
+        "get_stocks_names",
+        lambda self: [
+            ("PKO.WA", "PKO Bank Polski", 1),
+            ("PKN.WA", "Orlen", 2),
+            ("LPP.WA", "LPP", 5),
+            ("ZAB.WA", "Żabka Group", None),
+            ("LDZ.WA", "Łódzkie Zakłady", 40),
+        ],
+    )
+    monkeypatch.setattr(
+        CryptoRepository,
+        "get_cryptos_names",
+        lambda self: [("btc", "Bitcoin", 1), ("pkoin", "Pkoin", 300)],
+    )
+    return AssetAutocompleteIndex(MagicMock(), MagicMock())
+
+
+def symbols(results):
+    return [result["symbol"] for result in results]
+
+
+def test_fold_strips_polish_diacritics():
+    assert fold("Żółć Łódź") == "zolc lodz"
+
+
+def test_autocomplete_ranks_symbol_matches_first(index):
+    assert symbols(index.search("pk")) == ["PKO.WA", "PKN.WA", "pkoin"]
+    assert symbols(index.search("PKOIN")) == ["pkoin"]
+    assert symbols(index.search("pko.wa")) == ["PKO.WA"]
+
+
+def test_autocomplete_matches_name_words_without_diacritics(index):
+    assert symbols(index.search("polski")) == ["PKO.WA"]
+    assert symbols(index.search("lodz")) == ["LDZ.WA"]
+    assert symbols(index.search("żab")) == ["ZAB.WA"]
+
+
+def test_autocomplete_limit_and_empty_prefix(index):
+    assert len(index.search("p", limit=2)) == 2
+    assert index.search("  ") == []
+    assert index.search("xyz") == []
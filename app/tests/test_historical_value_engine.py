@@ -0,0 +1,262 @@
+from app.domain.portfolio.valuation.historical_value_engine import (
+    HistoricalValueEngine,
+)
+from app.domain.portfolio.valuation.vectorized_value_engine import (
+    VectorizedValueEngine,
+)
+from types import SimpleNamespace
+from datetime import datetime, timedelta
+import pytz
+import pytest
+import random
+import numpy as np
+
+NOW = datetime(2025, 6, 30, 12, 0, tzinfo=pytz.timezone("Europe/Warsaw"))
+
+
+def make_stock(stock_id, price, closes):
+    historical_prices = [
+        SimpleNamespace(date=date, close_price=close, period=period)
+        for date, close, period in closes
+    ]
+    return SimpleNamespace(
+        id=stock_id, price=price, historical_prices=historical_prices
+    )
+
+
+def make_transaction(stock, transaction_type, amount, days_ago, price_per_unit=100.0):
+    return SimpleNamespace(
+        stock=stock,
+        stock_id=stock.id,
+        transaction_type=transaction_type,
+        amount=amount,
+        price_per_unit=price_per_unit,
+        transaction_date=NOW - timedelta(days=days_ago),
+    )
+
+
+def reference_value_series(transactions, period, time_points):
+    # Straightforward per-point rescan the engine replaces
+    results = []
+    for time_point in time_points:
+        total_value = 0
+        for transaction in transactions:
+            if transaction.transaction_date > time_point:
+                continue
+            price_at_time = None
+            for historical_price in sorted(
+                transaction.stock.historical_prices, key=lambda hp: hp.date
+            ):
+                if (
+                    historical_price.period == period
+                    and historical_price.date <= time_point
+                ):
+                    price_at_time = historical_price.close_price
+            if price_at_time is None:
+                price_at_time = transaction.stock.price
+            if transaction.transaction_type == "buy":
+                total_value += transaction.amount * price_at_time
+            else:
+                total_value -= transaction.amount * price_at_time
+        results.append({"date": time_point, "value": round(total_value, 2)})
+    return results
+
+
+@pytest.fixture
+def transactions():
+    pkn = make_stock(
+        1,
+        price=70.0,
+        closes=[(NOW - timedelta(days=d), 60.0 + d, "1w") for d in range(8)]
+        + [(NOW - timedelta(days=d), 50.0 + d, "1m") for d in range(0, 31, 3)],
+    )
+    kgh = make_stock(
+        2,
+        price=120.0,
+        closes=[(NOW - timedelta(days=d, hours=6), 110.0 - d, "1w") for d in range(8)],
+    )
+    return [
+        make_transaction(pkn, "buy", 10, days_ago=20),
+        make_transaction(kgh, "buy", 3, days_ago=6),
+        make_transaction(pkn, "sell", 4, days_ago=3),
+        make_transaction(kgh, "buy", 2, days_ago=1),
+    ]
+
+
+@pytest.mark.parametrize("name", ["7d", "1m", "1y"])
+def test_engine_matches_reference(transactions, name):
+    engine = HistoricalValueEngine(transactions, "stock")
+    series = engine.historical_value(name, now=NOW)
+
+    period = {"7d": "1w", "1m": "1m", "1y": "1y"}[name]
+    expected = reference_value_series(
+        transactions, period, [point["date"] for point in series]
+    )
+
+    assert series == expected
+
+
+def test_engine_arbitrary_range(transactions):
+    engine = HistoricalValueEngine(transactions, "stock")
+    time_points = engine.time_grid(NOW - timedelta(days=2), NOW, timedelta(hours=6))
+
+    series = engine.value_series("1w", time_points)
+
+    assert len(series) == 9
+    assert series == reference_value_series(transactions, "1w", time_points)
+
+
+def test_engine_without_transactions():
+    engine = HistoricalValueEngine([], "stock")
+
+    values = engine.all_historical_values(now=NOW)
+
+    assert [len(values[key]) for key in values] == [15, 31, 27]
+    assert all(point["value"] == 0 for series in values.values() for point in series)
+
+
+@pytest.mark.parametrize("name", ["7d", "1m", "1y"])
+def test_vectorized_engine_matches_reference_engine(transactions, name):
+    reference = HistoricalValueEngine(transactions, "stock").historical_value(
+        name, now=NOW
+    )
+    vectorized = VectorizedValueEngine(transactions, "stock").historical_value(
+        name, now=NOW
+    )
+
+    assert [point["date"] for point in vectorized] == [
+        point["date"] for point in reference
+    ]
+    assert [point["value"] for point in vectorized] == pytest.approx(
+        [point["value"] for point in reference], abs=0.01
+    )
+
+
+def test_vectorized_engine_matches_reference_engine_randomized():
+    rng = random.Random(42)
+    stocks = [
+        make_stock(
+            stock_id,
+            price=rng.uniform(10, 500),
+            closes=[
+                (
+                    NOW - timedelta(hours=rng.uniform(0, 24 * 400)),
+                    rng.uniform(10, 500),
+                    rng.choice(["1w", "1m", "1y"]),
+                )
+                for _ in range(200)
+            ],
+        )
+        for stock_id in range(12)
+    ]
+    transactions = [
+        make_transaction(
+            rng.choice(stocks),
+            rng.choice(["buy", "buy", "sell"]),
+            rng.uniform(1, 50),
+            days_ago=rng.uniform(0, 400),
+        )
+        for _ in range(300)
+    ]
+
+    reference = HistoricalValueEngine(transactions, "stock").all_historical_values(
+        now=NOW
+    )
+    vectorized = VectorizedValueEngine(transactions, "stock").all_historical_values(
+        now=NOW
+    )
+
+    for key, series in reference.items():
+        assert [point["value"] for point in vectorized[key]] == pytest.approx(
+            [point["value"] for point in series], abs=0.01
+        )
+
+
+def test_daily_snapshots(transactions):
+    engine = VectorizedValueEngine(transactions, "stock")
+    days = [(NOW - timedelta(days=d)).date() for d in (21, 5, 2)]
+
+    snapshots = engine.daily_snapshots(days)
+
+    periods = ("1m", "1y", "max")
+    expected_values = [
+        point["value"]
+        for point in HistoricalValueEngine(transactions, "stock").value_series(
+            periods, [engine.end_of_day(day) for day in days]
+        )
+    ]
+    assert [snapshot["day"] for snapshot in snapshots] == days
+    assert [snapshot["value"] for snapshot in snapshots] == pytest.approx(
+        expected_values, abs=0.01
+    )
+    assert [snapshot["invested"] for snapshot in snapshots] == [0.0, 1300.0, 1300.0]
+    assert snapshots[2]["pnl"] == pytest.approx(400.0 - 1300.0 + expected_values[2])
+
+
+def test_historical_value_from_snapshots(transactions):
+    engine = VectorizedValueEngine(transactions, "stock")
+    live = engine.historical_value("1m", now=NOW)
+    requested_days = []
+
+    def load_snapshots(days):
+        requested_days.extend(days)
+        return {day: 1000.0 for day in days[::2]}
+
+    series = engine.historical_value_from_snapshots("1m", load_snapshots, now=NOW)
+
+    days = [point["date"].date() for point in live]
+    assert [point["date"] for point in series] == [
+        engine.end_of_day(day) for day in days[:-1]
+    ] + [NOW]
+    assert NOW.date() not in requested_days
+    # Points without a snapshot are valued like the snapshots
+    computed = engine.value_series(
+        ("1m", "1y", "max"), [point["date"] for point in series]
+    )
+    for point, computed_point in zip(series, computed):
+        if point["date"] < engine.first_transaction_date:
+            assert point["value"] == 0
+        elif point["date"].date() in requested_days[::2]:
+            assert point["value"] == 1000.0
+        else:
+            assert point["value"] == computed_point["value"]
+
+
+def make_price_series_loader(transactions, calls):
+    stocks = {transaction.stock.id: transaction.stock for transaction in transactions}
+
+    def load(stock_ids, periods, since):
+        calls.append((tuple(periods), since))
+        series = {}
+        for stock_id in stock_ids:
+            points = sorted(
+                (hp.date, hp.close_price)
+                for hp in stocks[stock_id].historical_prices
+                if hp.period in periods and (since is None or hp.date >= since)
+            )
+            if points:
+                series[stock_id] = (
+                    np.array([date.timestamp() for date, _ in points]),
+                    np.array([close for _, close in points]),
+                )
+        return series
+
+    return load
+
+
+@pytest.mark.parametrize("engine_class", [HistoricalValueEngine, VectorizedValueEngine])
+def test_engine_with_price_series_loader(transactions, engine_class):
+    calls = []
+    engine = engine_class(
+        transactions,
+        "stock",
+        price_series_loader=make_price_series_loader(transactions, calls),
+    )
+
+    values = engine.all_historical_values(now=NOW)
+
+    assert values == HistoricalValueEngine(transactions, "stock").all_historical_values(
+        now=NOW
+    )
+    assert [periods for periods, _ in calls] == [("1w",), ("1m",), ("1y",)]
+    assert calls[0][1] == NOW - timedelta(days=7) - timedelta(days=5)
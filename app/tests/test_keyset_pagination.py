@@ -0,0 +1,92 @@
+from app.celery_app import celery_app
+from app.core.exceptions import BadRequestError
+from app.core.pagination import decode_cursor, encode_cursor
+from app.domain.portfolio.services.stock_portfolio_service import (
+    StockPortfolioService,
+)
+from datetime import datetime, timedelta, timezone
+from kombu.exceptions import OperationalError
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+from uuid import UUID, uuid4
+import pytest
+
+USER_ID = "4f1f3f0e-0000-0000-0000-000000000001"
+
+
+@pytest.fixture
+def repository():
+    repository = MagicMock()
+    repository.get_stock_portfolio_by_id.return_value = SimpleNamespace(
+        owner_id=USER_ID, is_public=False, watched_stocks=[]
+    )
+    return repository
+
+
+def make_transactions(count):
+    start = datetime(2025, 1, 31, 12)
+    return [
+        SimpleNamespace(id=uuid4(), transaction_date=start - timedelta(days=day))
+        for day in range(count)
+    ]
+
+
+def test_cursor_round_trip():
+    values = ["2025-01-31T12:00:00+01:00", str(uuid4())]
+    assert decode_cursor(encode_cursor(values)) == values
+
+
+@pytest.mark.parametrize("cursor", ["not base64!", encode_cursor({"a": 1})[:-2]])
+def test_decode_cursor_rejects_garbage(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+def test_transactions_after_returns_next_cursor(repository):
+    transactions = make_transactions(3)
+    repository.get_stock_transactions_after.return_value = transactions
+    service = StockPortfolioService(repository, USER_ID)
+
+    page = service.get_transactions_in_portfolio_after("portfolio", size=2)
+
+    assert page["items"] == transactions[:2]
+    assert repository.get_stock_transactions_after.call_args.kwargs["limit"] == 3
+    last = transactions[1]
+    next_page = service.get_transactions_in_portfolio_after(
+        "portfolio", cursor=page["next_cursor"], size=2
+    )
+    assert repository.get_stock_transactions_after.call_args.kwargs["after"] == (
+        last.transaction_date,
+        UUID(str(last.id)),
+    )
+    assert next_page["next_cursor"] is not None
+
+
+def test_transactions_after_last_page(repository):
+    transactions = make_transactions(2)
+    repository.get_stock_transactions_after.return_value = transactions
+    service = StockPortfolioService(repository, USER_ID)
+
+    page = service.get_transactions_in_portfolio_after("portfolio", size=2)
+
+    assert page == {"items": transactions, "next_cursor": None}
+
+
+@pytest.mark.parametrize("cursor", ["garbage", encode_cursor(["yesterday", "x"])])
+def test_transactions_after_rejects_invalid_cursor(repository, cursor):
+    service = StockPortfolioService(repository, USER_ID)
+
+    with pytest.raises(BadRequestError):
+        service.get_transactions_in_portfolio_after("portfolio", cursor=cursor)
+
+
+def test_back_dated_change_survives_broker_outage(repository, monkeypatch):
+    send_task = MagicMock(side_effect=OperationalError("broker unavailable"))
+    monkeypatch.setattr(celery_app, "send_task", send_task)
+    service = StockPortfolioService(repository, USER_ID)
+
+    service._refresh_value_snapshots(
+        "portfolio", datetime(2025, 1, 31, 12, tzinfo=timezone.utc)
+    )
+
+    assert send_task.call_args.kwargs["args"] == ["stock", "portfolio", "2025-01-31"]
@@ -0,0 +1,108 @@
+from app.domain.portfolio.valuation.ohlcv_resampling import (
+    choose_base_period,
+    fit_interval,
+    format_interval,
+    parse_interval,
+    stored_series,
+)
+from datetime import datetime, timedelta
+import pytz
+import pytest
+
+NOW = datetime(2025, 6, 30, 12, 0, tzinfo=pytz.UTC)
+PERIOD_INTERVALS = {
+    "1d": ("1h", 3600),
+    "1w": ("4h", 14400),
+    "1m": ("1d", 86400),
+    "1y": ("1w", 604800),
+}
+SERIES_INTERVALS = stored_series(
+    PERIOD_INTERVALS,
+    {"1d": (timedelta(days=7), "1d"), "1w": (timedelta(days=31), "1d")},
+)
+
+
+@pytest.mark.parametrize(
+    "interval, seconds", [("15m", 900), ("4h", 14400), ("1d", 86400), ("2w", 1209600)]
+)
+def test_parse_interval(interval, seconds):
+    assert parse_interval(interval) == seconds
+    assert format_interval(seconds) == interval
+
+
+@pytest.mark.parametrize("interval", ["", "0h", "4", "1mo", "h4", "1.5h"])
+def test_parse_invalid_interval(interval):
+    with pytest.raises(ValueError):
+        parse_interval(interval)
+
+
+def test_fit_interval_keeps_interval_within_max_points():
+    assert fit_interval(14400, NOW - timedelta(days=60), NOW, 500) == 14400
+
+
+def test_fit_interval_widens_interval_over_max_points():
+    seconds = fit_interval(3600, NOW - timedelta(days=90), NOW, 500)
+
+    assert seconds == 21600
+    assert timedelta(days=90).total_seconds() / seconds < 500
+
+
+def test_fit_interval_beyond_chart_intervals():
+    assert fit_interval(86400, NOW - timedelta(weeks=1000), NOW, 100) == 11 * 604800
+
+
+def test_stored_series_include_rolled_bars():
+    assert SERIES_INTERVALS == {
+        ("1d", "1h"): 3600,
+        ("1d", "1d"): 86400,
+        ("1w", "4h"): 14400,
+        ("1w", "1d"): 86400,
+        ("1m", "1d"): 86400,
+        ("1y", "1w"): 604800,
+    }
+
+
+def test_choose_base_period_finest_covering_range():
+    first_dates = {
+        ("1d", "1h"): NOW - timedelta(days=1),
+        ("1w", "4h"): NOW - timedelta(days=60),
+        ("1m", "1d"): NOW - timedelta(days=400),
+        ("1y", "1w"): NOW - timedelta(days=4000),
+    }
+
+    choose = lambda seconds, days: choose_base_period(
+        SERIES_INTERVALS, first_dates, seconds, NOW - timedelta(days=days)
+    )
+    assert choose(14400, 30) == ("1w", ["4h"])
+    assert choose(14400, 90) == ("1m", ["1d"])
+    assert choose(3600, 90) == ("1m", ["1d"])
+    assert choose(3600, 1) == ("1d", ["1h"])
+    assert choose(604800, 3000) == ("1y", ["1w"])
+    assert choose(86400, 5000) == ("1y", ["1w"])
+
+
+def test_choose_base_period_counts_from_first_native_candle():
+    # Candles of 1w older than 31 days were rolled into daily bars
+    first_dates = {
+        ("1w", "4h"): NOW - timedelta(days=31),
+        ("1w", "1d"): NOW - timedelta(days=400),
+        ("1m", "1d"): NOW - timedelta(days=90),
+    }
+
+    choose = lambda seconds, days: choose_base_period(
+        SERIES_INTERVALS, first_dates, seconds, NOW - timedelta(days=days)
+    )
+    assert choose(14400, 60) == ("1w", ["4h", "1d"])
+    assert choose(14400, 20) == ("1w", ["4h"])
+    assert choose(86400, 60) == ("1w", ["4h", "1d"])
+    assert choose(86400, 300) == ("1w", ["4h", "1d"])
+
+
+def test_choose_base_period_ignores_unknown_series():
+    first_dates = {("1d", "5m"): NOW - timedelta(days=30)}
+
+    assert choose_base_period(SERIES_INTERVALS, first_dates, 3600, NOW) is None
+
+
+def test_choose_base_period_without_candles():
+    assert choose_base_period(SERIES_INTERVALS, {}, 3600, NOW) is None
@@ -0,0 +1,66 @@
+from app.domain.portfolio.valuation.position_aggregate import PositionAggregate
+from types import SimpleNamespace
+
+
+def make_transaction(stock, transaction_type, amount, price_per_unit):
+    return SimpleNamespace(
+        stock=stock,
+        stock_id=stock.id,
+        transaction_type=transaction_type,
+        amount=amount,
+        price_per_unit=price_per_unit,
+    )
+
+
+def test_position_aggregate_groups_transactions_by_asset():
+    pkn = SimpleNamespace(id=1, price=70.0, price_change_percentage_24h=2.0)
+    kgh = SimpleNamespace(id=2, price=120.0, price_change_percentage_24h=None)
+    aggregate = PositionAggregate(
+        [
+            make_transaction(pkn, "buy", 10, 50.0),
+            make_transaction(kgh, "buy", 2, 100.0),
+            make_transaction(pkn, "sell", 4, 60.0),
+            make_transaction(pkn, "buy", 2, 65.0),
+        ],
+        "stock",
+    )
+
+    position = aggregate.get(pkn.id)
+    assert position.holdings == 8
+    assert position.total_invested == 630.0
+    assert position.avg_buy_price == (630.0 - 240.0) / 8
+    assert position.current_value == 560.0
+    assert position.profit_loss == 240.0 - 630.0 + 560.0
+    assert position.profit_loss_24h == 11.2
+    assert position.percentage_profit_loss_24h == 2.0
+
+    assert aggregate.get(kgh.id).profit_loss_24h == 0
+    assert aggregate.total_invested == 830.0
+    assert aggregate.current_value == 800.0
+
+
+def test_position_aggregate_without_transactions_for_asset():
+    cdr = SimpleNamespace(id=3, price=250.0, price_change_percentage_24h=1.5)
+
+    position = PositionAggregate([], "stock").get(cdr.id, cdr)
+
+    assert position.holdings == 0
+    assert position.avg_buy_price == 0
+    assert position.current_value == 0
+    assert position.profit_loss == 0
+    assert position.profit_loss_percentage == 0
+
+
+def test_position_aggregate_from_position_rows():
+    pkn = SimpleNamespace(id=1, price=70.0, price_change_percentage_24h=2.0)
+    row = SimpleNamespace(
+        stock=pkn, stock_id=pkn.id, quantity=8, cost=630.0, proceeds=240.0
+    )
+
+    aggregate = PositionAggregate.from_rows([row], "stock")
+
+    position = aggregate.get(pkn.id)
+    assert position.holdings == 8
+    assert position.avg_buy_price == (630.0 - 240.0) / 8
+    assert position.profit_loss == 240.0 - 630.0 + 560.0
+    assert aggregate.total_invested == 630.0
@@ -0,0 +1,68 @@
+from app.core.cache import ResponseCache, serialize
+from app.domain.portfolio.schemas.stock_schemas import StockSymbolSchema
+from types import SimpleNamespace
+from typing import List
+from unittest.mock import MagicMock
+from redis import RedisError
+
+
+class InMemoryRedis(dict):
+    def mget(self, keys):
+        return [self.get(key) for key in keys]
+
+    def setex(self, key, ttl, value):
+        self[key] = value
+
+    def incr(self, key):
+        self[key] = str(int(self.get(key, 0)) + 1)
+
+    def publish(self, channel, message):
+        self.setdefault(channel, []).append(message)
+
+
+def make_builder(calls):
+    def build():
+        calls.append(1)
+        return serialize(
+            List[StockSymbolSchema], [SimpleNamespace(symbol="PKN"), {"symbol": "KGH"}]
+        )
+
+    return build
+
+
+def test_response_cache_reads_through():
+    calls = []
+    response_cache = ResponseCache(InMemoryRedis())
+
+    first = response_cache.get_or_set("stocks", ["stocks"], make_builder(calls))
+    second = response_cache.get_or_set("stocks", ["stocks"], make_builder(calls))
+
+    assert first == second == '[{"symbol":"PKN"},{"symbol":"KGH"}]'
+    assert len(calls) == 1
+
+
+def test_response_cache_bump_invalidates_dependent_entries():
+    calls = []
+    response_cache = ResponseCache(InMemoryRedis())
+    response_cache.get_or_set("stocks", ["stocks"], make_builder(calls))
+    response_cache.get_or_set("search", ["stocks", "cryptos"], make_builder(calls))
+    response_cache.get_or_set("cryptos", ["cryptos"], make_builder(calls))
+
+    response_cache.bump("stocks")
+    response_cache.get_or_set("stocks", ["stocks"], make_builder(calls))
+    response_cache.get_or_set("search", ["stocks", "cryptos"], make_builder(calls))
+    response_cache.get_or_set("cryptos", ["cryptos"], make_builder(calls))
+
+    assert len(calls) == 5
+    assert response_cache.redis[ResponseCache.INVALIDATION_CHANNEL] == ["stocks"]
+
+
+def test_response_cache_without_redis():
+    calls = []
+    redis = MagicMock()
+    redis.mget.side_effect = RedisError("Connection refused")
+
+    value = ResponseCache(redis).get_or_set("stocks", ["stocks"], make_builder(calls))
+
+    assert value == '[{"symbol":"PKN"},{"symbol":"KGH"}]'
+    assert len(calls) == 1